@@ -0,0 +1,226 @@
+"""
+Benchmark a fixed workload of typical API queries
+
+Each query is run a few times to warm the cache, then `--repeat` more
+times to measure latency, and once more under
+``EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`` to capture its plan. The
+latency percentiles and plans are written as JSON so runs before and
+after a schema change (an index, a materialization, partitioning) can be
+compared
+
+A workload that returns no rows times an empty plan rather than the
+query it stands for, so the run fails if any does (unless
+``--allow-empty``)
+
+By default a throwaway database is built from `db/schemas` and seeded
+with `cmdc_tools.datasets.synthetic` (see `common.scratch_database`).
+Pass ``--connstr`` to run against a database that is already seeded
+
+Usage::
+
+    python benchmarks/api_queries.py --scale small --output api.json
+    python benchmarks/api_queries.py --connstr $PG_CONN_STR --label brin
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Any, Dict
+
+import numpy as np
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROOT, Timer, report, scratch_database
+
+# name -> (sql, description). The parameters are filled by `_params`
+WORKLOAD = {
+    "county_history": (
+        "SELECT * FROM api.covid_us WHERE location = :county",
+        "one county, every variable and date",
+    ),
+    "counties_on_date": (
+        "SELECT * FROM api.covid_us WHERE dt = :dt AND location > 1000",
+        "every county and variable on one date",
+    ),
+    "variable_nationwide": (
+        "SELECT * FROM api.covid_us WHERE variable = 'cases_total'",
+        "one variable, every location and date",
+    ),
+    "provider_county_history": (
+        "SELECT * FROM api.usafacts_covid WHERE fips = :county",
+        "one county from a provider view",
+    ),
+    "provider_states_on_date": (
+        "SELECT * FROM api.covidtrackingproject WHERE dt = :dt",
+        "every state on one date from a provider view",
+    ),
+    "county_scores": ("SELECT * FROM public.county_scores", "scores of all counties"),
+    "state_scores": ("SELECT * FROM public.state_scores", "scores of all states"),
+    "sources": ("SELECT * FROM api.covid_sources", "the source of every series"),
+    "county_sources": (
+        "SELECT * FROM api.covid_sources WHERE location = :county",
+        "the sources of one county",
+    ),
+    # access patterns of the data tables behind the views
+    "variable_last_30_days": (
+        "SELECT fips, dt, value FROM data.usafacts_covid_latest "
+        "WHERE variable_id = :variable_id AND dt > :dt - 30",
+        "one variable over the last 30 days, as in data.scores_source",
+    ),
+    "variable_start_dates": (
+        "SELECT fips, MIN(vintage) FROM data.us_covid "
+        "WHERE variable_id = :variable_id GROUP BY fips",
+        "first vintage of one variable, as in us_covid_variable_start_date",
+    ),
+    "dates_all_vintages": (
+        "SELECT fips, vintage, value FROM data.usafacts_covid "
+        "WHERE dt BETWEEN :dt - 7 AND :dt AND variable_id = :variable_id",
+        "every vintage of one variable over a week of dates",
+    ),
+    "last_vintage": (
+        "SELECT COUNT(*) FROM data.us_covid WHERE vintage >= :vintage",
+        "the rows of the last vintage, as in data.refresh_latest_vintage",
+    ),
+}
+
+
+def _params(engine) -> Dict[str, Any]:
+    "The county with the most data, the last date and vintage and a variable"
+    county = engine.execute(
+        "SELECT fips FROM data.us_covid_latest WHERE fips > 1000 "
+        "GROUP BY fips ORDER BY COUNT(*) DESC, fips LIMIT 1"
+    ).scalar()
+    dt = engine.execute("SELECT MAX(dt) FROM data.us_covid_latest").scalar()
+    vintage = engine.execute("SELECT MAX(vintage) FROM data.us_covid_latest").scalar()
+    variable_id = engine.execute(
+        "SELECT id FROM meta.covid_variables WHERE name = 'cases_total'"
+    ).scalar()
+    return dict(county=county, dt=dt, vintage=vintage, variable_id=variable_id)
+
+
+def _plan_summary(plan: dict) -> Dict[str, Any]:
+    "The timings and buffer counts of the top node of an EXPLAIN plan"
+    top = plan["Plan"]
+    return dict(
+        planning_ms=plan.get("Planning Time"),
+        execution_ms=plan.get("Execution Time"),
+        shared_hit=top.get("Shared Hit Blocks"),
+        shared_read=top.get("Shared Read Blocks"),
+        top_node=top.get("Node Type"),
+    )
+
+
+def run_query(engine, name: str, params: dict, repeat: int, warmup: int) -> dict:
+    sql, description = WORKLOAD[name]
+    query = sa.text(sql)
+    with engine.connect() as conn:
+        for _ in range(warmup):
+            conn.execute(query, **params).fetchall()
+
+        times = []
+        for _ in range(repeat):
+            with Timer() as t:
+                rows = len(conn.execute(query, **params).fetchall())
+            times.append(t.elapsed * 1000)
+
+        explain = sa.text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+        plan = conn.execute(explain, **params).scalar()[0]
+
+    times = np.array(times)
+    return dict(
+        query=name,
+        description=description,
+        sql=sql,
+        params={k: str(v) for k, v in params.items() if ":" + k in sql},
+        rows=rows,
+        repeat=repeat,
+        p50_ms=float(np.percentile(times, 50)),
+        p90_ms=float(np.percentile(times, 90)),
+        p99_ms=float(np.percentile(times, 99)),
+        min_ms=float(times.min()),
+        max_ms=float(times.max()),
+        mean_ms=float(times.mean()),
+        **_plan_summary(plan),
+        plan=plan,
+    )
+
+
+def _git_revision() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        )
+        return out.stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(connstr: str, args) -> list:
+    from cmdc_tools.datasets import get_engine
+
+    engine = get_engine(connstr)
+    engine.execute("ANALYZE")
+    params = _params(engine)
+    if args.county is not None:
+        params["county"] = args.county
+    if args.date is not None:
+        params["dt"] = args.date
+
+    results = []
+    for name in args.queries:
+        res = run_query(engine, name, params, args.repeat, args.warmup)
+        res.update(label=args.label, revision=_git_revision(), scale=args.scale)
+        print(f"{name:>24}: p50 {res['p50_ms']:10.2f} ms", flush=True)
+        if res["rows"] == 0:
+            print(f"warning: {name} returned no rows", file=sys.stderr, flush=True)
+        results.append(res)
+    return results
+
+
+def main(argv=None):
+    from cmdc_tools.datasets.synthetic import SCALES, generate
+
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--connstr", help="an already seeded database to query")
+    p.add_argument("--admin", help="admin connection string (or PG_BENCH_ADMIN)")
+    p.add_argument("--scale", choices=list(SCALES), default="small")
+    p.add_argument(
+        "--queries", nargs="+", choices=list(WORKLOAD), default=list(WORKLOAD)
+    )
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--warmup", type=int, default=2)
+    p.add_argument("--county", type=int, help="fips of the county to query")
+    p.add_argument("--date", help="date to query")
+    p.add_argument("--label", default="", help="name of this run in the output")
+    p.add_argument("--output", help="write the results to this JSON file")
+    p.add_argument(
+        "--allow-empty",
+        action="store_true",
+        help="don't fail when a query returns no rows",
+    )
+    args = p.parse_args(argv)
+
+    if args.connstr is not None:
+        args.scale = None
+        results = run(args.connstr, args)
+    else:
+        with scratch_database(args.admin) as connstr:
+            generate(connstr, SCALES[args.scale], verbose=True)
+            results = run(connstr, args)
+
+    print()
+    cols = ["query", "rows", "p50_ms", "p90_ms", "p99_ms", "execution_ms"]
+    report(results, cols + ["shared_hit", "shared_read"], args.output)
+
+    empty = [r["query"] for r in results if r["rows"] == 0]
+    if len(empty) > 0 and not args.allow_empty:
+        p.exit(1, f"queries returned no rows: {', '.join(empty)}\n")
+
+
+if __name__ == "__main__":
+    main()
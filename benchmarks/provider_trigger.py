@@ -0,0 +1,148 @@
+"""
+Benchmark the triggers that copy provider tables into `data.us_covid`
+
+Loads the same rows into `data.usafacts_covid` with the legacy per-row
+`copy_to_us_covid_table` trigger, with the statement level
+`merge_into_us_covid_table` trigger from `db/schemas` and with no
+trigger at all (the cost of the provider table alone). Each load is run
+into an empty `data.us_covid` ("fresh") and into one that already holds
+every key from a lower priority provider, so each row is an update
+("conflict")
+
+Usage::
+
+    python benchmarks/provider_trigger.py --rows 2000000 --output trigger.json
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import Timer, report, scratch_database
+
+# The trigger from 002_covid_data.sql, before it was replaced
+LEGACY_TRIGGER = """
+CREATE OR REPLACE FUNCTION copy_to_us_covid_table()
+    RETURNS TRIGGER
+AS
+$$
+DECLARE
+    provider_arg covid_provider;
+BEGIN
+    provider_arg = TG_ARGV[0]::covid_provider;
+    INSERT INTO data.us_covid (vintage, dt, fips, variable_id, value, provider)
+    VALUES (NEW.vintage, NEW.dt, NEW.fips, NEW.variable_id, NEW.value, provider_arg)
+    ON CONFLICT (fips, dt, vintage, variable_id)
+        DO UPDATE SET value    = excluded.value,
+                      provider = provider_arg
+    WHERE provider_arg < data.us_covid.provider;
+    RETURN NEW;
+END;
+$$
+    LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trig_usafacts_to_us_covid ON data.usafacts_covid;
+CREATE TRIGGER trig_usafacts_to_us_covid
+    AFTER INSERT ON data.usafacts_covid
+    FOR EACH ROW
+    EXECUTE PROCEDURE copy_to_us_covid_table ('usafacts');
+"""
+
+STATEMENT_TRIGGER = """
+DROP TRIGGER IF EXISTS trig_usafacts_to_us_covid ON data.usafacts_covid;
+CREATE TRIGGER trig_usafacts_to_us_covid
+    AFTER INSERT ON data.usafacts_covid
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE merge_into_us_covid_table ('usafacts');
+"""
+
+# no trigger at all, for the cost of loading the provider table alone
+NO_TRIGGER = "DROP TRIGGER IF EXISTS trig_usafacts_to_us_covid ON data.usafacts_covid"
+
+TRIGGERS = {"none": NO_TRIGGER, "row": LEGACY_TRIGGER, "statement": STATEMENT_TRIGGER}
+
+# `rows` rows of real (fips, variable) pairs over consecutive days
+STAGE = """
+DROP TABLE IF EXISTS bench_rows;
+CREATE UNLOGGED TABLE bench_rows AS
+WITH keys AS (
+  SELECT row_number() OVER (ORDER BY us.fips, cv.id) - 1 AS k,
+         us.fips, cv.id AS variable_id
+  FROM meta.us_fips us CROSS JOIN meta.covid_variables cv
+), n AS (SELECT COUNT(*) AS n FROM keys)
+SELECT DATE '2020-07-07' AS vintage,
+       DATE '2020-01-22' + (g.i / n.n)::int AS dt,
+       keys.fips, keys.variable_id, mod(g.i, 100000)::int AS value
+FROM n
+CROSS JOIN generate_series(0, {rows} - 1) AS g(i)
+JOIN keys ON keys.k = mod(g.i, n.n);
+"""
+
+LOAD = """
+INSERT INTO data.usafacts_covid (vintage, dt, fips, variable_id, value)
+SELECT vintage, dt, fips, variable_id, value FROM bench_rows
+ON CONFLICT (fips, dt, vintage, variable_id) DO UPDATE SET value = excluded.value
+"""
+
+
+def run(connstr: str, trigger: str, scenario: str, rows: int) -> dict:
+    from cmdc_tools.datasets import get_engine
+
+    engine = get_engine(connstr)
+    engine.execute("TRUNCATE data.usafacts_covid, data.us_covid")
+    if scenario == "conflict":
+        engine.execute(
+            "INSERT INTO data.us_covid (vintage, dt, fips, variable_id, value, provider) "
+            "SELECT vintage, dt, fips, variable_id, value, 'nyt' FROM bench_rows"
+        )
+    engine.execute("ANALYZE data.us_covid")
+    engine.execute(TRIGGERS[trigger])
+
+    with Timer() as t:
+        with engine.begin() as conn:
+            conn.execute(LOAD)
+
+    n = engine.execute(
+        "SELECT COUNT(*) FROM data.us_covid WHERE provider = 'usafacts'"
+    ).scalar()
+    if trigger != "none" and n != rows:
+        raise ValueError(f"{trigger} trigger merged {n} of {rows} rows")
+
+    return dict(
+        trigger=trigger,
+        scenario=scenario,
+        rows=rows,
+        seconds=t.elapsed,
+        rows_per_second=rows / t.elapsed,
+    )
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--rows", type=int, default=500_000)
+    p.add_argument("--admin", help="admin connection string (or PG_BENCH_ADMIN)")
+    p.add_argument("--output", help="write the results to this JSON file")
+    args = p.parse_args(argv)
+
+    from cmdc_tools.datasets import get_engine
+
+    results = []
+    with scratch_database(args.admin) as connstr:
+        get_engine(connstr).execute(STAGE.format(rows=args.rows))
+        for scenario in ["fresh", "conflict"]:
+            for trigger in TRIGGERS:
+                res = run(connstr, trigger, scenario, args.rows)
+                print(
+                    f"{scenario:>8} {trigger:>9}: {res['seconds']:8.2f} s",
+                    flush=True,
+                )
+                results.append(res)
+
+    print()
+    cols = ["trigger", "scenario", "rows", "seconds", "rows_per_second"]
+    report(results, cols, args.output)
+
+
+if __name__ == "__main__":
+    main()
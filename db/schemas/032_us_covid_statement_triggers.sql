@@ -0,0 +1,55 @@
+-- Replace the per-row copy_to_us_covid_table triggers with statement level
+-- triggers that merge all rows inserted by a statement into data.us_covid
+-- with a single upsert.
+--
+-- The new rows are read from the statement's transition table. As before,
+-- only rows actually inserted into the provider table are merged (rows
+-- updated by an ON CONFLICT clause are not) and an existing row in
+-- data.us_covid is only replaced by a higher priority provider.
+
+CREATE OR REPLACE FUNCTION merge_into_us_covid_table()
+    RETURNS TRIGGER
+AS
+$$
+BEGIN
+    INSERT INTO data.us_covid (vintage, dt, fips, variable_id, value, provider)
+    SELECT nr.vintage, nr.dt, nr.fips, nr.variable_id, nr.value, TG_ARGV[0]::covid_provider
+    FROM new_rows nr
+    ON CONFLICT (fips, dt, vintage, variable_id)
+        DO UPDATE SET value    = excluded.value,
+                      provider = excluded.provider
+    WHERE excluded.provider < data.us_covid.provider;
+    RETURN NULL;
+END;
+$$
+    LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trig_ctp_to_us_covid ON data.ctp_covid;
+CREATE TRIGGER trig_ctp_to_us_covid
+    AFTER INSERT ON data.ctp_covid
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE merge_into_us_covid_table ('ctp');
+
+DROP TRIGGER IF EXISTS trig_nyt_to_us_covid ON data.nyt_covid;
+CREATE TRIGGER trig_nyt_to_us_covid
+    AFTER INSERT ON data.nyt_covid
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE merge_into_us_covid_table ('nyt');
+
+DROP TRIGGER IF EXISTS trig_usafacts_to_us_covid ON data.usafacts_covid;
+CREATE TRIGGER trig_usafacts_to_us_covid
+    AFTER INSERT ON data.usafacts_covid
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE merge_into_us_covid_table ('usafacts');
+
+DROP TRIGGER IF EXISTS trig_hhs_to_us_covid ON data.hhs_covid;
+CREATE TRIGGER trig_hhs_to_us_covid
+    AFTER INSERT ON data.hhs_covid
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE merge_into_us_covid_table ('hhs');
+
+DROP FUNCTION IF EXISTS copy_to_us_covid_table();
@@ -0,0 +1,119 @@
+-- Replace the data.us_covid_last_vintage materialized view with a table that
+-- holds the newest vintage of every (dt, fips, variable_id) in data.us_covid
+-- and is kept up to date by statement level triggers on data.us_covid, so
+-- api.covid_us never needs a refresh.
+
+DROP TABLE IF EXISTS data.us_covid_latest;
+
+CREATE TABLE data.us_covid_latest
+(
+    dt          date,
+    fips        int,
+    variable_id smallint,
+    vintage     date NOT NULL,
+    value       int,
+    provider    covid_provider NOT NULL,
+    PRIMARY KEY (dt, fips, variable_id)
+);
+
+COMMENT ON TABLE data.us_covid_latest IS E'The row of `data.us_covid` with the most recent vintage for each date, location and variable. Maintained by triggers on `data.us_covid`.';
+
+INSERT INTO data.us_covid_latest (dt, fips, variable_id, vintage, value, provider)
+SELECT DISTINCT ON (dt, fips, variable_id) dt, fips, variable_id, vintage, value, provider
+FROM data.us_covid
+ORDER BY dt, fips, variable_id, vintage DESC;
+
+-- Inserts (and updates that keep the key) only ever move a key to a newer
+-- vintage or change the value of its current vintage, so they are merged
+-- directly. Deletes and updates that change a key recompute the affected
+-- keys from data.us_covid.
+CREATE OR REPLACE FUNCTION maintain_us_covid_latest()
+    RETURNS TRIGGER
+AS
+$$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE data.us_covid_latest;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' OR TG_OP = 'UPDATE' THEN
+        INSERT INTO data.us_covid_latest (dt, fips, variable_id, vintage, value, provider)
+        SELECT DISTINCT ON (dt, fips, variable_id) dt, fips, variable_id, vintage, value, provider
+        FROM new_rows
+        ORDER BY dt, fips, variable_id, vintage DESC
+        ON CONFLICT (dt, fips, variable_id)
+            DO UPDATE SET vintage  = excluded.vintage,
+                          value    = excluded.value,
+                          provider = excluded.provider
+        WHERE excluded.vintage >= data.us_covid_latest.vintage;
+    END IF;
+
+    IF TG_OP = 'DELETE' OR TG_OP = 'UPDATE' THEN
+        -- keys whose latest row was deleted or moved to another key
+        CREATE TEMP TABLE __us_covid_latest_keys ON COMMIT DROP AS
+        SELECT DISTINCT o.dt, o.fips, o.variable_id
+        FROM old_rows o
+        INNER JOIN data.us_covid_latest l USING (dt, fips, variable_id)
+        WHERE l.vintage = o.vintage;
+
+        IF TG_OP = 'UPDATE' THEN
+            DELETE FROM __us_covid_latest_keys k
+            USING new_rows n
+            WHERE (n.dt, n.fips, n.variable_id) = (k.dt, k.fips, k.variable_id)
+              AND n.vintage = (SELECT l.vintage FROM data.us_covid_latest l
+                               WHERE (l.dt, l.fips, l.variable_id) = (k.dt, k.fips, k.variable_id));
+        END IF;
+
+        DELETE FROM data.us_covid_latest l
+        USING __us_covid_latest_keys k
+        WHERE (l.dt, l.fips, l.variable_id) = (k.dt, k.fips, k.variable_id);
+
+        INSERT INTO data.us_covid_latest (dt, fips, variable_id, vintage, value, provider)
+        SELECT DISTINCT ON (uc.dt, uc.fips, uc.variable_id)
+            uc.dt, uc.fips, uc.variable_id, uc.vintage, uc.value, uc.provider
+        FROM data.us_covid uc
+        INNER JOIN __us_covid_latest_keys k USING (dt, fips, variable_id)
+        ORDER BY uc.dt, uc.fips, uc.variable_id, uc.vintage DESC
+        ON CONFLICT (dt, fips, variable_id) DO NOTHING;
+
+        DROP TABLE __us_covid_latest_keys;
+    END IF;
+    RETURN NULL;
+END;
+$$
+    LANGUAGE plpgsql;
+
+CREATE TRIGGER trig_us_covid_latest_insert
+    AFTER INSERT ON data.us_covid
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE maintain_us_covid_latest();
+
+CREATE TRIGGER trig_us_covid_latest_update
+    AFTER UPDATE ON data.us_covid
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE maintain_us_covid_latest();
+
+CREATE TRIGGER trig_us_covid_latest_delete
+    AFTER DELETE ON data.us_covid
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE maintain_us_covid_latest();
+
+CREATE TRIGGER trig_us_covid_latest_truncate
+    AFTER TRUNCATE ON data.us_covid
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE maintain_us_covid_latest();
+
+CREATE OR REPLACE VIEW api.covid_us AS
+ SELECT l.dt,
+    l.fips AS location,
+    cv.name AS variable,
+    l.value,
+    CASE WHEN l.fips < 100 THEN LPAD(l.fips::TEXT, 2, '0') ELSE LPAD(l.fips::TEXT, 5, '0') END AS fips
+   FROM data.us_covid_latest l
+     LEFT JOIN meta.covid_variables cv ON cv.id = l.variable_id;
+
+DROP MATERIALIZED VIEW IF EXISTS data.us_covid_last_vintage;
@@ -0,0 +1,323 @@
+-- Range partition data.us_covid and the provider tables that feed it by
+-- vintage month.
+--
+-- Each table gets one partition per month of vintages plus a default
+-- partition that catches vintages no monthly partition exists for yet. The
+-- maintenance functions below create partitions ahead of time, attach and
+-- detach them and compact old vintages. See `cmdc_tools.datasets.partitions`
+--
+-- Converting an existing table copies all of its rows, so run this during a
+-- quiet period.
+
+-- Name of the partition of `tbl` holding vintages in the month of `month`
+CREATE OR REPLACE FUNCTION data.vintage_partition_name(tbl text, month date)
+    RETURNS text
+AS
+$$
+SELECT tbl || '_' || to_char(month, 'YYYY_MM');
+$$
+    LANGUAGE sql IMMUTABLE;
+
+
+-- Copy the privileges and comment of one relation to another
+CREATE OR REPLACE FUNCTION data.copy_relation_acl(src regclass, dst regclass)
+    RETURNS void
+AS
+$$
+DECLARE
+    acl record;
+BEGIN
+    FOR acl IN
+        SELECT a.privilege_type,
+               CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(r.rolname) END AS grantee
+        FROM pg_class c
+        CROSS JOIN LATERAL aclexplode(c.relacl) a
+        LEFT JOIN pg_roles r ON r.oid = a.grantee
+        WHERE c.oid = src
+    LOOP
+        EXECUTE format('GRANT %s ON %s TO %s', acl.privilege_type, dst, acl.grantee);
+    END LOOP;
+    EXECUTE format(
+        'COMMENT ON %s %s IS %L',
+        CASE WHEN (SELECT relkind FROM pg_class WHERE oid = dst) = 'm' THEN 'MATERIALIZED VIEW' ELSE 'TABLE' END,
+        dst, obj_description(src, 'pg_class')
+    );
+END;
+$$
+    LANGUAGE plpgsql;
+
+
+-- Create the monthly partitions of `tbl` for every month from `first_month`
+-- through `last_month`. Rows for those months that landed in the default
+-- partition are moved into the new partition.
+CREATE OR REPLACE FUNCTION data.create_vintage_partitions(tbl text, first_month date, last_month date)
+    RETURNS int
+AS
+$$
+DECLARE
+    m       date := date_trunc('month', first_month);
+    part    text;
+    created int  := 0;
+BEGIN
+    WHILE m <= last_month LOOP
+        part := data.vintage_partition_name(tbl, m);
+        IF to_regclass(format('data.%I', part)) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE data.%I (LIKE data.%I INCLUDING DEFAULTS)', part, tbl
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM data.%I WHERE vintage >= %L AND vintage < %L RETURNING *)
+                 INSERT INTO data.%I SELECT * FROM moved',
+                tbl || '_default', m, m + interval '1 month', part
+            );
+            EXECUTE format(
+                'ALTER TABLE data.%I ATTACH PARTITION data.%I FOR VALUES FROM (%L) TO (%L)',
+                tbl, part, m, m + interval '1 month'
+            );
+            created := created + 1;
+        END IF;
+        m := m + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$
+    LANGUAGE plpgsql;
+
+
+-- Detach the partition of `tbl` for `month`. The detached table keeps its
+-- name, so it can be dumped, archived or attached again. Detaching fires no
+-- delete triggers, so rows already copied to data.us_covid_latest stay there
+CREATE OR REPLACE FUNCTION data.detach_vintage_partition(tbl text, month date)
+    RETURNS text
+AS
+$$
+DECLARE
+    part text := data.vintage_partition_name(tbl, date_trunc('month', month)::date);
+BEGIN
+    EXECUTE format('ALTER TABLE data.%I DETACH PARTITION data.%I', tbl, part);
+    RETURN part;
+END;
+$$
+    LANGUAGE plpgsql;
+
+
+-- Attach a table created by `detach_vintage_partition` (or restored from a
+-- backup of one) as the partition of `tbl` for `month`
+CREATE OR REPLACE FUNCTION data.attach_vintage_partition(tbl text, month date)
+    RETURNS text
+AS
+$$
+DECLARE
+    m    date := date_trunc('month', month);
+    part text := data.vintage_partition_name(tbl, m);
+BEGIN
+    EXECUTE format(
+        'ALTER TABLE data.%I ATTACH PARTITION data.%I FOR VALUES FROM (%L) TO (%L)',
+        tbl, part, m, m + interval '1 month'
+    );
+    RETURN part;
+END;
+$$
+    LANGUAGE plpgsql;
+
+
+-- One row per (table, vintage month) compacted by compact_vintage_partition
+CREATE TABLE IF NOT EXISTS data.vintage_compactions
+(
+    table_name   text,
+    month        date,
+    compacted_at timestamptz NOT NULL DEFAULT now(),
+    rows_deleted bigint,
+    PRIMARY KEY (table_name, month)
+);
+
+
+-- Collapse the vintages of `tbl` in the month of `month` to revisions only:
+-- a row is deleted when the previous vintage of the same (dt, fips,
+-- variable_id) had the same value (and provider, for data.us_covid).
+--
+-- The newest vintage of every key always stays queryable through its most
+-- recent revision, but "as of vintage X" queries must then use the latest
+-- vintage <= X rather than vintage = X. Returns the number of rows deleted
+CREATE OR REPLACE FUNCTION data.compact_vintage_partition(tbl text, month date)
+    RETURNS bigint
+AS
+$$
+DECLARE
+    m       date := date_trunc('month', month);
+    payload text := 'value';
+    deleted bigint;
+BEGIN
+    IF EXISTS(
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'data' AND table_name = tbl AND column_name = 'provider'
+    ) THEN
+        payload := 'value, provider';
+    END IF;
+
+    EXECUTE format(
+        'DELETE FROM data.%1$I t
+         USING (
+           SELECT fips, dt, vintage, variable_id
+           FROM (
+             SELECT fips, dt, vintage, variable_id, vintage >= %3$L AS in_month,
+                    ROW(%2$s) IS NOT DISTINCT FROM
+                      lag(ROW(%2$s)) OVER (PARTITION BY fips, dt, variable_id ORDER BY vintage) AS same,
+                    row_number() OVER (PARTITION BY fips, dt, variable_id ORDER BY vintage) AS rn
+             FROM data.%1$I
+             WHERE vintage < %4$L
+           ) x
+           WHERE in_month AND same AND rn > 1
+         ) d
+         WHERE (t.fips, t.dt, t.vintage, t.variable_id) = (d.fips, d.dt, d.vintage, d.variable_id)
+           AND t.vintage >= %3$L AND t.vintage < %4$L',
+        tbl, payload, m, m + interval '1 month'
+    );
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+
+    INSERT INTO data.vintage_compactions (table_name, month, rows_deleted)
+    VALUES (tbl, m, deleted)
+    ON CONFLICT ON CONSTRAINT vintage_compactions_pkey DO UPDATE
+        SET compacted_at = now(),
+            rows_deleted = data.vintage_compactions.rows_deleted + excluded.rows_deleted;
+    RETURN deleted;
+END;
+$$
+    LANGUAGE plpgsql;
+
+
+-- Replace the table data.`tbl` with a copy partitioned by vintage month,
+-- keeping its columns, defaults, indexes, foreign keys, triggers, comment
+-- and privileges. Views that read the table are repointed at the new table
+-- (materialized views are rebuilt) and the old table is dropped
+CREATE OR REPLACE FUNCTION data.partition_by_vintage(tbl text)
+    RETURNS void
+AS
+$$
+DECLARE
+    old_oid    oid := format('data.%I', tbl)::regclass;
+    dep        record;
+    def        text;
+    oldest     date;
+    triggers   text[];
+    fkeys      text[];
+    matviews   text[] := '{}';
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = old_oid) = 'p' THEN
+        RETURN;
+    END IF;
+
+    -- views (and views over materialized views) reading the table, with the
+    -- definitions they had while it was still called data.`tbl`
+    CREATE TEMP TABLE __deps ON COMMIT DROP AS
+    WITH RECURSIVE deps(oid, depth) AS (
+        SELECT old_oid, 0
+        UNION
+        SELECT r.ev_class, d.depth + 1
+        FROM deps d
+        INNER JOIN pg_depend pd ON pd.refobjid = d.oid
+        INNER JOIN pg_rewrite r ON r.oid = pd.objid
+        WHERE r.ev_class <> d.oid
+          AND (d.depth = 0 OR (SELECT relkind FROM pg_class WHERE oid = d.oid) = 'm')
+    )
+    SELECT DISTINCT d.oid, d.depth, c.relkind, format('%I.%I', n.nspname, c.relname) AS name,
+           pg_get_viewdef(d.oid) AS def
+    FROM deps d
+    INNER JOIN pg_class c ON c.oid = d.oid
+    INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE d.depth > 0;
+
+    SELECT array_agg(pg_get_triggerdef(oid)) INTO triggers
+    FROM pg_trigger WHERE tgrelid = old_oid AND NOT tgisinternal;
+    SELECT array_agg(format('ALTER TABLE data.%I ADD CONSTRAINT %I %s', tbl, conname, pg_get_constraintdef(oid)))
+    INTO fkeys
+    FROM pg_constraint WHERE conrelid = old_oid AND contype = 'f';
+
+    -- move the old table and its indexes out of the way
+    EXECUTE format('ALTER TABLE data.%I RENAME TO %I', tbl, tbl || '_unpartitioned');
+    FOR dep IN SELECT indexrelid::regclass AS idx, c.relname
+               FROM pg_index i INNER JOIN pg_class c ON c.oid = i.indexrelid
+               WHERE i.indrelid = old_oid LOOP
+        EXECUTE format('ALTER INDEX %s RENAME TO %I', dep.idx, dep.relname || '_unpartitioned');
+    END LOOP;
+
+    EXECUTE format(
+        'CREATE TABLE data.%I (LIKE data.%I INCLUDING DEFAULTS INCLUDING COMMENTS INCLUDING STORAGE)
+         PARTITION BY RANGE (vintage)',
+        tbl, tbl || '_unpartitioned'
+    );
+    FOR dep IN SELECT pg_get_indexdef(indexrelid) AS def, indisprimary, c.relname
+               FROM pg_index i INNER JOIN pg_class c ON c.oid = i.indexrelid
+               WHERE i.indrelid = old_oid LOOP
+        IF dep.indisprimary THEN
+            EXECUTE format(
+                'ALTER TABLE data.%I ADD PRIMARY KEY %s', tbl,
+                substring(pg_get_constraintdef(
+                    (SELECT oid FROM pg_constraint WHERE conrelid = old_oid AND contype = 'p')
+                ) FROM '\(.*\)')
+            );
+        ELSE
+            EXECUTE replace(
+                replace(dep.def, ' ON data.' || quote_ident(tbl || '_unpartitioned'), ' ON data.' || quote_ident(tbl)),
+                'INDEX ' || quote_ident(dep.relname), 'INDEX ' || quote_ident(replace(dep.relname, '_unpartitioned', ''))
+            );
+        END IF;
+    END LOOP;
+    EXECUTE format('CREATE TABLE data.%I PARTITION OF data.%I DEFAULT', tbl || '_default', tbl);
+
+    EXECUTE format('SELECT date_trunc(''month'', min(vintage)) FROM data.%I', tbl || '_unpartitioned') INTO oldest;
+    PERFORM data.create_vintage_partitions(
+        tbl, coalesce(oldest, date_trunc('month', now())::date), (date_trunc('month', now()) + interval '2 months')::date
+    );
+    EXECUTE format('INSERT INTO data.%I SELECT * FROM data.%I ORDER BY vintage', tbl, tbl || '_unpartitioned');
+
+    -- constraints and triggers only once the rows are copied
+    IF fkeys IS NOT NULL THEN
+        FOREACH def IN ARRAY fkeys LOOP
+            EXECUTE def;
+        END LOOP;
+    END IF;
+    IF triggers IS NOT NULL THEN
+        FOREACH def IN ARRAY triggers LOOP
+            EXECUTE def;
+        END LOOP;
+    END IF;
+    PERFORM data.copy_relation_acl(format('data.%I', tbl || '_unpartitioned')::regclass, format('data.%I', tbl)::regclass);
+
+    -- repoint dependents, shallowest first. Materialized views are rebuilt
+    -- and the views over them repointed in turn
+    FOR dep IN SELECT * FROM __deps ORDER BY depth, name LOOP
+        IF dep.relkind = 'v' THEN
+            EXECUTE format('CREATE OR REPLACE VIEW %s AS %s', dep.name, dep.def);
+        ELSE
+            EXECUTE format('ALTER MATERIALIZED VIEW %s RENAME TO %I', dep.name, (SELECT relname FROM pg_class WHERE oid = dep.oid) || '_old');
+            FOR def IN SELECT c.relname FROM pg_index i INNER JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = dep.oid LOOP
+                EXECUTE format('ALTER INDEX %I.%I RENAME TO %I', (SELECT nspname FROM pg_namespace n INNER JOIN pg_class c ON c.relnamespace = n.oid WHERE c.oid = dep.oid), def, def || '_old');
+            END LOOP;
+            EXECUTE format('CREATE MATERIALIZED VIEW %s AS %s', dep.name, dep.def);
+            FOR def IN SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = dep.oid LOOP
+                EXECUTE regexp_replace(
+                    regexp_replace(def, '_old ON ', ' ON '),
+                    ' ON (\S+)\.(\S+)_old ', ' ON \1.\2 '
+                );
+            END LOOP;
+            PERFORM data.copy_relation_acl(dep.oid, dep.name::regclass);
+            matviews := matviews || dep.oid::regclass::text;
+        END IF;
+    END LOOP;
+
+    FOREACH def IN ARRAY matviews LOOP
+        EXECUTE format('DROP MATERIALIZED VIEW %s', def);
+    END LOOP;
+    EXECUTE format('DROP TABLE data.%I', tbl || '_unpartitioned');
+    DROP TABLE __deps;
+END;
+$$
+    LANGUAGE plpgsql SET search_path = pg_catalog;
+
+
+SELECT data.partition_by_vintage('us_covid');
+SELECT data.partition_by_vintage('ctp_covid');
+SELECT data.partition_by_vintage('nyt_covid');
+SELECT data.partition_by_vintage('usafacts_covid');
+SELECT data.partition_by_vintage('hhs_covid');
@@ -0,0 +1,155 @@
+-- A generic latest-vintage layer for the provider tables behind the api
+-- views. `data.create_latest_vintage_table(tbl)` creates `data.<tbl>_latest`,
+-- which holds the row with the newest vintage for every key of `data.<tbl>`
+-- and has the key as its primary key, so the api views become index lookups
+-- instead of a `MAX(vintage) ... GROUP BY` over the whole table.
+--
+-- The tables are brought up to date by `data.refresh_latest_vintage`, which
+-- the loaders call in the same transaction as their insert (see
+-- `InsertWithTempTable.refresh_latest`). Passing the oldest vintage that was
+-- loaded only merges those rows; without it the table is rebuilt, which is
+-- needed after rows are deleted from the source table.
+
+CREATE TABLE IF NOT EXISTS data.latest_vintage_tables
+(
+    table_name text PRIMARY KEY,
+    key_cols   text[] NOT NULL
+);
+
+COMMENT ON TABLE data.latest_vintage_tables IS E'The tables with a `data.<table_name>_latest` table and the columns that table is keyed on.';
+
+CREATE OR REPLACE FUNCTION data.refresh_latest_vintage(tbl text, since date DEFAULT NULL)
+    RETURNS bigint
+AS
+$$
+DECLARE
+    latest  text := tbl || '_latest';
+    keys    text[];
+    key_sql text;
+    cols    text;
+    updates text;
+    n       bigint;
+BEGIN
+    SELECT key_cols INTO keys FROM data.latest_vintage_tables WHERE table_name = tbl;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'data.% has no latest vintage table', tbl;
+    END IF;
+
+    SELECT string_agg(quote_ident(k), ', ') INTO key_sql FROM unnest(keys) AS k;
+    SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum),
+           string_agg(format('%1$I = excluded.%1$I', a.attname), ', ' ORDER BY a.attnum)
+               FILTER (WHERE NOT a.attname = ANY (keys))
+    INTO cols, updates
+    FROM pg_attribute a
+    WHERE a.attrelid = format('data.%I', latest)::regclass
+      AND a.attnum > 0
+      AND NOT a.attisdropped;
+
+    IF since IS NULL THEN
+        -- DELETE rather than TRUNCATE so readers keep seeing the old rows
+        -- until the rebuild commits
+        EXECUTE format('DELETE FROM data.%I', latest);
+        EXECUTE format(
+            'INSERT INTO data.%1$I (%2$s) '
+            'SELECT DISTINCT ON (%3$s) %2$s FROM data.%4$I '
+            'ORDER BY %3$s, vintage DESC',
+            latest, cols, key_sql, tbl);
+    ELSE
+        EXECUTE format(
+            'INSERT INTO data.%1$I (%2$s) '
+            'SELECT DISTINCT ON (%3$s) %2$s FROM data.%4$I WHERE vintage >= $1 '
+            'ORDER BY %3$s, vintage DESC '
+            'ON CONFLICT (%3$s) DO UPDATE SET %5$s '
+            'WHERE excluded.vintage >= data.%1$I.vintage',
+            latest, cols, key_sql, tbl, updates) USING since;
+    END IF;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$
+    LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION data.create_latest_vintage_table(
+    tbl text,
+    keys text[] DEFAULT '{fips,dt,variable_id}'
+)
+    RETURNS text
+AS
+$$
+DECLARE
+    latest text := tbl || '_latest';
+BEGIN
+    EXECUTE format('DROP TABLE IF EXISTS data.%I', latest);
+    EXECUTE format('CREATE TABLE data.%I (LIKE data.%I INCLUDING DEFAULTS)', latest, tbl);
+    EXECUTE format(
+        'ALTER TABLE data.%I ADD PRIMARY KEY (%s)',
+        latest, (SELECT string_agg(quote_ident(k), ', ') FROM unnest(keys) AS k));
+    EXECUTE format(
+        'COMMENT ON TABLE data.%I IS %L', latest,
+        format('The row of `data.%s` with the most recent vintage for each %s. '
+               'Kept up to date by `data.refresh_latest_vintage`.',
+               tbl, array_to_string(keys, ', ')));
+
+    INSERT INTO data.latest_vintage_tables (table_name, key_cols)
+    VALUES (tbl, keys)
+    ON CONFLICT (table_name) DO UPDATE SET key_cols = excluded.key_cols;
+
+    PERFORM data.refresh_latest_vintage(tbl);
+    EXECUTE format('ANALYZE data.%I', latest);
+    RETURN latest;
+END;
+$$
+    LANGUAGE plpgsql;
+
+SELECT data.create_latest_vintage_table('ctp_covid');
+SELECT data.create_latest_vintage_table('nyt_covid');
+SELECT data.create_latest_vintage_table('usafacts_covid');
+SELECT data.create_latest_vintage_table('hhs_covid');
+SELECT data.create_latest_vintage_table('npi_interventions', '{location,dt,variable_id}');
+
+CREATE OR REPLACE VIEW api.covidtrackingproject AS
+SELECT
+  ctp.dt,
+  ctp.fips,
+  cv.name AS variable,
+  ctp.value
+FROM
+  data.ctp_covid_latest ctp
+  LEFT JOIN meta.covid_variables cv ON cv.id = ctp.variable_id;
+
+CREATE OR REPLACE VIEW api.nytimes_covid AS
+SELECT
+  nyt.dt,
+  nyt.fips,
+  cv.name AS variable,
+  nyt.value
+FROM
+  data.nyt_covid_latest nyt
+  LEFT JOIN meta.covid_variables cv ON cv.id = nyt.variable_id;
+
+CREATE OR REPLACE VIEW api.usafacts_covid AS
+SELECT
+  ufc.dt,
+  ufc.fips,
+  cv.name AS variable,
+  ufc.value
+FROM
+  data.usafacts_covid_latest ufc
+  LEFT JOIN meta.covid_variables cv ON cv.id = ufc.variable_id;
+
+CREATE OR REPLACE VIEW api.hhs AS
+SELECT
+  hhs.dt,
+  hhs.fips,
+  cv.name AS variable,
+  hhs.value
+FROM
+  data.hhs_covid_latest hhs
+  LEFT JOIN meta.covid_variables cv ON cv.id = hhs.variable_id;
+
+CREATE OR REPLACE VIEW api.npi_us AS
+SELECT npus.dt, npus.location, nv.name AS variable, npus.value
+FROM data.npi_interventions_latest npus
+  LEFT JOIN meta.npi_variables nv ON nv.id = npus.variable_id;
+
+DROP MATERIALIZED VIEW IF EXISTS data.usafacts_covid_last_vintage;
@@ -0,0 +1,120 @@
+-- Store the scores in a table that is refreshed after every USAFacts load
+-- (see `data.refresh_scores`) instead of computing them on every request.
+-- public.scores, state_scores and county_scores keep their columns and now
+-- read data.scores, which is indexed on location.
+--
+-- The computation itself lives on as data.scores_source. The daily case
+-- average now reads data.usafacts_covid_latest, so it uses the latest
+-- revision of each day rather than every vintage of it.
+
+CREATE OR REPLACE VIEW data.scores_source AS
+WITH demo_pop AS (
+       SELECT
+              demographics.location,
+              demographics.value AS population
+       FROM
+              api.demographics
+       WHERE
+              demographics.variable = 'Total population'::text
+),
+demo_65p AS (
+       SELECT
+              demographics.location,
+              demographics.value AS frac65p
+       FROM
+              api.demographics
+       WHERE
+              demographics.variable = 'Fraction of population over 65'::text
+),
+daily_case_avg AS (
+       SELECT
+              usafacts_covid_latest.fips,
+              (max(usafacts_covid_latest.value) - min(usafacts_covid_latest.value))::real / 30::double precision AS recent_cases
+       FROM
+              data.usafacts_covid_latest
+       WHERE
+              usafacts_covid_latest.dt > (now() - '30 days'::interval)
+              AND usafacts_covid_latest.variable_id = (
+                     SELECT
+                            id
+                     FROM
+                            meta.covid_variables
+                     WHERE
+                            name = 'cases_total')
+              GROUP BY
+                     usafacts_covid_latest.fips
+),
+states AS (
+       SELECT
+              us_fips.id,
+              us_fips.fips,
+              us_fips.name,
+              us_fips.area,
+              us_fips.latitude,
+              us_fips.longitude,
+              us_fips.state,
+              us_fips.county
+       FROM
+              meta.us_fips
+       WHERE
+              us_fips.fips < 100
+),
+scores AS (
+       SELECT
+              demo_pop.location,
+              clamp (demo_pop.population, 0.0::real, 500.0::real) + 10::real * demo_65p.frac65p + daily_case_avg.recent_cases::real AS score
+       FROM
+              demo_pop
+              LEFT JOIN demo_65p ON demo_pop.location = demo_65p.location
+              LEFT JOIN daily_case_avg ON demo_pop.location = daily_case_avg.fips
+)
+SELECT
+       s.location,
+       CASE WHEN usf.name::text = st.name::text THEN
+              usf.name::text
+       ELSE
+              (usf.name::text || ', '::text) || st.name::text
+       END AS name,
+       s.score
+FROM
+       scores s
+       LEFT JOIN meta.us_fips usf ON s.location = usf.fips
+       LEFT JOIN states st ON usf.state = st.state;
+
+DROP TABLE IF EXISTS data.scores;
+
+CREATE TABLE data.scores AS
+SELECT * FROM data.scores_source
+WITH NO DATA;
+
+CREATE INDEX scores_location_idx ON data.scores (location);
+
+COMMENT ON TABLE data.scores IS E'The contents of `data.scores_source` as of the last USAFacts load. Refreshed by `data.refresh_scores()`.';
+
+CREATE OR REPLACE FUNCTION data.refresh_scores()
+    RETURNS bigint
+AS
+$$
+DECLARE
+    n bigint;
+BEGIN
+    -- DELETE rather than TRUNCATE so readers keep seeing the old scores
+    -- until the refresh commits
+    DELETE FROM data.scores;
+    INSERT INTO data.scores (location, name, score)
+    SELECT location, name, score FROM data.scores_source;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$
+    LANGUAGE plpgsql;
+
+SELECT data.refresh_scores();
+
+CREATE OR REPLACE VIEW public.scores AS
+SELECT
+       s.location,
+       s.name,
+       s.score
+FROM
+       data.scores s;
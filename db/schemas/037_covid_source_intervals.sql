@@ -0,0 +1,75 @@
+-- Store source attribution as intervals. Instead of one row per location,
+-- variable and day, data.covid_sources holds one row per run of days with the
+-- same source: [valid_from, valid_to), where valid_to is NULL for the run
+-- that is still current. Logging an unchanged source only moves the
+-- date_accessed of the current row forward; a new source closes the current
+-- row and opens a new one. meta.latest_covid_source reads the current rows
+-- through a partial unique index.
+
+ALTER TABLE data.covid_sources RENAME TO covid_sources_daily;
+ALTER INDEX data.covid_sources_pkey RENAME TO covid_sources_daily_pkey;
+ALTER INDEX data.covid_sources__table_name_idx RENAME TO covid_sources_daily__table_name_idx;
+
+CREATE TABLE data.covid_sources (
+    location INT REFERENCES meta.us_fips(fips),
+    variable_id INT REFERENCES meta.covid_variables(id),
+    table_name TEXT NOT NULL DEFAULT 'us_covid',
+    source TEXT NOT NULL,
+    valid_from TIMESTAMPTZ NOT NULL,
+    valid_to TIMESTAMPTZ,
+    date_accessed TIMESTAMPTZ NOT NULL,
+    audited BOOL NOT NULL DEFAULT FALSE,
+    audit_success BOOL,
+    PRIMARY KEY (location, variable_id, table_name, valid_from),
+    CHECK (valid_to IS NULL OR valid_to > valid_from)
+);
+
+CREATE UNIQUE INDEX covid_sources_current_idx
+    ON data.covid_sources (location, variable_id, table_name)
+    WHERE valid_to IS NULL;
+
+CREATE INDEX covid_sources__table_name_idx ON data.covid_sources (table_name);
+
+SELECT data.copy_relation_acl('data.covid_sources_daily', 'data.covid_sources');
+
+COMMENT ON TABLE data.covid_sources IS E'The source of each location and variable, as intervals of days with the same source. `valid_to` is NULL for the current source and `date_accessed` is the last day it was logged.';
+
+-- collapse each run of days with the same source into one interval
+INSERT INTO data.covid_sources (
+    location, variable_id, table_name, source, valid_from, valid_to,
+    date_accessed, audited, audit_success
+)
+WITH changes AS (
+    SELECT *,
+           source IS DISTINCT FROM lag(source) OVER w AS is_new
+    FROM data.covid_sources_daily
+    WINDOW w AS (PARTITION BY location, variable_id, table_name ORDER BY date_accessed)
+), runs AS (
+    SELECT *,
+           SUM(is_new::int) OVER (
+               PARTITION BY location, variable_id, table_name ORDER BY date_accessed
+           ) AS run
+    FROM changes
+), intervals AS (
+    SELECT location, variable_id, table_name, run,
+           MIN(source) AS source,
+           MIN(date_accessed) AS valid_from,
+           MAX(date_accessed) AS date_accessed,
+           (array_agg(audited ORDER BY date_accessed DESC))[1] AS audited,
+           (array_agg(audit_success ORDER BY date_accessed DESC))[1] AS audit_success
+    FROM runs
+    GROUP BY location, variable_id, table_name, run
+)
+SELECT location, variable_id, table_name, source, valid_from,
+       lead(valid_from) OVER (
+           PARTITION BY location, variable_id, table_name ORDER BY valid_from
+       ) AS valid_to,
+       date_accessed, audited, audit_success
+FROM intervals;
+
+CREATE OR REPLACE VIEW meta.latest_covid_source AS
+SELECT location, variable_id, date_accessed, source, table_name
+FROM data.covid_sources
+WHERE valid_to IS NULL;
+
+DROP TABLE data.covid_sources_daily;
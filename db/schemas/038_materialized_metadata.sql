@@ -0,0 +1,112 @@
+-- Store the reshaped metadata views in tables. meta.us_fips_long,
+-- api.demographics, api.economics and api.economic_snapshots re-pivot or
+-- re-join tables that only change when a dataset is loaded, so each one now
+-- reads a table in the data schema indexed on (location, variable). The old
+-- definitions live on as data.<name>_source views and
+-- data.refresh_materialized(name) rebuilds a table from its view. The loaders
+-- call it after each put (see `InsertWithTempTable.refresh_materialized`).
+
+CREATE OR REPLACE FUNCTION data.refresh_materialized(tbl text)
+    RETURNS bigint
+AS
+$$
+DECLARE
+    n bigint;
+BEGIN
+    -- DELETE rather than TRUNCATE so readers keep seeing the old rows
+    -- until the refresh commits
+    EXECUTE format('DELETE FROM data.%I', tbl);
+    EXECUTE format('INSERT INTO data.%I SELECT * FROM data.%I', tbl, tbl || '_source');
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$
+    LANGUAGE plpgsql;
+
+
+/* meta.us_fips_long, loaded by USGeoBaseAPI */
+CREATE OR REPLACE VIEW data.us_fips_long_source AS
+SELECT fips, state, county, name, 'area' AS variable, area AS value
+FROM meta.us_fips
+UNION ALL
+SELECT fips, state, county, name, 'latitude' AS variable, latitude AS value
+FROM meta.us_fips
+UNION ALL
+SELECT fips, state, county, name, 'longitude' AS variable, longitude AS value
+FROM meta.us_fips;
+
+DROP TABLE IF EXISTS data.us_fips_long;
+CREATE TABLE data.us_fips_long AS SELECT * FROM data.us_fips_long_source;
+CREATE INDEX us_fips_long_fips_variable_idx ON data.us_fips_long (fips, variable);
+COMMENT ON TABLE data.us_fips_long IS E'The contents of `data.us_fips_long_source` as of the last load of `meta.us_fips`.';
+
+CREATE OR REPLACE VIEW meta.us_fips_long AS
+SELECT fips, state, county, name, variable, value
+FROM data.us_fips_long;
+
+
+/* api.demographics, loaded by ACS and ACSVariables */
+CREATE OR REPLACE VIEW data.demographics_source AS
+  WITH temp AS (
+    SELECT mv.id, mvs.name
+    FROM meta.acs_variables mv
+    RIGHT JOIN meta.acs_variables_selected mvs
+    ON mv.year=mvs.year AND mv.product=mvs.product AND mv.census_id=mvs.census_id
+  )
+  SELECT dd.fips as location, idn.name as variable, dd.value
+  FROM data.acs_data dd
+  LEFT JOIN temp idn
+  ON dd.id=idn.id;
+
+DROP TABLE IF EXISTS data.demographics;
+CREATE TABLE data.demographics AS SELECT * FROM data.demographics_source;
+CREATE INDEX demographics_location_variable_idx ON data.demographics (location, variable);
+COMMENT ON TABLE data.demographics IS E'The contents of `data.demographics_source` as of the last ACS load.';
+
+CREATE OR REPLACE VIEW api.demographics AS
+  SELECT location, variable, value
+  FROM data.demographics
+  ORDER BY location, variable;
+
+
+/* api.economics, loaded by StateUIClaims and WEI */
+CREATE OR REPLACE VIEW data.economics_source AS
+  WITH last_vintage AS (
+    SELECT MAX(vintage) as vintage, dt, fips, variable_name
+    FROM data.dol_ui
+    GROUP BY dt, fips, variable_name
+  )
+  SELECT lv.dt, lv.fips as location, lv.variable_name AS variable, ui.value
+  FROM last_vintage lv
+  LEFT JOIN data.dol_ui ui USING (vintage, dt, fips, variable_name)
+  UNION ALL
+  SELECT dt, 0 as location, 'wei'::TEXT as variable, wei AS value
+  FROM data.weeklyeconomicindex;
+
+DROP TABLE IF EXISTS data.economics;
+CREATE TABLE data.economics AS SELECT * FROM data.economics_source;
+CREATE INDEX economics_location_variable_dt_idx ON data.economics (location, variable, dt);
+COMMENT ON TABLE data.economics IS E'The contents of `data.economics_source` as of the last unemployment claims or WEI load.';
+
+CREATE OR REPLACE VIEW api.economics AS
+  SELECT dt, location, variable, value
+  FROM data.economics;
+
+
+/* api.economic_snapshots, loaded by CountyGDP */
+CREATE OR REPLACE VIEW data.economic_snapshots_source AS
+    SELECT
+           bg.fips as location,
+           'GDP_'::text || bv.description AS variable,
+           bg.value
+   FROM data.bea_gdp bg
+     LEFT JOIN meta.bea_variables bv ON bv.id = bg.id;
+
+DROP TABLE IF EXISTS data.economic_snapshots;
+CREATE TABLE data.economic_snapshots AS SELECT * FROM data.economic_snapshots_source;
+CREATE INDEX economic_snapshots_location_variable_idx ON data.economic_snapshots (location, variable);
+COMMENT ON TABLE data.economic_snapshots IS E'The contents of `data.economic_snapshots_source` as of the last CountyGDP load.';
+
+CREATE OR REPLACE VIEW api.economic_snapshots AS
+    SELECT location, variable, value
+    FROM data.economic_snapshots;
@@ -0,0 +1,44 @@
+-- Indexes for the ways the covid tables are read rather than the way their
+-- primary keys are laid out.
+--
+-- * The vintage tables are appended to one vintage at a time, so vintage
+--   follows the physical order of the rows and a BRIN index of a few pages
+--   finds the newest vintages (`data.refresh_latest_vintage`, compaction).
+--   dt does not: every vintage re-sends the whole history, so a BRIN index
+--   on dt would match every block and dt keeps its btree indexes.
+-- * Covering (variable_id, dt) indexes answer "one variable over a range of
+--   dates" (api.covid_us by variable, data.scores_source) and the first
+--   vintage of one variable (meta.us_covid_variable_start_date) with index
+--   only scans. They do not help api.covid_sources as a whole, which reads
+--   every variable of the newest vintages and is bound by the hash join and
+--   sort over them.
+-- * data.us_covid_latest is keyed on dt first, so one location's history
+--   (api.covid_us by location) gets a covering (fips, variable_id, dt) index.
+--
+-- The numbers behind these are in the commit that added this file and can be
+-- reproduced with benchmarks/api_queries.py.
+
+-- vintage tables
+CREATE INDEX IF NOT EXISTS us_covid_vintage_brin ON data.us_covid USING brin (vintage);
+CREATE INDEX IF NOT EXISTS usafacts_covid_vintage_brin ON data.usafacts_covid USING brin (vintage);
+CREATE INDEX IF NOT EXISTS ctp_covid_vintage_brin ON data.ctp_covid USING brin (vintage);
+CREATE INDEX IF NOT EXISTS nyt_covid_vintage_brin ON data.nyt_covid USING brin (vintage);
+CREATE INDEX IF NOT EXISTS hhs_covid_vintage_brin ON data.hhs_covid USING brin (vintage);
+
+CREATE INDEX IF NOT EXISTS us_covid_variable_dt_idx
+    ON data.us_covid (variable_id, dt) INCLUDE (fips, vintage, value);
+CREATE INDEX IF NOT EXISTS usafacts_covid_variable_dt_idx
+    ON data.usafacts_covid (variable_id, dt) INCLUDE (fips, vintage, value);
+
+-- latest vintage tables
+CREATE INDEX IF NOT EXISTS us_covid_latest_variable_dt_idx
+    ON data.us_covid_latest (variable_id, dt) INCLUDE (fips, value);
+CREATE INDEX IF NOT EXISTS us_covid_latest_fips_variable_dt_idx
+    ON data.us_covid_latest (fips, variable_id, dt) INCLUDE (value);
+CREATE INDEX IF NOT EXISTS usafacts_covid_latest_variable_dt_idx
+    ON data.usafacts_covid_latest (variable_id, dt) INCLUDE (fips, value);
+
+ANALYZE data.us_covid;
+ANALYZE data.usafacts_covid;
+ANALYZE data.us_covid_latest;
+ANALYZE data.usafacts_covid_latest;
@@ -0,0 +1,64 @@
+-- Maintain data.us_covid_latest from the transition tables alone. The trigger
+-- from 033 copied the keys to recompute into a temp table, which created and
+-- dropped a table (and its catalog rows) for every UPDATE or DELETE statement
+-- on data.us_covid. Now the stale rows are deleted straight from old_rows and
+-- the keys left without a row are recomputed from data.us_covid.
+
+CREATE OR REPLACE FUNCTION maintain_us_covid_latest()
+    RETURNS TRIGGER
+AS
+$$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE data.us_covid_latest;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' OR TG_OP = 'UPDATE' THEN
+        INSERT INTO data.us_covid_latest (dt, fips, variable_id, vintage, value, provider)
+        SELECT DISTINCT ON (dt, fips, variable_id) dt, fips, variable_id, vintage, value, provider
+        FROM new_rows
+        ORDER BY dt, fips, variable_id, vintage DESC
+        ON CONFLICT (dt, fips, variable_id)
+            DO UPDATE SET vintage  = excluded.vintage,
+                          value    = excluded.value,
+                          provider = excluded.provider
+        WHERE excluded.vintage >= data.us_covid_latest.vintage;
+    END IF;
+
+    -- drop the latest rows that were deleted or moved to another key
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM data.us_covid_latest l
+        USING old_rows o
+        WHERE (l.dt, l.fips, l.variable_id, l.vintage) = (o.dt, o.fips, o.variable_id, o.vintage);
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- rows updated in place were merged above and are kept
+        DELETE FROM data.us_covid_latest l
+        USING old_rows o
+        WHERE (l.dt, l.fips, l.variable_id, l.vintage) = (o.dt, o.fips, o.variable_id, o.vintage)
+          AND NOT EXISTS(
+                SELECT 1
+                FROM new_rows n
+                WHERE (n.dt, n.fips, n.variable_id, n.vintage) = (l.dt, l.fips, l.variable_id, l.vintage)
+            );
+    END IF;
+
+    IF TG_OP = 'DELETE' OR TG_OP = 'UPDATE' THEN
+        -- and fall back to the newest remaining vintage of those keys
+        INSERT INTO data.us_covid_latest (dt, fips, variable_id, vintage, value, provider)
+        SELECT DISTINCT ON (uc.dt, uc.fips, uc.variable_id)
+            uc.dt, uc.fips, uc.variable_id, uc.vintage, uc.value, uc.provider
+        FROM data.us_covid uc
+        WHERE (uc.dt, uc.fips, uc.variable_id) IN (SELECT o.dt, o.fips, o.variable_id FROM old_rows o)
+          AND NOT EXISTS(
+                SELECT 1
+                FROM data.us_covid_latest l
+                WHERE (l.dt, l.fips, l.variable_id) = (uc.dt, uc.fips, uc.variable_id)
+            )
+        ORDER BY uc.dt, uc.fips, uc.variable_id, uc.vintage DESC
+        ON CONFLICT (dt, fips, variable_id) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$
+    LANGUAGE plpgsql;
@@ -9,9 +9,10 @@ from .cex import CountyDex, DailyCountyLex, DailyStateLex, StateDex
 #     CANStateTimeseries,
 # )
 from .covidtrackingproject import CTP
-from .db_util import TempTable, fast_to_sql
+from .db_util import TempTable, dispose_engines, fast_to_sql, get_engine
 from .dol import StateUIClaims
 from .keystone import KeystonePolicy
+from .lookups import MetaCache, get_meta_cache, resolve_ids
 from .nytimes import NYTimesState, NYTimesCounty
 from .official import (
     DC,
@@ -65,8 +66,10 @@ from .official import (
     WIDane,
     Wisconsin,
     HHS,
+    put_county_data,
 )
 from .owid import OWID
+from . import partitions
 from .usafacts import USAFactsCases, USAFactsDeaths
 from .uscensus import ACS, ACSVariables, USGeoBaseAPI
 from .wei import WEI
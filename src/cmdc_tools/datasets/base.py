@@ -1,17 +1,41 @@
 import random
+import textwrap
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, NamedTuple, Optional, Sequence, Tuple
 
 import pandas as pd
 import sqlalchemy as sa
 
-from .db_util import TempTable
+from .db_util import POOL_SIZE, StagingTable, TempTable, get_engine
+from .lookups import get_meta_cache, resolve_ids
+
+
+class PutTarget(NamedTuple):
+    """
+    One table written by `DatasetBase._put_many`
+
+    `sql` is executed after `df` is staged and may use a ``{temp_name}``
+    placeholder for the name of the staging table. It is not executed
+    until every target named in `after` has committed
+    """
+
+    table_name: str
+    df: pd.DataFrame
+    sql: str
+    after: Tuple[str, ...] = ()
 
 
 class DatasetBase:
     autodag: bool = True
     data_type: str = "general"
     table_name: str
+    # If True, stage uploads in session-local temp tables that are dropped
+    # when the load commits. If False, use persistent tables with random
+    # names that are dropped after the load
+    temp_staging: bool = True
 
     def __init__(self):
         pass
@@ -31,34 +55,86 @@ class DatasetBase:
     def put_prep(self, conn, df):
         pass
 
-    def log_covid_source(
-        self,
-        connstr: sa.engine.Engine,
-        df: pd.DataFrame,
-        source: str,
-        state_fips: Optional[int] = None,
-    ):
+    @contextmanager
+    def _stage(self, connstr: str, df: pd.DataFrame, name: str, **kw):
         """
-        Log the source of all variables in the DataFrame df
+        Upload `df` into a staging table and yield the connection and the
+        name of the staging table
 
-        Parameters
-        ----------
-        connstr: SQLAlchemy engine
-            The database connection where the sources will be stored
-        df: pd.DataFrame
-            The DataFrame added to the data.us_covid table
-            A string containing the source of the data
-        source: str
-            The URL of the website hosting the data
-        state_fips: Optional(Int)
-            If `df` recognizes locations by name lookup from `county`
-            column, the fips state code must be passed to disambiguate
-            the location code for the observation
+        With `temp_staging` everything executed on the connection inside
+        the ``with`` block is part of one transaction, which commits when
+        the block exits. All kwargs are passed to `fast_to_sql`
+        """
+        engine = get_engine(connstr)
+        if self.temp_staging:
+            temp_name = "__" + name
+            with engine.begin() as conn:
+                with StagingTable(df, temp_name, conn, **kw):
+                    yield conn, temp_name
+        else:
+            temp_name = "__" + name + str(random.randint(1000, 9999))
+            kw.update(dict(temp=False, if_exists="replace", destroy=True))
+            with engine.connect() as conn:
+                with TempTable(df, temp_name, conn, **kw):
+                    yield conn, temp_name
+
+    def _put_many(self, connstr: str, targets: Sequence[PutTarget], **kw):
+        """
+        Write several tables concurrently, each on its own pooled
+        connection and in its own transaction
+
+        All staging uploads start right away. A target whose `after`
+        names other targets waits for them to commit before running its
+        `sql`, so e.g. a table with a foreign key on another can be
+        staged while the other loads. Targets must be listed after the
+        targets they wait on. All kwargs are passed to `fast_to_sql`
+        """
+        names = [t.table_name for t in targets]
+        for i, target in enumerate(targets):
+            for dep in target.after:
+                if dep not in names[:i]:
+                    msg = f"{target.table_name} waits on {dep}, which must be "
+                    msg += "an earlier target"
+                    raise ValueError(msg)
+
+        done = {name: threading.Event() for name in names}
+        failed = set()
+
+        def _run(target: PutTarget):
+            stage = self._stage(connstr, target.df, target.table_name, **kw)
+            try:
+                with stage as (conn, temp_name):
+                    for dep in target.after:
+                        done[dep].wait()
+                        if dep in failed:
+                            raise RuntimeError(f"Load of {dep} failed")
+                    conn.execute(target.sql.format(temp_name=temp_name))
+            except Exception:
+                failed.add(target.table_name)
+                raise
+            finally:
+                done[target.table_name].set()
+
+        # dependencies are submitted (and so started) before their
+        # dependents, so waiting can't starve the pool
+        with ThreadPoolExecutor(min(len(targets), POOL_SIZE) or 1) as pool:
+            futures = [pool.submit(_run, t) for t in targets]
+        for future in futures:
+            future.result()
+
+    def _covid_source_query(
+        self, df: pd.DataFrame, state_fips: Optional[int] = None
+    ) -> Tuple[str, List[str]]:
+        """
+        Build the query that logs the sources of the observations in a
+        staging table holding (a subset of the columns of) `df`
+
+        Returns the query, with a ``{temp_table}`` placeholder for the
+        name of the staging table and ``:date_accessed`` and ``:source``
+        bind parameters, and the columns of `df` the query needs
         """
         # check for valid column names
         # first look for fips
-        columns = list(df.columns)
-
         if "fips" in df:
             join_locs = "INNER JOIN META.us_fips ff using(fips)"
             loc = "fips"
@@ -92,28 +168,62 @@ class DatasetBase:
         else:
             raise ValueError("Expected either `variable_name` or `variable_id` in `df`")
 
-        temp_table = "__covid_sources_{}".format(str(random.randint(1000, 9999)))
-        sql = f"""
-        INSERT INTO data.covid_sources(date_accessed, location, variable_id, source, table_name)
-        SELECT tt.this_date, ff.fips, mv.id, tt.src, '{self.table_name}'
-        from {temp_table} tt
+        select = f"""
+        SELECT DISTINCT ff.fips AS location, mv.id AS variable_id,
+          CAST(:source AS TEXT) AS source, '{self.table_name}' AS table_name
+        from {{temp_table}} tt
         {join_locs}
         {join_covid}
-        ON CONFLICT (date_accessed, location, variable_id) DO UPDATE
-        set source=EXCLUDED.source,
-            table_name=EXCLUDED.table_name;
         """
 
-        this_date = pd.Timestamp.utcnow().normalize()
+        return _build_covid_source_query(select), [loc, var]
 
-        to_sql = (
-            df[[loc, var]].drop_duplicates().assign(this_date=this_date, src=source)
+    def _insert_covid_sources(
+        self,
+        conn: sa.engine.Connection,
+        df: pd.DataFrame,
+        temp_table: str,
+        source: str,
+        state_fips: Optional[int] = None,
+    ):
+        "Log the sources of the observations in the staging table `temp_table`"
+        sql, _ = self._covid_source_query(df, state_fips)
+        this_date = pd.Timestamp.utcnow().normalize()
+        conn.execute(
+            sa.text(sql.format(temp_table=temp_table)),
+            date_accessed=this_date.to_pydatetime(),
+            source=source,
         )
 
-        with sa.create_engine(connstr).connect() as conn:
-            kw = dict(temp=False, if_exists="replace", destroy=True)
-            with TempTable(to_sql, temp_table, conn, **kw):
-                conn.execute(sql)
+    def log_covid_source(
+        self,
+        connstr: sa.engine.Engine,
+        df: pd.DataFrame,
+        source: str,
+        state_fips: Optional[int] = None,
+    ):
+        """
+        Log the source of all variables in the DataFrame df
+
+        Parameters
+        ----------
+        connstr: SQLAlchemy engine
+            The database connection where the sources will be stored
+        df: pd.DataFrame
+            The DataFrame added to the data.us_covid table
+            A string containing the source of the data
+        source: str
+            The URL of the website hosting the data
+        state_fips: Optional(Int)
+            If `df` recognizes locations by name lookup from `county`
+            column, the fips state code must be passed to disambiguate
+            the location code for the observation
+        """
+        _, cols = self._covid_source_query(df, state_fips)
+        to_sql = df[cols].drop_duplicates()
+
+        with self._stage(connstr, to_sql, "covid_sources") as (conn, temp_table):
+            self._insert_covid_sources(conn, to_sql, temp_table, source, state_fips)
 
 
 class DatasetBaseNoDate(DatasetBase, ABC):
@@ -153,23 +263,270 @@ def _build_on_conflict_do_nothing_query(
     """
 
 
+def _build_covid_insert_query(
+    t_home: str, t_temp: str, pk: str, provider: Optional[str] = None
+):
+    """
+    Build the insert query for a staging table whose `variable_id` and
+    `fips` columns were resolved on the client (see `resolve_ids`), so
+    no joins against the meta tables are needed
+    """
+    cols = "vintage, dt, fips, variable_id, value"
+    select = cols
+    if provider is not None:
+        cols += ", provider"
+        select += f", '{provider}'"
+
+    return f"""
+    INSERT INTO data.{t_home} ({cols})
+    SELECT {select} FROM {t_temp}
+    ON CONFLICT {pk} DO UPDATE SET value = excluded.value;
+    """
+
+
+def _build_covid_source_query(select: str) -> str:
+    """
+    Build the statements that log the sources returned by `select` (with
+    columns location, variable_id, source and table_name) as accessed
+    on the ``:date_accessed`` bind parameter
+
+    `data.covid_sources` stores intervals of days with the same source.
+    The current interval of each location and variable is closed if its
+    source changed, then the logged source either extends the current
+    interval or opens a new one. A new source logged on the day the
+    current interval was opened replaces its source instead
+    """
+    return f"""
+    WITH logged AS ({select})
+    UPDATE data.covid_sources cs SET valid_to = :date_accessed
+    FROM logged l
+    WHERE cs.valid_to IS NULL
+      AND (cs.location, cs.variable_id, cs.table_name) = (l.location, l.variable_id, l.table_name)
+      AND cs.source <> l.source
+      AND cs.valid_from < :date_accessed;
+
+    INSERT INTO data.covid_sources (
+      location, variable_id, table_name, source, valid_from, date_accessed
+    )
+    SELECT DISTINCT ON (location, variable_id, table_name)
+      location, variable_id, table_name, source, :date_accessed, :date_accessed
+    FROM ({select}) logged
+    ON CONFLICT (location, variable_id, table_name) WHERE valid_to IS NULL
+    DO UPDATE SET source = excluded.source,
+                  date_accessed = GREATEST(data.covid_sources.date_accessed, excluded.date_accessed);
+    """
+
+
 class InsertWithTempTable(DatasetBase, ABC):
     pk: str
+    # If set, the DataFrame is streamed to the database this many rows
+    # at a time instead of being encoded all at once. See `fast_to_sql`
+    copy_chunksize: Optional[int] = None
+    # If True, upload the DataFrame using the PGCOPY binary format.
+    # See `fast_to_sql`
+    copy_binary: bool = False
+    # If True, only write rows that are new or whose value differs from
+    # the latest vintage already stored. See `_drop_unchanged`
+    delta_put: bool = False
+    # If True, replace variable names (and county names) with their ids
+    # (and fips codes) on the client before uploading. See `resolve_ids`
+    use_meta_cache: bool = False
+    # Whether rows with unknown variables are dropped instead of raising
+    drop_unresolved: bool = False
+    # The meta table (and its name column) that variable ids come from
+    variable_table: str = "covid_variables"
+    variable_name_col: str = "name"
+    # If True, `data.{table_name}_latest` is updated with the rows just
+    # written, in the same transaction. See `data.refresh_latest_vintage`
+    refresh_latest: bool = False
+    # Tables in the data schema that are derived from this one and are
+    # rebuilt after each load. See `data.refresh_materialized`
+    refresh_materialized: Tuple[str, ...] = ()
 
     def _insert_query(self, df: pd.DataFrame, table_name: str, temp_name: str, pk: str):
 
         out = _build_on_conflict_do_nothing_query(df, table_name, temp_name, pk)
         return out
 
-    def _put(self, connstr: str, df: pd.DataFrame, table_name: str, pk: str):
-        temp_name = "__" + table_name + str(random.randint(1000, 9999))
-        with sa.create_engine(connstr).connect() as conn:
-            kw = dict(temp=False, if_exists="replace", destroy=True)
-            with TempTable(df, temp_name, conn, **kw):
-                sql = self._insert_query(df, table_name, temp_name, pk)
-                conn.execute(sql)
+    def _latest_values(
+        self, conn: sa.engine.Connection, df: pd.DataFrame, table_name: str
+    ) -> pd.DataFrame:
+        """
+        Fetch the value in the latest vintage of `data.{table_name}` for
+        every (location, dt, variable) that could appear in `df`
+
+        The locations, variables and date range of `df` are sent as
+        array parameters so all keys are fetched in one query. When
+        `data.{table_name}_latest` exists it is read instead of taking
+        the newest vintage of every key. The result has the same
+        location and variable columns as `df`
+        """
+        var = "variable_name" if "variable_name" in df else "variable_id"
+        params = dict(
+            variables=list(df[var].unique()),
+            start=pd.to_datetime(df["dt"]).min().to_pydatetime(),
+            end=pd.to_datetime(df["dt"]).max().to_pydatetime(),
+        )
+
+        if "fips" in df:
+            loc_select = "t.fips"
+            join_loc = ""
+            where_loc = "t.fips = ANY(:locations)"
+            params["locations"] = [int(x) for x in df["fips"].unique()]
+        else:
+            state_fips = getattr(self, "state_fips", None)
+            if state_fips is None:
+                raise ValueError("Found county column, but state_fips not set.")
+            loc_select = "us.name AS county"
+            join_loc = "INNER JOIN meta.us_fips us ON us.fips = t.fips"
+            where_loc = f"us.state = LPAD({state_fips}::TEXT, 2, '0')"
+            where_loc += " AND us.name = ANY(:locations)"
+            params["locations"] = list(df["county"].unique())
+
+        if var == "variable_name":
+            # names are looked up in the variable table of the dataset
+            var_select = f"v.{self.variable_name_col} AS variable_name"
+            join_var = f"INNER JOIN meta.{self.variable_table} v"
+            join_var += " ON v.id = t.variable_id"
+            where_var = f"v.{self.variable_name_col} = ANY(:variables)"
+        else:
+            var_select = "t.variable_id"
+            join_var = ""
+            where_var = "t.variable_id = ANY(:variables)"
+            params["variables"] = [int(x) for x in params["variables"]]
+
+        latest = f"data.{table_name}_latest"
+        has_latest = conn.execute(
+            sa.text("SELECT to_regclass(:latest) IS NOT NULL"), latest=latest
+        ).scalar()
+        if has_latest:
+            distinct = ""
+            from_table = latest
+            order_by = ""
+        else:
+            distinct = "DISTINCT ON (t.fips, t.dt, t.variable_id)"
+            from_table = f"data.{table_name}"
+            order_by = "ORDER BY t.fips, t.dt, t.variable_id, t.vintage DESC"
+
+        sql = f"""
+        SELECT {distinct}
+          {loc_select}, t.dt, {var_select}, t.value
+        FROM {from_table} t
+        {join_var}
+        {join_loc}
+        WHERE {where_loc} AND {where_var} AND t.dt BETWEEN :start AND :end
+        {order_by}
+        """
+        return pd.read_sql(sa.text(textwrap.dedent(sql)), conn, params=params)
 
-    def put(self, connstr: str, df=None):
+    def _drop_unchanged(
+        self, connstr: str, df: pd.DataFrame, table_name: str
+    ) -> pd.DataFrame:
+        """
+        Remove the rows of `df` whose value matches the latest vintage
+        already stored in `data.{table_name}`
+
+        `df` must have the `dt` and `value` columns, a `fips` (or
+        `county`) column and a `variable_name` (or `variable_id`) column.
+        Because unchanged rows are not rewritten with the new vintage,
+        anything that treats the latest vintage as "last seen" (e.g.
+        provider priority across vintages in `data.us_covid`) will see
+        the vintage of the last revision instead
+        """
+        loc = "fips" if "fips" in df else "county"
+        var = "variable_name" if "variable_name" in df else "variable_id"
+        if df.shape[0] == 0:
+            return df
+
+        with get_engine(connstr).connect() as conn:
+            latest = self._latest_values(conn, df, table_name)
+
+        def _date(x):
+            x = pd.to_datetime(x)
+            if pd.api.types.is_datetime64tz_dtype(x):
+                x = x.dt.tz_localize(None)
+            return x.dt.normalize()
+
+        keys = pd.DataFrame(
+            {loc: df[loc].values, "dt": _date(df["dt"]).values, var: df[var].values}
+        )
+        latest = latest.assign(dt=_date(latest["dt"])).rename(
+            columns={"value": "_latest"}
+        )
+        merged = keys.merge(latest, on=[loc, "dt", var], how="left", indicator=True)
+
+        new = pd.to_numeric(df["value"]).values
+        old = merged["_latest"].values
+        is_new = (merged["_merge"] == "left_only").values
+        changed = is_new | ((new != old) & ~(pd.isna(new) & pd.isna(old)))
+        return df.loc[changed]
+
+    def _after_insert(
+        self, conn: sa.engine.Connection, df: pd.DataFrame, table_name: str
+    ):
+        """
+        Run after `df` is inserted into `data.{table_name}`, on the same
+        connection (and, with `temp_staging`, in the same transaction)
+
+        Updates `data.{table_name}_latest` if `refresh_latest` is set and
+        rebuilds the tables in `refresh_materialized`. Subclasses can
+        extend this to refresh tables derived from theirs
+        """
+        if self.refresh_latest:
+            # only vintages from the oldest one loaded need merging
+            since = None
+            if "vintage" in df and df.shape[0] > 0:
+                since = pd.to_datetime(df["vintage"]).min().date()
+            sql = "SELECT data.refresh_latest_vintage(:table, :since)"
+            conn.execute(sa.text(sql), table=table_name, since=since)
+
+        for name in self.refresh_materialized:
+            sql = "SELECT data.refresh_materialized(:table)"
+            conn.execute(sa.text(sql), table=name)
+
+    def _put(
+        self,
+        connstr: str,
+        df: pd.DataFrame,
+        table_name: str,
+        pk: str,
+        source: Optional[str] = None,
+    ):
+        if self.use_meta_cache:
+            df = resolve_ids(
+                get_meta_cache(connstr),
+                df,
+                state_fips=getattr(self, "state_fips", None),
+                table=self.variable_table,
+                name_col=self.variable_name_col,
+                drop_unresolved=self.drop_unresolved,
+            )
+
+        if self.delta_put:
+            df = self._drop_unchanged(connstr, df, table_name)
+            if df.shape[0] == 0:
+                return
+
+        kw = dict(chunksize=self.copy_chunksize, binary=self.copy_binary)
+        with self._stage(connstr, df, table_name, **kw) as (conn, temp_name):
+            sql = self._insert_query(df, table_name, temp_name, pk)
+            conn.execute(sql)
+            self._after_insert(conn, df, table_name)
+
+            if source is not None:
+                state_fips = getattr(self, "state_fips", None)
+                self._insert_covid_sources(conn, df, temp_name, source, state_fips)
+
+    def put(self, connstr: str, df=None, log_source: bool = False):
+        """
+        Insert `df` (or `self.df`) into `self.table_name`
+
+        If `log_source` is True, the source of every (location, variable)
+        in `df` is also logged in `data.covid_sources` (see
+        `log_covid_source`). The sources are derived from the same
+        staging table as the data and, with `temp_staging`, are committed
+        in the same transaction
+        """
         if df is None:
             if hasattr(self, "df"):
                 df = self.df
@@ -180,4 +537,10 @@ class InsertWithTempTable(DatasetBase, ABC):
             msg = "field `pk` must be set on subclass of OnConflictNothingBase"
             raise ValueError(msg)
 
-        self._put(connstr, df, self.table_name, self.pk)
+        source = None
+        if log_source:
+            if not hasattr(self, "source"):
+                raise ValueError("field `source` must be set to log sources")
+            source = self.source
+
+        self._put(connstr, df, self.table_name, self.pk, source=source)
@@ -53,6 +53,7 @@ class CountyGDP(InsertWithTempTable, DatasetBaseNoDate):
     autodag = False
     pk = '("id", "year", "fips")'
     table_name = "bea_gdp"
+    refresh_materialized = ("economic_snapshots",)
 
     def __init__(self, year=2018):
         super().__init__()
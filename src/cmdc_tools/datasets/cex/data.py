@@ -16,6 +16,7 @@ class DailyStateLex(InsertWithTempTable, DatasetBaseNeedsDate):
     __url = "{BASE_URL}/{ds}_data/{geo}_{ds}_{ymd}.csv"
     table_name = "mobility_lex"
     pk = '("dt", "fips_prev", "fips_today")'
+    copy_binary = True
 
     def _url(self, date: str):
         ymd = pd.to_datetime(date).strftime("%Y-%m-%d")
@@ -63,6 +64,7 @@ class DailyStateLex(InsertWithTempTable, DatasetBaseNeedsDate):
 class DailyCountyLex(DailyStateLex, DatasetBaseNeedsDate):
     geo_name = "county"
     geo_prefix = "c"
+    copy_chunksize = 500_000
 
     def _url(self, date: str):
         return super()._url(date) + ".gz"
@@ -77,6 +79,9 @@ class StateDex(InsertWithTempTable, DatasetBaseNoDate):
     geo_name = "state"
     pk = "(dt, fips, variable_id)"
     variables = ["dex", "num_devices", "dex_a", "num_devices_a"]
+    use_meta_cache = True
+    variable_table = "mobility_dex_variables"
+    variable_name_col = "variable_name"
 
     def _url(self):
         return self.__url.format(BASE=BASE_URL, geo=self.geo_name)
@@ -103,6 +108,14 @@ class StateDex(InsertWithTempTable, DatasetBaseNoDate):
         if not pk.startswith("("):
             pk = f"({pk})"
 
+        if "variable_id" in df:
+            out = f"""
+            INSERT INTO data.{table_name} (dt, fips, variable_id, value)
+            SELECT dt, fips, variable_id, value FROM {temp_name}
+            ON CONFLICT {pk} DO NOTHING;
+            """
+            return textwrap.dedent(out)
+
         out = f"""
         INSERT INTO data.{table_name} (dt, fips, variable_id, value)
         SELECT tt.dt, tt.fips, mdv.id as variable_id, tt.value
@@ -4,6 +4,7 @@ import pandas as pd
 import requests
 
 from .. import DatasetBaseNoDate, InsertWithTempTable
+from ..base import _build_covid_insert_query
 
 CURRENT_URL = "https://covidtracking.com/api/v1/states/current.json"
 HISTORIC_URL = "https://covidtracking.com/api/v1/states/daily.json"
@@ -18,6 +19,9 @@ class CTP(InsertWithTempTable, DatasetBaseNoDate):
     table_name = "ctp_covid"
     pk = '("vintage", "dt", "fips", "variable_id")'
     source = "https://covidtracking.com/"
+    copy_binary = True
+    use_meta_cache = True
+    refresh_latest = True
 
     def __init__(self):
         super(CTP, self).__init__()
@@ -36,6 +40,9 @@ class CTP(InsertWithTempTable, DatasetBaseNoDate):
         }
 
     def _insert_query(self, df: pd.DataFrame, table_name: str, temp_name: str, pk: str):
+        if "variable_id" in df:
+            return textwrap.dedent(_build_covid_insert_query(table_name, temp_name, pk))
+
         out = f"""
         INSERT INTO data.{table_name} (vintage, dt, fips, variable_id, value)
         SELECT tt.vintage, tt.dt, tt.fips, mv.id as variable_id, tt.value
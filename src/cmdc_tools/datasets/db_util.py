@@ -1,14 +1,388 @@
+import atexit
 import io
+import os
+import struct
 import textwrap
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 import sqlalchemy as sa
 
+# default number of connections kept open by each shared engine
+POOL_SIZE = int(os.environ.get("PG_POOL_SIZE", 5))
+
+# engines shared by every dataset, keyed on (process id, connection string)
+_ENGINES: Dict[Tuple[int, str], sa.engine.Engine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+# number of characters psycopg2 asks for on each read during COPY
+COPY_READ_SIZE = 2 ** 16
+
+# signature, flags and header extension length of the PGCOPY binary format
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+# postgres timestamps and dates count from 2000-01-01
+_PG_EPOCH_NS = 946_684_800 * 10 ** 9
+_NS_PER_DAY = 86_400 * 10 ** 9
+
+_PG_INT_FORMATS = {"smallint": ">i2", "integer": ">i4", "bigint": ">i8"}
+_PG_FLOAT_FORMATS = {"real": ">f4", "double precision": ">f8"}
+_PG_TEXT_TYPES = {"text", "character varying", "character"}
+
+
+def get_engine(
+    connstr: Union[str, sa.engine.Engine], pool_size: Optional[int] = None, **kw
+) -> sa.engine.Engine:
+    """
+    Return the engine shared by all datasets for `connstr`
+
+    The engine is created on first use with a connection pool that
+    checks connections before handing them out, so every put in a
+    process reuses the same handful of connections instead of
+    connecting (and authenticating) again each time
+
+    Parameters
+    ----------
+    connstr: Union[str, sa.engine.Engine]
+        The database connection string. If an engine is passed it is
+        returned unchanged
+    pool_size: Optional[int]
+        The number of connections to keep open. Defaults to the
+        ``PG_POOL_SIZE`` environment variable, or 5. Only used when the
+        engine is first created
+    kw:
+        Other keyword arguments passed to `sa.create_engine` when the
+        engine is first created
+    """
+    if isinstance(connstr, sa.engine.Engine):
+        return connstr
+
+    # engines (and their connections) can't be shared with forked workers
+    key = (os.getpid(), connstr)
+    with _ENGINES_LOCK:
+        if key not in _ENGINES:
+            _ENGINES[key] = sa.create_engine(
+                connstr,
+                pool_size=POOL_SIZE if pool_size is None else pool_size,
+                pool_pre_ping=True,
+                **kw,
+            )
+        return _ENGINES[key]
+
+
+@atexit.register
+def dispose_engines():
+    "Close all connections held by the shared engines of this process"
+    with _ENGINES_LOCK:
+        for (pid, _), engine in list(_ENGINES.items()):
+            if pid == os.getpid():
+                engine.dispose()
+        _ENGINES.clear()
+
+
+class DataFrameStream(io.IOBase):
+    """
+    Read-only file-like object that encodes a DataFrame as the tab
+    separated text expected by ``COPY ... FROM STDIN``
+
+    The DataFrame is encoded `chunksize` rows at a time, so only one
+    chunk of text is held in memory at once, no matter how many rows
+    are in the DataFrame
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        The DataFrame to encode
+    cols: List[str]
+        The columns of `df` to write, in order
+    index: bool
+        Whether the index of `df` should be written before `cols`
+    chunksize: int
+        The number of rows to encode at a time
+    """
+
+    _buffer_type = io.StringIO
+    _newline = "\n"
+
+    def __init__(
+        self, df: pd.DataFrame, cols: List[str], index=False, chunksize=100_000
+    ):
+        if chunksize < 1:
+            raise ValueError("`chunksize` must be a positive integer")
+        self.df = df
+        self.cols = cols
+        self.index = index
+        self.chunksize = chunksize
+        self._chunks = self._iter_chunks()
+        self._buf = self._buffer_type()
+
+    def _encode_chunk(self, sub: pd.DataFrame):
+        return sub.to_csv(sep="\t", columns=self.cols, index=self.index, header=False)
+
+    def _iter_chunks(self):
+        for start in range(0, self.df.shape[0], self.chunksize):
+            yield self._encode_chunk(self.df.iloc[start : start + self.chunksize])
+
+    def _next_chunk(self) -> bool:
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        self._buf = self._buffer_type(chunk)
+        return True
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        size = -1 if size is None else size
+        out = self._buf.read(size)
+        while (size < 0 or len(out) < size) and self._next_chunk():
+            out += self._buf.read(size - len(out) if size >= 0 else -1)
+        return out
+
+    def readline(self, size=-1):
+        size = -1 if size is None else size
+        out = self._buf.readline(size)
+        while (
+            not out.endswith(self._newline)
+            and (size < 0 or len(out) < size)
+            and self._next_chunk()
+        ):
+            out += self._buf.readline(size - len(out) if size >= 0 else -1)
+        return out
+
+
+def _concat_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    "Concatenation of ``np.arange(s, s + l)`` for each pair in starts, lengths"
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(lengths.sum(), dtype=np.int64)
+
+
+def _fixed_width_field(values: np.ndarray, mask: np.ndarray, fmt: str):
+    lengths = np.where(mask, -1, np.dtype(fmt).itemsize).astype(np.int64)
+    payload = np.ascontiguousarray(values[~mask].astype(fmt)).view(np.uint8)
+    return lengths, payload
+
+
+def _text_field(col: pd.Series, mask: np.ndarray):
+    if pd.api.types.is_categorical_dtype(col):
+        # only encode each category once and gather bytes by code
+        cats = [str(x).encode("utf-8") for x in col.cat.categories]
+        cat_lengths = np.array([len(x) for x in cats], dtype=np.int64)
+        cat_starts = np.cumsum(cat_lengths) - cat_lengths
+        cat_bytes = np.frombuffer(b"".join(cats), dtype=np.uint8)
+
+        codes = col.cat.codes.to_numpy()[~mask]
+        lengths = np.full(len(col), -1, dtype=np.int64)
+        lengths[~mask] = cat_lengths[codes]
+        payload = cat_bytes[_concat_ranges(cat_starts[codes], cat_lengths[codes])]
+        return lengths, payload
+
+    encoded = [
+        x if isinstance(x, bytes) else str(x).encode("utf-8")
+        for x in col.to_numpy()[~mask]
+    ]
+    lengths = np.full(len(col), -1, dtype=np.int64)
+    lengths[~mask] = [len(x) for x in encoded]
+    payload = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return lengths, payload
+
+
+def _pgcopy_field(col: pd.Series, pg_type: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode one column in the PGCOPY binary representation of `pg_type`
+
+    Returns the byte length of each value (-1 for NULL) and the bytes of
+    all non-null values concatenated in row order
+    """
+    mask = col.isna().to_numpy()
+    is_integer = pd.api.types.is_integer_dtype(col)
+    is_bool = pd.api.types.is_bool_dtype(col)
+    is_datetime = pd.api.types.is_datetime64_any_dtype(col)
+
+    if pg_type in _PG_INT_FORMATS and (is_integer or is_bool):
+        fmt = _PG_INT_FORMATS[pg_type]
+        values = np.asarray(col.fillna(0) if mask.any() else col, dtype=np.int64)
+        info = np.iinfo(np.dtype(fmt))
+        if len(values) and (values.min() < info.min or values.max() > info.max):
+            msg = f"Values in column {col.name} out of range for {pg_type}"
+            raise ValueError(msg)
+        return _fixed_width_field(values, mask, fmt)
+
+    if pg_type in _PG_FLOAT_FORMATS and pd.api.types.is_numeric_dtype(col):
+        values = np.asarray(col.fillna(0) if mask.any() else col, dtype=np.float64)
+        return _fixed_width_field(values, mask, _PG_FLOAT_FORMATS[pg_type])
+
+    if pg_type == "boolean" and is_bool:
+        values = np.asarray(col.fillna(False) if mask.any() else col, dtype=bool)
+        return _fixed_width_field(values, mask, "u1")
+
+    if (pg_type.startswith("timestamp") or pg_type == "date") and is_datetime:
+        if pd.api.types.is_datetime64tz_dtype(col):
+            # timestamptz is stored in UTC, timestamp keeps the wall time
+            if pg_type == "timestamp with time zone":
+                col = col.dt.tz_convert("UTC")
+            col = col.dt.tz_localize(None)
+        ns = col.to_numpy().view(np.int64) - _PG_EPOCH_NS
+        if pg_type == "date":
+            return _fixed_width_field(ns // _NS_PER_DAY, mask, ">i4")
+        return _fixed_width_field(ns // 1000, mask, ">i8")
+
+    if pg_type in _PG_TEXT_TYPES and not is_datetime:
+        return _text_field(col, mask)
+
+    msg = f"Don't know how to binary encode column {col.name} with dtype"
+    msg += f" {col.dtype} as {pg_type}"
+    raise ValueError(msg)
+
+
+def encode_pgcopy_rows(df: pd.DataFrame, pg_types: List[str]) -> bytes:
+    """
+    Encode the rows of `df` in the PGCOPY binary format
+
+    The rows are built with vectorized operations over the column
+    buffers rather than formatting each value in Python. The output
+    does not include the PGCOPY header or trailer
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        The rows to encode
+    pg_types: List[str]
+        The postgres type name of the target column for each column of
+        `df`, e.g. ``bigint`` or ``timestamp without time zone``
+    """
+    n = df.shape[0]
+    fields = [_pgcopy_field(df.iloc[:, i], t) for i, t in enumerate(pg_types)]
+    count = np.frombuffer(struct.pack(">h", len(fields)), dtype=np.uint8)
+
+    sizes = np.full(n, 2, dtype=np.int64)
+    for lengths, _ in fields:
+        sizes += 4 + np.maximum(lengths, 0)
+
+    if n and all((lengths == lengths[0]).all() for lengths, _ in fields):
+        # every column has the same width in each row, so write in place
+        rows = np.empty((n, sizes[0]), dtype=np.uint8)
+        rows[:, :2] = count
+        pos = 2
+        for lengths, payload in fields:
+            width = max(lengths[0], 0)
+            rows[:, pos : pos + 4] = np.frombuffer(
+                struct.pack(">i", lengths[0]), dtype=np.uint8
+            )
+            rows[:, pos + 4 : pos + 4 + width] = payload.reshape(n, width)
+            pos += 4 + width
+        return rows.tobytes()
+
+    starts = np.cumsum(sizes) - sizes
+    buf = np.empty(sizes.sum(), dtype=np.uint8)
+    buf[starts[:, None] + np.arange(2)] = count
+    pos = starts + 2
+    for lengths, payload in fields:
+        header = lengths.astype(">i4").view(np.uint8).reshape(n, 4)
+        buf[pos[:, None] + np.arange(4)] = header
+        has_data = lengths > 0
+        buf[_concat_ranges(pos[has_data] + 4, lengths[has_data])] = payload
+        pos += 4 + np.maximum(lengths, 0)
+    return buf.tobytes()
+
+
+class BinaryDataFrameStream(DataFrameStream):
+    """
+    Read-only file-like object that encodes a DataFrame in the PGCOPY
+    binary format expected by ``COPY ... FROM STDIN WITH (FORMAT binary)``
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        The DataFrame to encode
+    cols: List[str]
+        The columns of `df` to write, in order. If `index` is True these
+        may include the names of index levels
+    pg_types: Dict[str, str]
+        A mapping from each column in `cols` to the postgres type of the
+        target column. Binary COPY does no casting, so these must match
+        the table exactly
+    index: bool
+        Whether the index of `df` should be available as columns
+    chunksize: int
+        The number of rows to encode at a time
+    """
+
+    _buffer_type = io.BytesIO
+    _newline = b"\n"
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        cols: List[str],
+        pg_types: Dict[str, str],
+        index=False,
+        chunksize=100_000,
+    ):
+        self.pg_types = [pg_types[c] for c in cols]
+        super().__init__(df, cols, index=index, chunksize=chunksize)
+
+    def _encode_chunk(self, sub: pd.DataFrame):
+        if self.index:
+            sub = sub.reset_index()
+        return encode_pgcopy_rows(sub.loc[:, self.cols], self.pg_types)
+
+    def _iter_chunks(self):
+        yield PGCOPY_HEADER
+        yield from super()._iter_chunks()
+        yield PGCOPY_TRAILER
+
+
+def _get_column_types(cur, full_name: str) -> Dict[str, str]:
+    cur.execute(
+        """
+        SELECT attname, atttypid::regtype::text
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        """,
+        (full_name,),
+    )
+    return dict(cur.fetchall())
+
 
 def fast_to_sql(
-    df, conn, name, index=False, if_exists="append", cols=None, schema=None, temp=False
+    df,
+    conn,
+    name,
+    index=False,
+    if_exists="append",
+    cols=None,
+    schema=None,
+    temp=False,
+    chunksize: Optional[int] = None,
+    binary=False,
+    on_commit: Optional[str] = None,
+    commit=True,
 ):
+    """
+    Upload `df` into the table `name` using ``COPY``
+
+    If `temp` is True the table is created as a ``TEMP`` table, and
+    `on_commit` (one of ``DROP``, ``DELETE ROWS`` or ``PRESERVE ROWS``)
+    sets its ``ON COMMIT`` behavior. Pass ``commit=False`` to leave the
+    upload uncommitted so it is part of the transaction `conn` is in
+
+    If `chunksize` is given, the DataFrame is streamed to the database
+    `chunksize` rows at a time (see `DataFrameStream`) instead of being
+    written to a single in-memory text buffer first. This keeps peak
+    memory flat for very large DataFrames
+
+    If `binary` is True, the DataFrame is sent in the PGCOPY binary
+    format (see `encode_pgcopy_rows`) so that numbers and timestamps
+    are neither formatted by pandas nor parsed by postgres. The column
+    types of the table are looked up first and each column is encoded
+    to match. A ValueError is raised for columns that can't be encoded
+    that way (e.g. ``numeric``). Binary uploads are always streamed
+    """
     if cols is None:
         cols = df.index.names + list(df) if index else list(df)
 
@@ -16,15 +390,46 @@ def fast_to_sql(
 
     full_name = name if schema is None else f"{schema}.{name}"
 
-    def upload_via_conn(con):
+    copy_sql = "COPY {} ({}) FROM STDIN WITH NULL ''".format(
+        full_name, ", ".join(colnames)
+    )
+
+    def copy_binary(cur):
+        pg_types = _get_column_types(cur, full_name)
+        missing = [c for c in cols if c not in pg_types]
+        if len(missing) > 0:
+            raise ValueError(f"Columns {missing} not found in table {full_name}")
+        sql = "COPY {} ({}) FROM STDIN WITH (FORMAT binary)".format(
+            full_name, ", ".join(colnames)
+        )
+        kw = dict(index=index)
+        if chunksize is not None:
+            kw["chunksize"] = chunksize
+        stream = BinaryDataFrameStream(df, cols, pg_types, **kw)
+        cur.copy_expert(sql, stream, size=COPY_READ_SIZE)
+
+    def copy_from_stream(cur):
+        stream = DataFrameStream(df, cols, index=index, chunksize=chunksize)
+        cur.copy_expert(copy_sql, stream, size=COPY_READ_SIZE)
+
+    def copy_from_buffer(cur):
         with io.StringIO() as csv:
             df.to_csv(csv, sep="\t", columns=cols, index=index, header=False)
             csv.seek(0)
-            with con.cursor() as cur:
-                # handle replacement strategy
-                if if_exists == "replace":
-                    cur.execute("DELETE FROM {};".format(full_name))
-                cur.copy_from(csv, full_name, columns=colnames, null="")
+            cur.copy_expert(copy_sql, csv, size=COPY_READ_SIZE)
+
+    def upload_via_conn(con):
+        with con.cursor() as cur:
+            # handle replacement strategy
+            if if_exists == "replace":
+                cur.execute("DELETE FROM {};".format(full_name))
+            if binary:
+                copy_binary(cur)
+            elif chunksize is None:
+                copy_from_buffer(cur)
+            else:
+                copy_from_stream(cur)
+            if commit:
                 cur.connection.commit()
 
     if if_exists == "replace":
@@ -36,6 +441,8 @@ def fast_to_sql(
         .replace("CREATE TABLE", create_want)
         .replace(f'"{name}"', full_name)
     )
+    if temp and on_commit is not None:
+        create_query = create_query.rstrip() + f" ON COMMIT {on_commit}"
     conn.execute(create_query)  # make sure the table exists
 
     if isinstance(conn, sa.engine.base.Engine):
@@ -73,6 +480,43 @@ class TempTable:
             self.conn.execute("DROP TABLE IF EXISTS {};".format(self.table_name))
 
 
+class StagingTable:
+    """
+    Context manager that copies `df` into a session-local ``TEMP`` table
+    that postgres drops when the surrounding transaction commits
+
+    Unlike `TempTable`, nothing is created in the catalog that other
+    sessions can see, so concurrent loads never contend for (or collide
+    on) staging table names, and the table needs no explicit cleanup.
+    `conn` must already be inside a transaction, e.g. from
+    ``engine.begin()``. All other kwargs are passed to `fast_to_sql`
+    """
+
+    def __init__(self, df, table_name, conn, **kw):
+        self.df = df
+        self.table_name = table_name
+        self.conn = conn
+        self.kw = kw
+
+    def __enter__(self):
+        if not self.conn.in_transaction():
+            msg = "StagingTable must be used on a connection inside a transaction"
+            raise ValueError(msg)
+        fast_to_sql(
+            self.df,
+            self.conn,
+            self.table_name,
+            temp=True,
+            on_commit="DROP",
+            commit=False,
+            **self.kw,
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
 _dtype_map = {
     np.dtype("float64"): "numeric(12, 6)",
     np.dtype("float32"): "numeric(10, 4)",
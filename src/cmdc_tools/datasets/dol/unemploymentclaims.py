@@ -21,6 +21,7 @@ class StateUIClaims(InsertWithTempTable, DatasetBaseNoDate):
 
     table_name = "dol_ui"
     pk = "(vintage, dt, fips)"
+    refresh_materialized = ("economics",)
 
     def __init__(self):
         self.s = requests.Session()
@@ -20,6 +20,7 @@ class KeystonePolicy(InsertWithTempTable, DatasetBaseNoDate):
     table_name = "npi_interventions"
     pk = "(vintage, dt, location, variable_id)"
     data_type = "general"
+    refresh_latest = True
     source = "https://github.com/Keystone-Strategy/covid19-intervention-data"
     url = (
         "https://raw.githubusercontent.com/Keystone-Strategy/"
@@ -0,0 +1,152 @@
+import os
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .db_util import get_engine
+
+# caches shared by every dataset, keyed on (process id, connection string)
+_CACHES: Dict[Tuple[int, str], "MetaCache"] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+class MetaCache:
+    """
+    In-process copy of the small meta tables used to turn variable
+    names and county names into the ids stored in the data tables
+
+    Each table is loaded from the database the first time it is needed
+    and kept until `refresh` is called. Resolving ids on the client lets
+    datasets upload compact integer columns and insert them without
+    joining the staging table against the meta tables
+
+    Parameters
+    ----------
+    connstr: str
+        The database connection string
+    """
+
+    def __init__(self, connstr: str):
+        self.connstr = connstr
+        self._tables: Dict[str, pd.DataFrame] = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, table: str = None):
+        """
+        Drop the cached copy of `table` (all tables if not given) so it
+        is reloaded on next use
+        """
+        with self._lock:
+            if table is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table, None)
+
+    def _load(self, table: str, sql: str) -> pd.DataFrame:
+        with self._lock:
+            if table not in self._tables:
+                with get_engine(self.connstr).connect() as conn:
+                    self._tables[table] = pd.read_sql(sql, conn)
+            return self._tables[table]
+
+    def variables(self, table="covid_variables", name_col="name") -> pd.Series:
+        "A Series mapping each variable name in `meta.{table}` to its id"
+        sql = f"SELECT id, {name_col} AS name FROM meta.{table}"
+        df = self._load(table, sql)
+        return pd.Series(df["id"].values, index=df["name"].values)
+
+    def us_fips(self) -> pd.DataFrame:
+        "The fips, state and name columns of `meta.us_fips`"
+        sql = "SELECT fips, state, name FROM meta.us_fips"
+        return self._load("us_fips", sql)
+
+    def variable_ids(
+        self, names: pd.Series, table="covid_variables", name_col="name"
+    ) -> pd.Series:
+        """
+        Look up the id of each variable name in `names`
+
+        Names that are not found are NaN in the output. If any name is
+        missing, the variables table is reloaded once in case the
+        variable was added since it was cached
+        """
+        out = names.map(self.variables(table, name_col))
+        if out.isna().any():
+            self.refresh(table)
+            out = names.map(self.variables(table, name_col))
+        return out
+
+    def county_fips(self, state_fips: int) -> pd.DataFrame:
+        """
+        The `county` name and `fips` code of every county in the state
+        with fips code `state_fips`
+        """
+        us_fips = self.us_fips()
+        is_county = (us_fips["state"] == f"{state_fips:02d}") & (us_fips["fips"] > 100)
+        return us_fips.loc[is_county, ["name", "fips"]].rename(
+            columns={"name": "county"}
+        )
+
+
+def get_meta_cache(connstr: str) -> MetaCache:
+    "Return the `MetaCache` shared by all datasets for `connstr`"
+    key = (os.getpid(), connstr)
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = MetaCache(connstr)
+        return _CACHES[key]
+
+
+def resolve_ids(
+    cache: MetaCache,
+    df: pd.DataFrame,
+    state_fips: int = None,
+    table="covid_variables",
+    name_col="name",
+    drop_unresolved=False,
+) -> pd.DataFrame:
+    """
+    Replace the `variable_name` column of `df` with `variable_id` and,
+    if `df` has a `county` column instead of `fips`, replace `county`
+    with `fips`
+
+    Counties are matched by name among the counties of `state_fips`
+    exactly as an ``INNER JOIN`` on `meta.us_fips` would. Unknown
+    variables raise a ValueError unless `drop_unresolved` is True, in
+    which case those rows are dropped
+
+    Parameters
+    ----------
+    cache: MetaCache
+        The cache to look ids up in
+    df: pd.DataFrame
+        The DataFrame to convert
+    state_fips: int
+        The state fips code used to look up county names
+    table, name_col: str
+        The variables table in the meta schema and its name column
+    drop_unresolved: bool
+        Whether to drop rows with unknown variables instead of raising
+    """
+    out = df
+    if "variable_name" in out:
+        ids = cache.variable_ids(out["variable_name"], table, name_col)
+        missing = ids.isna()
+        if missing.any():
+            if not drop_unresolved:
+                unknown = list(out.loc[missing, "variable_name"].unique())
+                raise ValueError(f"Unknown variables in meta.{table}: {unknown}")
+            out, ids = out.loc[~missing], ids.loc[~missing]
+        out = out.drop(columns=["variable_name"]).assign(
+            variable_id=ids.astype(np.int16)
+        )
+
+    if "fips" not in out and "county" in out:
+        if state_fips is None:
+            raise ValueError("Found county column, but state_fips not given.")
+        counties = cache.county_fips(state_fips)
+        out = out.merge(counties, on="county", how="inner").drop(columns=["county"])
+
+    return out
@@ -3,6 +3,7 @@ import textwrap
 import pandas as pd
 
 from .. import DatasetBaseNeedsDate, DatasetBaseNoDate, InsertWithTempTable
+from ..base import _build_covid_insert_query
 
 
 class NYTimesState(InsertWithTempTable, DatasetBaseNoDate):
@@ -13,11 +14,17 @@ class NYTimesState(InsertWithTempTable, DatasetBaseNoDate):
     url = "https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-states.csv"
     has_fips = True
     geo = "state"
+    copy_binary = True
+    use_meta_cache = True
+    refresh_latest = True
 
     def __init__(self):
         pass
 
     def _insert_query(self, df: pd.DataFrame, table_name: str, temp_name: str, pk: str):
+        if "variable_id" in df:
+            return textwrap.dedent(_build_covid_insert_query(table_name, temp_name, pk))
+
         out = f"""
         INSERT INTO data.{table_name} (vintage, dt, fips, variable_id, value)
         SELECT tt.vintage, tt.dt, tt.fips, mv.id as variable_id, tt.value
@@ -56,6 +63,7 @@ class NYTimesState(InsertWithTempTable, DatasetBaseNoDate):
 
 class NYTimesCounty(NYTimesState, DatasetBaseNoDate):
     geo = ["county", "state"]
+    copy_chunksize = 500_000
     url = (
         "https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-counties.csv"
     )
@@ -31,6 +31,19 @@ class Alaska(DatasetBaseNoDate, ArcGIS):
     )
 
     def _insert_query(self, df: pd.DataFrame, table_name: str, temp_name: str, pk: str):
+        if "variable_id" in df:
+            # ids were resolved on the client, but fips still need checking
+            out = f"""
+            INSERT INTO data.{table_name} (
+              vintage, dt, fips, variable_id, value
+            )
+            SELECT tt.vintage, tt.dt, tt.fips, tt.variable_id, tt.value
+            FROM {temp_name} tt
+            INNER JOIN meta.us_fips using (fips)
+            ON CONFLICT {pk} DO UPDATE set value = excluded.value
+            """
+            return textwrap.dedent(out)
+
         out = f"""
         INSERT INTO data.{table_name} (
           vintage, dt, fips, variable_id, value
@@ -44,12 +57,27 @@ class Alaska(DatasetBaseNoDate, ArcGIS):
         return textwrap.dedent(out)
 
     def get(self):
-        # Retrieve each of the datasets
-        s_cd = self.get_state_cases_deaths()
-        s_hosp = self.get_state_hospitalization()
-        s_test = self.get_state_testing()
-        c_cdr = self.get_county_cases_deaths_recoveries()
-        c_test = self.get_county_tests()
+        # Retrieve all of the sheets at once
+        sheets = [
+            (name, 0, 1)
+            for name in [
+                "Daily_Cases_Hospitalizations_and_Deaths",
+                "COVID_Hospital_Dataset_(prod)",
+                "Testing_Positivity",
+                "Boroughs_Census_Areas",
+                "Hospitalized_Deceased_Recovered",
+                "Testing_Positivity_Borough",
+            ]
+        ]
+        cd, hosp, test, boroughs, cdr, c_test = self.get_sheets_to_df(sheets)
+
+        # Transform each of the datasets
+        s_cd = self.get_state_cases_deaths(cd)
+        s_hosp = self.get_state_hospitalization(hosp)
+        s_test = self.get_state_testing(test)
+        cdict = self.get_census_borough_areas_dict(boroughs)
+        c_cdr = self.get_county_cases_deaths_recoveries(cdr, cdict)
+        c_test = self.get_county_tests(c_test)
 
         result = pd.concat(
             [s_cd, s_hosp, s_test, c_cdr, c_test], axis=0, ignore_index=True, sort=False
@@ -58,17 +86,14 @@ class Alaska(DatasetBaseNoDate, ArcGIS):
 
         return result
 
-    def get_census_borough_areas_dict(self):
-        # Retrieve census areas and boroughs
-        df = self.get_all_sheet_to_df("Boroughs_Census_Areas", 0, 1)
+    def get_census_borough_areas_dict(self, df):
+        # Map census areas and boroughs to fips
         df["fips"] = (df["STATEFP10"] + df["COUNTYFP10"]).astype(int)
         df["name"] = df["NAMELSAD10"].str.lower()
 
         return dict(list(df[["name", "fips"]].to_records(index=False)))
 
-    def get_state_cases_deaths(self):
-        df = self.get_all_sheet_to_df("Daily_Cases_Hospitalizations_and_Deaths", 0, 1)
-
+    def get_state_cases_deaths(self, df):
         # Rename and select subset
         crename = {
             "Date_Reported": "dt",
@@ -78,19 +103,14 @@ class Alaska(DatasetBaseNoDate, ArcGIS):
         df = df.rename(columns=crename).loc[:, crename.values()]
 
         # Create date
-        df["dt"] = df["dt"].map(
-            lambda x: pd.Timestamp.fromtimestamp(x / 1000).normalize()
-        )
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         df["fips"] = self.state_fips
 
         out = df.melt(id_vars=["dt", "fips"], var_name="variable_name")
 
         return out
 
-    def get_state_hospitalization(self):
-        # Retrieve the hospitalization sheet
-        df = self.get_all_sheet_to_df("COVID_Hospital_Dataset_(prod)", 0, 1)
-
+    def get_state_hospitalization(self, df):
         # Filter out the duplicated values
         df = df.query("facility_filter == 0")
 
@@ -113,9 +133,7 @@ class Alaska(DatasetBaseNoDate, ArcGIS):
 
         return df.loc[:, ["dt", "fips", "variable_name", "value"]]
 
-    def get_state_testing(self):
-        df = self.get_all_sheet_to_df("Testing_Positivity", 0, 1)
-
+    def get_state_testing(self, df):
         # Rename and select subset
         crename = {
             "Date_Collected": "dt",
@@ -124,7 +142,7 @@ class Alaska(DatasetBaseNoDate, ArcGIS):
             "daily_tests": "tests_total",
         }
         df = df.rename(columns=crename).loc[:, crename.values()]
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         df["fips"] = self.state_fips
         df = df.sort_values("dt")
 
@@ -138,10 +156,7 @@ class Alaska(DatasetBaseNoDate, ArcGIS):
 
         return out
 
-    def get_county_tests(self):
-        # Get testing data
-        df = self.get_all_sheet_to_df("Testing_Positivity_Borough", 0, 1)
-
+    def get_county_tests(self, df):
         # Rename and select subset
         crename = {
             "Date_Collected": "dt",
@@ -151,7 +166,7 @@ class Alaska(DatasetBaseNoDate, ArcGIS):
             "daily_negative": "negative_tests_total",
         }
         df = df.rename(columns=crename).loc[:, crename.values()]
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         df["fips"] = df["fips"].astype(int) + 1000 * self.state_fips
 
         # Count all of the positive/negative tests for each day/fips
@@ -173,11 +188,7 @@ class Alaska(DatasetBaseNoDate, ArcGIS):
 
         return out
 
-    def get_county_cases_deaths_recoveries(self):
-        # Retrieve the counties and case/death/recovered/active data
-        cdict = self.get_census_borough_areas_dict()
-        df = self.get_all_sheet_to_df("Hospitalized_Deceased_Recovered", 0, 1)
-
+    def get_county_cases_deaths_recoveries(self, df, cdict):
         # Only keep resident values (what they report on the dashboard)
         df = df.query("Resident == 'Y'")
 
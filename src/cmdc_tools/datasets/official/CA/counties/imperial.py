@@ -66,7 +66,7 @@ class Imperial(DatasetBaseNoDate, ArcGIS):
             [x["attributes"] for x in req.json()["features"]]
         ).rename(columns=self.hospitaloutfields)
         df["vintage"] = pd.datetime.today()
-        df["dt"] = df["dt"].map(lambda x: pd.datetime.fromtimestamp(x / 1000))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         df["fips"] = self.FIPS
 
         df["icu_beds_in_use_covid_total"] = df.eval(
@@ -34,7 +34,7 @@ class CAOrange(DatasetBaseNoDate, ArcGIS):
         df = df.rename(columns=crename).loc[:, crename.values()]
 
         df["fips"] = 1000 * self.state_fips + self.county_fips
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         df["negative_tests_total"] = df.eval("tests_total - positive_tests_total")
 
         out = df.melt(id_vars=["dt", "fips"], var_name="variable_name")
@@ -57,7 +57,7 @@ class SanDiego(DatasetBaseNoDate, ArcGIS):
         df = df.rename(columns=crename).loc[:, crename.values()]
 
         # Work with columns to create what we want
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         df["vintage"] = self._retrieve_vintage()
         df["fips"] = self.county_fips + 1000 * self.state_fips
         df["negative_tests_total"] = df.eval("tests_total - positive_tests_total")
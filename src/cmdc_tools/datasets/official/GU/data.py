@@ -34,7 +34,7 @@ class Guam(ArcGIS, DatasetBaseNoDate):
         )
 
         # Map to datetime and add fips
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         df["fips"] = self.state_fips
 
         # Reshape and return
@@ -6,6 +6,7 @@ import us
 
 from ..base import ArcGIS, CountyData
 from ... import DatasetBaseNoDate
+from ...base import _build_covid_insert_query
 
 
 def fips_lookup(x):
@@ -35,6 +36,8 @@ class HHS(DatasetBaseNoDate, ArcGIS):
     state_fips = 0  # Using 0 to denote that this is a national database
     source = "https://protect-public.hhs.gov/pages/hospital-capacity"
     provider = "HHS"
+    drop_unresolved = False
+    refresh_latest = True
 
     def __init__(self, params=None):
         super(ArcGIS, self).__init__()
@@ -52,6 +55,9 @@ class HHS(DatasetBaseNoDate, ArcGIS):
         self.params = params
 
     def _insert_query(self, df: pd.DataFrame, table_name: str, temp_name: str, pk: str):
+        if "variable_id" in df:
+            return textwrap.dedent(_build_covid_insert_query(table_name, temp_name, pk))
+
         out = f"""
         INSERT INTO data.{table_name} (vintage, dt, fips, variable_id, value)
         SELECT tt.vintage, tt.dt, tt.fips, mv.id as variable_id, tt.value
@@ -62,7 +68,7 @@ class HHS(DatasetBaseNoDate, ArcGIS):
 
         return textwrap.dedent(out)
 
-    def _get_hospital_census(self):
+    def _get_hospital_census(self, df):
         crename = {
             "state_name": "state",
             "total_icu_beds": "icu_beds_capacity_count",
@@ -72,37 +78,33 @@ class HHS(DatasetBaseNoDate, ArcGIS):
             "inpatient_beds_used_estimate": "hospital_beds_in_use_any",
             "inpatient_beds_used_covid_est": "hospital_beds_in_use_covid_total",
         }
-        df = (
-            self.get_all_sheet_to_df(
-                "State_Representative_Estimates_for_Hospital_Utilization", 0, 5
-            )
-            .rename(columns=crename)
-            .loc[:, crename.values()]
-        )
+        df = df.rename(columns=crename).loc[:, crename.values()]
 
         out = df.melt(id_vars=["state"], var_name="variable_name")
 
         return out
 
-    def _get_num_reporting(self):
+    def _get_num_reporting(self, df):
         crename = {
             "state_name": "state",
             "reporting_hospitals": "num_hospitals_reporting",
             "total_hospitals": "num_of_hospitals",
         }
-        df = (
-            self.get_all_sheet_to_df("Hospitals_Reporting_State_Level", 0, 5)
-            .rename(columns=crename)
-            .loc[:, crename.values()]
-        )
+        df = df.rename(columns=crename).loc[:, crename.values()]
 
         out = df.melt(id_vars=["state"], var_name="variable_name")
 
         return out
 
     def get(self):
+        reporting, census = self.get_sheets_to_df(
+            [
+                ("Hospitals_Reporting_State_Level", 0, 5),
+                ("State_Representative_Estimates_for_Hospital_Utilization", 0, 5),
+            ]
+        )
         df = pd.concat(
-            [self._get_num_reporting(), self._get_hospital_census()],
+            [self._get_num_reporting(reporting), self._get_hospital_census(census)],
             axis=0,
             ignore_index=True,
         )
@@ -37,7 +37,7 @@ class Iowa(ArcGIS, DatasetBaseNoDate):
         # Set date and make sure fips and other number columns
         # are integers
         df = df.apply(lambda x: pd.to_numeric(x, errors="ignore"))
-        df["dt"] = df["dt"].map(self._esri_ts_to_dt).map(lambda x: x.date())
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"]).dt.date
 
         # Reshape
         out = df.melt(id_vars=["dt", "fips"], var_name="variable_name")
@@ -13,13 +13,13 @@ class Louisiana(DatasetBaseNoDate, ArcGIS):
     source = "http://ldh.la.gov/Coronavirus/"
     state_fips = int(us.states.lookup("Louisiana").fips)
     has_fips = True
+    # Fields of Combined_COVID_Reporting used for the state data
+    state_fields = ["ValueType", "Measure", "Timeframe", "Value"]
 
-    def _get_county_to_fips(self):
-        c2f = self.get_all_sheet_to_df("Counties", 0, 5)
-
+    def _get_county_to_fips(self, c2f):
         return c2f.set_index("PARISH")["PFIPS"].to_dict()
 
-    def _get_county_casestests_ts(self):
+    def _get_county_casestests_ts(self, c2f):
 
         column_names = {
             "Lab Collection Date": "dt",
@@ -41,20 +41,21 @@ class Louisiana(DatasetBaseNoDate, ArcGIS):
             .stack()
             .reset_index()
             .replace({"county": {"DeSoto": "De Soto", "LaSalle": "La Salle"}})
-            .assign(fips=lambda x: x["county"].replace(self._get_county_to_fips()))
+            .assign(fips=lambda x: x["county"].replace(c2f))
             .drop(["county"], axis=1)
             .melt(id_vars=["dt", "fips"], var_name="variable_name")
         )
 
-    def _get_county_data(self, fulldf):
-        # Get the county to fips mapper from the ArcGIS db
-        c2f = self._get_county_to_fips()
+    def _get_county_data(self, county_sums, c2f):
+        """
+        Aggregates the sums of `Value` by group and measure computed by
+        the server into county totals
+        """
         variables = ["dt", "fips", "variable_name", "value"]
 
         # Only keep county data
-        cdf = fulldf.query("Group in @c2f.keys()").assign(
-            value=lambda x: x["Value"].astype(int),
-            fips=lambda x: x["Group"].map(lambda xx: c2f.get(xx, None)).astype(int),
+        cdf = county_sums.query("Group_ in @c2f.keys()").assign(
+            fips=lambda x: x["Group_"].map(c2f).astype(int)
         )
 
         # Get cases
@@ -93,15 +94,15 @@ class Louisiana(DatasetBaseNoDate, ArcGIS):
 
         return out
 
-    def _get_state_data(self, fulldf):
+    def _get_state_data(self, ladf, tests_total):
         """
         Retrieves any of the state level data contained in the
-        ArcGIS DataFrame
+        ArcGIS DataFrame of the rows for Louisiana and the total
+        number of tests computed by the server
         """
         # Will create a list of DataFrames
         out = []
         dt = self._retrieve_dt("US/Central")
-        ladf = fulldf.query("Geography == 'Louisiana'")
         variables = ["dt", "fips", "variable_name", "value"]
 
         # Total cases -- The timeseries doesn't seem to be kept up to
@@ -148,9 +149,7 @@ class Louisiana(DatasetBaseNoDate, ArcGIS):
                     "dt": dt,
                     "fips": self.state_fips,
                     "variable_name": "tests_total",
-                    "value": fulldf.query(
-                        "ValueType == 'tests' & Timeframe == 'cumulative'"
-                    )["Value"].sum(),
+                    "value": tests_total,
                 },
                 index=[0],
             )
@@ -191,15 +190,25 @@ class Louisiana(DatasetBaseNoDate, ArcGIS):
         return pd.concat(out, ignore_index=True, axis=0)
 
     def get(self):
-        # Get the full DF of data from
-        fulldf = self.get_all_sheet_to_df("Combined_COVID_Reporting", 0, 5)
-        fulldf = fulldf.rename(
-            columns={x: "Group" for x in list(fulldf) if x == "Group_"}
+        # Only ask the ArcGIS db for the rows and sums we use: the state
+        # rows, the sums by parish and measure, the total number of tests
+        # and the county to fips mapper
+        total = {"value": ("sum", "Value")}
+        cumulative_tests = "ValueType = 'tests' AND Timeframe = 'cumulative'"
+        params = [
+            self.query_params("Geography = 'Louisiana'", fields=self.state_fields),
+            self.query_params(stats=total, group_by=["Group_", "Measure"]),
+            self.query_params(cumulative_tests, stats=total),
+        ]
+        ladf, county_sums, tests, counties = self.get_sheets_to_df(
+            [("Combined_COVID_Reporting", 0, 5, p) for p in params]
+            + [("Counties", 0, 5, self.query_params(fields=["PARISH", "PFIPS"]))]
         )
+        c2f = self._get_county_to_fips(counties)
 
-        county = self._get_county_data(fulldf)
-        county_ct_ts = self._get_county_casestests_ts()
-        state = self._get_state_data(fulldf)
+        county = self._get_county_data(county_sums, c2f)
+        county_ct_ts = self._get_county_casestests_ts(c2f)
+        state = self._get_state_data(ladf, tests["value"].sum())
 
         # Concat all of the data together and add vintage
         out = pd.concat(
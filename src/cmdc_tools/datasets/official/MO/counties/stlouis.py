@@ -27,7 +27,7 @@ class MOStLouis(DatasetBaseNoDate, ArcGIS):
     def _get_cases(self):
         # Case data
         df_cases = self.get_all_sheet_to_df("covid19_timeline_test", 0, 2)
-        df_cases["dt"] = df_cases["report_date"].map(lambda x: self._esri_ts_to_dt(x))
+        df_cases["dt"] = self._esri_ts_col_to_dt(df_cases["report_date"])
         df_cases = df_cases.rename(columns={"cumulative_cases": "cases_total"})
 
         out = df_cases.loc[:, ["dt", "cases_total"]].melt(
@@ -39,9 +39,7 @@ class MOStLouis(DatasetBaseNoDate, ArcGIS):
     def _get_deaths(self):
         # Death data
         df_deaths = self.get_all_sheet_to_df("covid19_deaths_timeline", 0, 2)
-        df_deaths["dt"] = df_deaths["date_of_death"].map(
-            lambda x: self._esri_ts_to_dt(x)
-        )
+        df_deaths["dt"] = self._esri_ts_col_to_dt(df_deaths["date_of_death"])
         df_deaths = df_deaths.sort_values("dt")
         df_deaths["deaths_total"] = df_deaths["deaths"].cumsum()
 
@@ -53,7 +51,7 @@ class MOStLouis(DatasetBaseNoDate, ArcGIS):
 
     def _get_tests(self):
         df_tests = self.get_all_sheet_to_df("covid19_labs_daily", 0, 2)
-        df_tests["dt"] = df_tests["test_date"].map(lambda x: self._esri_ts_to_dt(x))
+        df_tests["dt"] = self._esri_ts_col_to_dt(df_tests["test_date"])
         df_tests = df_tests.sort_values("dt")
 
         df_tests["negative_tests_total"] = df_tests["negative"].cumsum()
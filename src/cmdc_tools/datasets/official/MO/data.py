@@ -20,19 +20,27 @@ class MissouriFips(DatasetBaseNoDate, ArcGIS):
         return df
 
     def _get(self):
-        cases = self._get_county_cases()
-        hosp = self._get_hosp()
-        county_deaths = self._get_county_deaths()
-        state_deaths = self._get_deaths_timeseries()
-        tests = self._get_tests()
+        sheets = self.get_sheets_to_df(
+            [
+                ("Attack_Rate_Automated", 0, 6),
+                ("MHA_Hospitalizations_Automated", 0, 6),
+                ("county_MOHSIS_map", 0, 6),
+                ("Daily_Deaths_Automated", 0, 6),
+                ("PCR_Test_by_Date_Automated", 0, 6),
+            ]
+        )
+        cases = self._get_county_cases(sheets[0])
+        hosp = self._get_hosp(sheets[1])
+        county_deaths = self._get_county_deaths(sheets[2])
+        state_deaths = self._get_deaths_timeseries(sheets[3])
+        tests = self._get_tests(sheets[4])
 
         result = pd.concat(
             [cases, hosp, county_deaths, state_deaths, tests], sort=False
         )
         return result
 
-    def _get_county_cases(self):
-        df = self.get_all_sheet_to_df("Attack_Rate_Automated", 0, 6)
+    def _get_county_cases(self, df):
         df = df.rename(columns={"County": "county", "Cases": "cases_total"})
 
         df = df[["county", "cases_total"]]
@@ -41,9 +49,7 @@ class MissouriFips(DatasetBaseNoDate, ArcGIS):
             dt=self._retrieve_dt("US/Central"), vintage=self._retrieve_vintage()
         )
 
-    def _get_hosp(self):
-        df = self.get_all_sheet_to_df("MHA_Hospitalizations_Automated", 0, 6)
-
+    def _get_hosp(self, df):
         crename = {
             "FIPS": "fips",
             "collectiondate": "dt",
@@ -54,7 +60,7 @@ class MissouriFips(DatasetBaseNoDate, ArcGIS):
         }
         df = df.rename(columns=crename).loc[:, crename.values()]
 
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         gbc = df.groupby(["dt", "fips"])
 
         agged = gbc.agg(
@@ -72,8 +78,7 @@ class MissouriFips(DatasetBaseNoDate, ArcGIS):
             .assign(vintage=self._retrieve_vintage())
         )
 
-    def _get_county_deaths(self):
-        df = self.get_all_sheet_to_df("county_MOHSIS_map", 0, 6)
+    def _get_county_deaths(self, df):
         renamed = df.rename(columns={"DEATHS": "deaths_total", "NAME": "county"})
         return (
             renamed[["county", "deaths_total"]]
@@ -83,31 +88,29 @@ class MissouriFips(DatasetBaseNoDate, ArcGIS):
             )
         )
 
-    def _get_deaths_timeseries(self):
-        df = self.get_all_sheet_to_df("Daily_Deaths_Automated", 0, 6)
+    def _get_deaths_timeseries(self, df):
         df = df.rename(
             columns={"Date_of_Death": "dt", "Cumulative_Cases": "deaths_total"}
         )
 
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         return (
             df[["dt", "deaths_total"]]
             .melt(id_vars=["dt"], var_name="variable_name")
             .assign(vintage=self._retrieve_vintage(), fips=self.state_fips)
         )
 
-    def _get_tests(self):
+    def _get_tests(self, df):
         crename = {
             "test_date2": "dt",
             "Negative": "negative_tests_total",
             "Positive": "positive_tests_total",
             "Total": "tests_total",
         }
-        df = self.get_all_sheet_to_df("PCR_Test_by_Date_Automated", 0, 6)
         df = df.rename(columns=crename).loc[:, crename.values()]
         df = df.dropna(subset=["dt"])
 
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         cumulative = df.sort_values("dt").set_index("dt").cumsum().reset_index()
 
         return (
@@ -77,7 +77,7 @@ class Nebraska(DatasetBaseNoDate, ArcGIS):
         ]
 
         # Convert timestamps
-        keep["dt"] = keep["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        keep["dt"] = self._esri_ts_col_to_dt(keep["dt"])
         keep["fips"] = self.state_fips
 
         out = keep.melt(id_vars=["dt", "fips"], var_name="variable_name")
@@ -38,17 +38,18 @@ class OKTulsa(DatasetBaseNoDate, ArcGIS):
     def get(self):
         # Note: Service=Covid19Coronavirusdata_V3_View seems to have caser by
         #       case data
-        df_cd = self.get_all_sheet_to_df("COVID19_Regions_V3_View", 0, 3).drop(
-            columns=["FID", "Latitude", "Longitude"]
+        df_cd, df_hosp = self.get_sheets_to_df(
+            [("COVID19_Regions_V3_View", 0, 3), ("COVID19Hospitalizations_View", 0, 3)]
         )
-        df_hosp = self.get_all_sheet_to_df("COVID19Hospitalizations_View", 0, 3).drop(
+        df_cd = df_cd.drop(columns=["FID", "Latitude", "Longitude"])
+        df_hosp = df_hosp.drop(
             columns=["FID", "Latitude", "Longitude", "In_Hospital", "Admissions"]
         )
         df = df_cd.merge(df_hosp, on=["Date", "County"], how="outer")
 
         # Divide by 1000 because arcgis spits time out in epoch milliseconds
         # rather than epoch seconds
-        df["Date"] = df["Date"].map(lambda x: self._esri_ts_to_dt(x))
+        df["Date"] = self._esri_ts_col_to_dt(df["Date"])
 
         # Rename columns
         crenamer = {
@@ -52,7 +52,7 @@ class Pennsylvania(DatasetBaseNoDate, ArcGIS):
             "covid_vents": "ventilators_in_use_covid_total",
         }
         df = df.rename(columns=column_map).loc[:, column_map.values()]
-        df["dt"] = df["dt"].map(self._esri_ts_to_dt)
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
 
         # Adjust current columns and add new ones
         df["hospital_beds_capacity_count"] += df["icu_beds_capacity_count"]
@@ -21,7 +21,7 @@ class Texas(DatasetBaseNoDate, ArcGIS):
             columns={"Date": "dt", "ViralTests": "tests_total",}
         )
 
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
         df["fips"] = self.state_fips
 
         df = df.loc[:, ["dt", "fips", "tests_total"]]
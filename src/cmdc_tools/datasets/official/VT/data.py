@@ -39,7 +39,7 @@ class Vermont(DatasetBaseNoDate, ArcGIS):
 
         # Convert to datetime -- Need to divide by 1000 to convert from ms
         hosp["fips"] = self.state_fips
-        hosp["dt"] = hosp["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        hosp["dt"] = self._esri_ts_col_to_dt(hosp["dt"])
 
         hosp["hospital_beds_in_use_covid_total"] = hosp.eval(
             "hospital_beds_in_use_covid_confirmed + hospital_beds_in_use_covid_suspected"
@@ -71,7 +71,7 @@ class Vermont(DatasetBaseNoDate, ArcGIS):
             }
         )
 
-        county["dt"] = county["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        county["dt"] = self._esri_ts_col_to_dt(county["dt"])
         out = county.loc[:, ["dt", "fips", "cases_confirmed", "deaths_total"]].melt(
             id_vars=["dt", "fips"], var_name="variable_name", value_name="value"
         )
@@ -95,7 +95,7 @@ class Vermont(DatasetBaseNoDate, ArcGIS):
         )
 
         # Convert Timestamps
-        state["dt"] = state["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        state["dt"] = self._esri_ts_col_to_dt(state["dt"])
         state["fips"] = self.state_fips
 
         state_keep = [
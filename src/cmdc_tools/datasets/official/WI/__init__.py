@@ -48,7 +48,7 @@ class Wisconsin(DatasetBaseNoDate, ArcGIS):
         df = df.rename(columns=crename).loc[:, crename.values()]
 
         # Convert dt
-        df["dt"] = df["dt"].map(lambda x: self._esri_ts_to_dt(x))
+        df["dt"] = self._esri_ts_col_to_dt(df["dt"])
 
         # Create total tests
         df["tests_total"] = df.eval("positive_tests_total + negative_tests_total")
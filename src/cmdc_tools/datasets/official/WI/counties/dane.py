@@ -16,13 +16,12 @@ class WIDane(DatasetBaseNoDate, ArcGIS):
     state_fips = int(us.states.lookup("Wisconsin").fips)
     has_fips = True
 
-    def _get_case_death(self):
+    def _get_case_death(self, df):
         crename = {
             "Date": "dt",
             "Total_cases": "cases_total",
             "Deaths": "deaths_total",
         }
-        df = self.get_all_sheet_to_df("CaseCount_vw", 0, "")
         df = df.rename(columns=crename).loc[:, crename.values()]
         df = df.dropna(subset=["dt"])
         df["dt"] = pd.to_datetime(df["dt"] + "/2020")
@@ -38,13 +37,12 @@ class WIDane(DatasetBaseNoDate, ArcGIS):
 
         return out
 
-    def _get_hospital(self):
+    def _get_hospital(self, df):
         crename = {
             "Date": "dt",
             "Total_COVID_19_Patients_in_ICU": "icu_beds_in_use_covid_total",
             "Total_COVID_19_Inpatients": "hospital_beds_in_use_covid_total",
         }
-        df = self.get_all_sheet_to_df("hospitalization_timeseries_ver3_0_vw", 0, "")
         df = df.rename(columns=crename).loc[:, crename.values()]
         df = df.dropna(subset=["dt"])
         df["dt"] = pd.to_datetime(df["dt"] + "/2020")
@@ -67,12 +65,11 @@ class WIDane(DatasetBaseNoDate, ArcGIS):
 
         return out
 
-    def _get_tests(self):
+    def _get_tests(self, df):
         crename = {
             "Date": "dt",
             "Number_of_Tests_Administered": "tests_total",
         }
-        df = self.get_all_sheet_to_df("tests_by_day_ver3_0_vw", 0, "")
         df = df.rename(columns=crename).loc[:, crename.values()]
         df = df.dropna(subset=["dt"])
         df["dt"] = pd.to_datetime(df["dt"] + "/2020")
@@ -86,8 +83,19 @@ class WIDane(DatasetBaseNoDate, ArcGIS):
         return out
 
     def get(self):
+        case_death, hospital, tests = self.get_sheets_to_df(
+            [
+                ("CaseCount_vw", 0, ""),
+                ("hospitalization_timeseries_ver3_0_vw", 0, ""),
+                ("tests_by_day_ver3_0_vw", 0, ""),
+            ]
+        )
         out = pd.concat(
-            [self._get_case_death(), self._get_hospital(), self._get_tests(),],
+            [
+                self._get_case_death(case_death),
+                self._get_hospital(hospital),
+                self._get_tests(tests),
+            ],
             axis=0,
             ignore_index=True,
         ).assign(
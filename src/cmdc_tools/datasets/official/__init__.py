@@ -1,7 +1,7 @@
 from .AK import Alaska
 from .AL import AlabamaCounty, AlabamaFips
 from .AR import Arkansas
-from .base import ArcGIS, CountyData
+from .base import ArcGIS, ArcGISSheet, CountyData, put_county_data
 from .CA import CACountyData, California, Imperial, LosAngeles, CAOrange, SanDiego
 from .CT import ConnecticutCounty, ConnecticutState
 from .DC import DC
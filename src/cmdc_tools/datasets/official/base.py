@@ -1,10 +1,23 @@
+import json
+import os
 import textwrap
+import threading
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlparse
 
+import numpy as np
 import pandas as pd
 import requests
+import sqlalchemy as sa
+from dateutil.tz import tzlocal
+from requests.adapters import HTTPAdapter
 
 from .. import InsertWithTempTable
+from ..base import _build_covid_insert_query, _build_covid_source_query
+from ..db_util import StagingTable, get_engine
+from ..lookups import get_meta_cache, resolve_ids
 
 
 class CountyData(InsertWithTempTable, ABC):
@@ -15,9 +28,16 @@ class CountyData(InsertWithTempTable, ABC):
     has_fips: bool
     state_fips: int
     provider: str = "state"
+    use_meta_cache = True
+    # unknown variables and counties were dropped by the insert joins
+    drop_unresolved = True
 
     def _insert_query(self, df: pd.DataFrame, table_name: str, temp_name: str, pk: str):
-        if self.has_fips:
+        if "variable_id" in df and "fips" in df:
+            out = _build_covid_insert_query(
+                table_name, temp_name, pk, provider=self.provider
+            )
+        elif self.has_fips:
             out = f"""
             INSERT INTO data.{table_name} (
               vintage, dt, fips, variable_id, value, provider
@@ -43,6 +63,254 @@ class CountyData(InsertWithTempTable, ABC):
         return textwrap.dedent(out)
 
 
+# Columns of the frames staged by `put_county_data`
+_US_COVID_COLS = ["vintage", "dt", "fips", "variable_id", "value"]
+_PROVIDER_ORDER = ["county", "state", "ctp", "hhs", "usafacts", "nyt", "cds"]
+
+
+def _prep_county_frame(
+    connstr: str, dataset: CountyData, df: pd.DataFrame
+) -> pd.DataFrame:
+    "Resolve ids in the output `df` of `dataset` and check its schema"
+    name = type(dataset).__name__
+    if dataset.table_name != "us_covid":
+        msg = f"{name} writes to data.{dataset.table_name}, not data.us_covid"
+        raise ValueError(msg)
+    if dataset.provider not in _PROVIDER_ORDER:
+        raise ValueError(f"{name} has unknown provider {dataset.provider!r}")
+
+    out = resolve_ids(
+        get_meta_cache(connstr),
+        df,
+        state_fips=getattr(dataset, "state_fips", None),
+        drop_unresolved=dataset.drop_unresolved,
+    )
+    if sorted(out) != sorted(_US_COVID_COLS):
+        msg = f"Columns of {name} output don't match data.us_covid. Expected "
+        msg += f"{_US_COVID_COLS} after resolving ids, found {list(out)}"
+        raise ValueError(msg)
+
+    out = out[_US_COVID_COLS].assign(
+        vintage=pd.to_datetime(out["vintage"]),
+        dt=pd.to_datetime(out["dt"]),
+        value=pd.to_numeric(out["value"]),
+    )
+    for col in ["vintage", "dt"]:
+        if pd.api.types.is_datetime64tz_dtype(out[col]):
+            out[col] = out[col].dt.tz_localize(None)
+    return out.assign(provider=dataset.provider)
+
+
+def put_county_data(
+    connstr: str,
+    frames: Iterable[Tuple[CountyData, pd.DataFrame]],
+    log_source: bool = False,
+    chunksize: Optional[int] = None,
+):
+    """
+    Load the output of many `CountyData` datasets into `data.us_covid`
+    with a single COPY and a single upsert
+
+    Each frame is resolved to (vintage, dt, fips, variable_id, value)
+    the same way `CountyData.put` would, checked against that schema
+    and tagged with the `provider` of its dataset. When several frames
+    contain the same (vintage, dt, fips, variable), the row from the
+    highest priority provider wins, and among rows from the same
+    provider the one from the later frame wins
+
+    Parameters
+    ----------
+    connstr: str
+        The database connection string
+    frames: Iterable[Tuple[CountyData, pd.DataFrame]]
+        Pairs of a dataset and the DataFrame returned by its `get`
+    log_source: bool
+        Whether to log the `source` of each dataset in
+        `data.covid_sources`, in the same transaction as the data
+    chunksize: int, optional
+        Passed to `fast_to_sql`
+
+    Returns
+    -------
+    n: int
+        The number of rows staged
+    """
+    pieces: List[pd.DataFrame] = []
+    sources: List[pd.DataFrame] = []
+    for dataset, df in frames:
+        out = _prep_county_frame(connstr, dataset, df)
+        pieces.append(out)
+
+        if log_source:
+            if getattr(dataset, "source", None) is None:
+                raise ValueError(f"{type(dataset).__name__} has no source")
+            src = out[["fips", "variable_id"]].drop_duplicates()
+            rank = -_PROVIDER_ORDER.index(dataset.provider)
+            sources.append(src.assign(source=dataset.source, _rank=rank))
+
+    if len(pieces) == 0:
+        return 0
+
+    # keep one row per key: best provider, then latest frame
+    df = pd.concat(pieces, ignore_index=True)
+    df["provider"] = pd.Categorical(df["provider"], categories=_PROVIDER_ORDER)
+    df = (
+        df.assign(_rank=-df["provider"].cat.codes)
+        .sort_values("_rank", kind="mergesort")
+        .drop_duplicates(["vintage", "dt", "fips", "variable_id"], keep="last")
+        .drop(columns=["_rank"])
+    )
+    df["provider"] = df["provider"].cat.remove_unused_categories()
+
+    insert = f"""
+    INSERT INTO data.us_covid (vintage, dt, fips, variable_id, value, provider)
+    SELECT vintage, dt, fips, variable_id, value, provider::covid_provider
+    FROM __put_county_data
+    ON CONFLICT (fips, dt, vintage, variable_id) DO UPDATE SET value = excluded.value
+    """
+    kw = dict(binary=True, chunksize=chunksize)
+    with get_engine(connstr).begin() as conn:
+        with StagingTable(df, "__put_county_data", conn, **kw):
+            conn.execute(textwrap.dedent(insert))
+
+        if log_source:
+            # the same priority as the rows, so the log names the kept source
+            src = (
+                pd.concat(sources, ignore_index=True)
+                .sort_values("_rank", kind="mergesort")
+                .drop_duplicates(["fips", "variable_id"], keep="last")
+                .drop(columns=["_rank"])
+            )
+            log = _build_covid_source_query(
+                "SELECT fips AS location, variable_id, source, 'us_covid' AS table_name "
+                "FROM __put_county_data_sources"
+            )
+            this_date = pd.Timestamp.utcnow().normalize()
+            with StagingTable(src, "__put_county_data_sources", conn):
+                conn.execute(
+                    sa.text(textwrap.dedent(log)),
+                    date_accessed=this_date.to_pydatetime(),
+                )
+
+    return df.shape[0]
+
+
+# Most requests in flight to one ArcGIS host at a time, across all scrapers
+# and threads
+ARCGIS_HOST_LIMIT = int(os.environ.get("ARCGIS_HOST_LIMIT", 8))
+
+_arcgis_lock = threading.Lock()
+_arcgis_session: Optional[requests.Session] = None
+_arcgis_hosts: Dict[str, threading.BoundedSemaphore] = {}
+
+
+def _get_arcgis_session() -> requests.Session:
+    "The session shared by all ArcGIS requests, so connections are reused"
+    global _arcgis_session
+    with _arcgis_lock:
+        if _arcgis_session is None:
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=ARCGIS_HOST_LIMIT)
+            _arcgis_session = requests.Session()
+            _arcgis_session.mount("https://", adapter)
+            _arcgis_session.mount("http://", adapter)
+        return _arcgis_session
+
+
+def _arcgis_host_limit(url: str) -> threading.BoundedSemaphore:
+    "The semaphore that bounds the requests in flight to the host of `url`"
+    host = urlparse(url).netloc
+    with _arcgis_lock:
+        if host not in _arcgis_hosts:
+            _arcgis_hosts[host] = threading.BoundedSemaphore(ARCGIS_HOST_LIMIT)
+        return _arcgis_hosts[host]
+
+
+_ESRI_DATE_TYPE = "esriFieldTypeDate"
+
+
+def _esri_ms_to_datetime(ms: np.ndarray) -> np.ndarray:
+    "Epoch milliseconds (NaN for missing) as naive UTC datetime64[ns]"
+    missing = np.isnan(ms)
+    out = np.where(missing, 0, ms).astype("int64").astype("datetime64[ms]")
+    out = out.astype("datetime64[ns]")
+    out[missing] = np.datetime64("NaT")
+    return out
+
+
+def _infer_column(col: np.ndarray) -> pd.Series:
+    """
+    The object array `col` of JSON values typed as `from_records` would
+
+    Columns of only ints, floats and None (the usual case) are converted
+    directly, others are left to pandas
+    """
+    types = set(map(type, col))
+    if not types or not types <= {int, float, type(None)} or types == {type(None)}:
+        return pd.Series(col).infer_objects()
+
+    try:
+        if types == {int}:
+            return pd.Series(col.astype("int64"))
+        return pd.Series(col.astype("float64"))
+    except OverflowError:
+        return pd.Series(col).infer_objects()
+
+
+def _arcgis_pages_to_df(pages: Sequence[dict], esri_dates: bool = False):
+    """
+    Decode the features of the responses `pages` of an ArcGIS query into
+    one DataFrame
+
+    Each column is allocated once for the features of all pages, in the
+    order of the `fields` of the first page, and filled page by page.
+    The column types are then inferred as `pd.DataFrame.from_records`
+    would, e.g. integers become int64, or float64 if they have nulls.
+    Date fields are epoch milliseconds like integers, or naive UTC
+    datetime64 with `esri_dates`. If the fields are missing or don't
+    describe the features, the features are decoded as records instead
+    """
+    features = [page["features"] for page in pages]
+    n = sum(len(x) for x in features)
+    fields = pages[0].get("fields") if len(pages) > 0 else None
+    first = next((x[0]["attributes"] for x in features if len(x) > 0), {})
+    names = [field["name"] for field in fields or []]
+
+    if not fields or set(first) != set(names):
+        records = [x["attributes"] for page in features for x in page]
+        return pd.DataFrame.from_records(records)
+
+    cols = {name: np.empty(n, dtype=object) for name in names}
+    start = 0
+    for page in features:
+        stop = start + len(page)
+        attrs = [x["attributes"] for x in page]
+        for name, col in cols.items():
+            col[start:stop] = [a.get(name) for a in attrs]
+        start = stop
+
+    df = pd.DataFrame({k: _infer_column(v) for k, v in cols.items()}, columns=names)
+    if esri_dates:
+        for field in fields:
+            if field.get("type") == _ESRI_DATE_TYPE:
+                ms = np.asarray(df[field["name"]], dtype="float64")
+                df[field["name"]] = _esri_ms_to_datetime(ms)
+
+    return df
+
+
+class ArcGISSheet(NamedTuple):
+    """
+    A layer to fetch with `ArcGIS.get_sheets_to_df`
+
+    `params` replaces the `params` of the dataset for this layer only
+    """
+
+    service: str
+    sheet: int
+    srvid: Any
+    params: Optional[Dict[str, Any]] = None
+
+
 class ArcGIS(CountyData, ABC):
     """
     Must define class variables:
@@ -54,6 +322,16 @@ class ArcGIS(CountyData, ABC):
     """
 
     ARCGIS_ID: str
+    # How many pages of a layer `get_all_sheet_to_df` requests at once.
+    # With 1 the pages are requested one after the other
+    page_concurrency: int = 4
+    # Whether date fields are decoded to (naive UTC) datetime64 instead
+    # of being left as epoch milliseconds
+    esri_dates: bool = False
+    # The timezone the dates of the dataset are given in, e.g. "US/Central".
+    # ESRI timestamps are converted to it before they are truncated to a
+    # day. None uses the local time of the machine
+    timezone: Optional[str] = None
 
     def __init__(self, params=None):
         super(ArcGIS, self).__init__()
@@ -70,7 +348,31 @@ class ArcGIS(CountyData, ABC):
         self.params = params
 
     def _esri_ts_to_dt(self, ts):
-        return pd.Timestamp.fromtimestamp(ts / 1000).normalize()
+        if self.timezone is None:
+            return pd.Timestamp.fromtimestamp(ts / 1000).normalize()
+
+        out = pd.Timestamp(ts, unit="ms", tz="UTC").tz_convert(self.timezone)
+        return out.tz_localize(None).normalize()
+
+    def _esri_ts_col_to_dt(self, col: pd.Series) -> pd.Series:
+        """
+        `_esri_ts_to_dt` for a whole column of ESRI timestamps: epoch
+        milliseconds, or UTC datetimes decoded with `esri_dates`
+
+        Missing timestamps become NaT. Only the distinct timestamps are
+        converted (a date column has few of them), then spread back over
+        the rows
+        """
+        codes, uniques = pd.factorize(col)
+        if not pd.api.types.is_datetime64_any_dtype(uniques):
+            uniques = pd.to_datetime(uniques, unit="ms")
+        tz = tzlocal() if self.timezone is None else self.timezone
+        days = uniques.tz_localize("UTC").tz_convert(tz).tz_localize(None).normalize()
+
+        values = np.asarray(days, dtype="datetime64[ns]")[codes]
+        values[codes < 0] = np.datetime64("NaT")
+
+        return pd.Series(values, index=col.index, name=col.name)
 
     def arcgis_query_url(self, service, sheet, srvid):
         out = f"https://services{srvid}.arcgis.com/{self.ARCGIS_ID}/"
@@ -78,17 +380,71 @@ class ArcGIS(CountyData, ABC):
 
         return out
 
+    def query_params(
+        self,
+        where: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+        stats: Optional[Dict[str, Tuple[str, str]]] = None,
+        group_by: Sequence[str] = (),
+    ) -> Dict[str, Any]:
+        """
+        A copy of `self.params` that asks the server for less
+
+        Parameters
+        ----------
+        where: str, optional
+            SQL filter on the features, replacing the default one
+        fields: Sequence[str], optional
+            Only return these fields (``outFields``)
+        stats: Dict[str, Tuple[str, str]], optional
+            Return statistics instead of features. Maps the name of each
+            output column to a (statistic, field) pair, e.g.
+            ``{"cases": ("sum", "Cases")}``. The statistic is one of
+            count, sum, min, max, avg, stddev or var
+        group_by: Sequence[str]
+            With `stats`, compute the statistics for each group of these
+            fields, which are returned as columns too
+
+        Returns
+        -------
+        params: Dict[str, Any]
+            Parameters for `get_all_sheet_to_df` or an `ArcGISSheet`
+        """
+        params = self.params.copy()
+        if where is not None:
+            params["where"] = where
+        if fields is not None:
+            params["outFields"] = ",".join(fields)
+        if stats is not None:
+            out_stats = [
+                {
+                    "statisticType": stat,
+                    "onStatisticField": field,
+                    "outStatisticFieldName": name,
+                }
+                for name, (stat, field) in stats.items()
+            ]
+            params["outStatistics"] = json.dumps(out_stats)
+            params["outFields"] = ",".join(group_by) or "*"
+            if len(group_by) > 0:
+                params["groupByFieldsForStatistics"] = ",".join(group_by)
+
+        return params
+
     def get_res_json(self, service, sheet, srvid, params):
         # Perform actual request
         url = self.arcgis_query_url(service=service, sheet=sheet, srvid=srvid)
-        res = requests.get(url, params=params)
+        with _arcgis_host_limit(url):
+            res = _get_arcgis_session().get(url, params=params)
 
         return res.json()
 
     def arcgis_json_to_df(self, res_json):
-        df = pd.DataFrame.from_records([x["attributes"] for x in res_json["features"]])
+        return self.arcgis_pages_to_df([res_json])
 
-        return df
+    def arcgis_pages_to_df(self, pages):
+        "The features of the responses in `pages` as one DataFrame"
+        return _arcgis_pages_to_df(pages, esri_dates=self.esri_dates)
 
     def get_single_sheet_to_df(self, service, sheet, srvid, params):
 
@@ -100,34 +456,114 @@ class ArcGIS(CountyData, ABC):
 
         return df
 
-    def get_all_sheet_to_df(self, service, sheet, srvid):
+    def get_count(self, service, sheet, srvid, params=None) -> Optional[int]:
+        """
+        Number of features of a layer that match `params` (`self.params`
+        by default), or None if the server can't count them
+        """
+        params = dict(self.params if params is None else params)
+        if "outStatistics" in params:
+            # the count would be of the features, not of the groups
+            return None
+        params.pop("resultOffset", None)
+        params.update({"f": "json", "returnCountOnly": "true"})
+        res_json = self.get_res_json(service, sheet, srvid, params)
+
+        return res_json.get("count")
+
+    def get_all_sheet_to_df(self, service, sheet, srvid, params=None):
+        """
+        Fetch every feature of a layer that matches `params` (`self.params`
+        by default), one page (of as many features as the server returns
+        per response) at a time
+
+        If the first page doesn't hold the whole layer, the features are
+        counted and the remaining pages are requested `page_concurrency`
+        at a time. The pages are decoded together, in order of their
+        offset, by `arcgis_pages_to_df`. Pages past the count (features
+        added in the meantime) are requested one after the other, as with
+        `page_concurrency` = 1. So are all the pages if the concurrent ones
+        don't add up to the count, e.g. because the server returned fewer
+        features than the first page held
+        """
         # Get a copy so that we don't screw up main parameters
-        curr_params = self.params.copy()
+        curr_params = (self.params if params is None else params).copy()
 
         # Get first request and detrmine number of requests that come per
         # response
         res_json = self.get_res_json(service, sheet, srvid, curr_params)
-        total_offset = len(res_json["features"])
+        page_size = len(res_json["features"])
+        total_offset = page_size
 
-        # Use first response to create first DataFrame
-        _dfs = [self.arcgis_json_to_df(res_json)]
+        # Keep the responses and decode them all at once at the end
+        pages = [res_json]
         unbroken_chain = res_json.get("exceededTransferLimit", False)
+
+        count = None
+        if unbroken_chain and self.page_concurrency > 1 and page_size > 0:
+            count = self.get_count(service, sheet, srvid, curr_params)
+
+        if count is not None and count > total_offset:
+
+            def _get_page(offset):
+                params = dict(curr_params, resultOffset=offset)
+                return self.get_res_json(service, sheet, srvid, params)
+
+            offsets = range(total_offset, count, page_size)
+            with ThreadPoolExecutor(max_workers=self.page_concurrency) as pool:
+                rest = list(pool.map(_get_page, offsets))
+
+            # The offsets assume every page but the last is full. If the
+            # server returned a short page (or the layer shrank) the pages
+            # leave gaps, so page through them one after the other instead
+            n_features = [len(x["features"]) for x in rest]
+            complete = (
+                all(x == page_size for x in n_features[:-1])
+                and all(x.get("exceededTransferLimit", False) for x in rest[:-1])
+                and total_offset + sum(n_features) >= count
+            )
+            if complete:
+                pages.extend(rest)
+                total_offset += sum(n_features)
+                unbroken_chain = rest[-1].get("exceededTransferLimit", False)
+
         while unbroken_chain:
             # Update parameters and make request
             curr_params.update({"resultOffset": total_offset})
             res_json = self.get_res_json(service, sheet, srvid, curr_params)
-
-            # Convert to DataFrame and store in df list
-            _df = self.arcgis_json_to_df(res_json)
-            _dfs.append(_df)
+            pages.append(res_json)
 
             total_offset += len(res_json["features"])
             unbroken_chain = res_json.get("exceededTransferLimit", False)
 
-        # Stack these up
-        df = pd.concat(_dfs)
+        # Decode every page into one DataFrame
+        return self.arcgis_pages_to_df(pages)
 
-        return df
+    def get_sheets_to_df(self, sheets: Sequence[ArcGISSheet]) -> List[pd.DataFrame]:
+        """
+        Fetch several layers at once with `get_all_sheet_to_df`
+
+        The requests share one session and at most `ARCGIS_HOST_LIMIT`
+        of them (pages included) are in flight to a host at a time
+
+        Parameters
+        ----------
+        sheets: Sequence[ArcGISSheet]
+            The layers to fetch, as `ArcGISSheet` or (service, sheet,
+            srvid[, params]) tuples
+
+        Returns
+        -------
+        dfs: List[pd.DataFrame]
+            The features of each layer, in the order of `sheets`
+        """
+        sheets = [ArcGISSheet(*x) for x in sheets]
+
+        def _get(x: ArcGISSheet) -> pd.DataFrame:
+            return self.get_all_sheet_to_df(x.service, x.sheet, x.srvid, x.params)
+
+        with ThreadPoolExecutor(min(len(sheets), ARCGIS_HOST_LIMIT) or 1) as pool:
+            return list(pool.map(_get, sheets))
 
 
 class SODA(CountyData, ABC):
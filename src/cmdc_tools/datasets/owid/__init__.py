@@ -1,11 +1,8 @@
-import random
 from typing import List
 
 import pandas as pd
-import sqlalchemy as sa
 
-from ..base import DatasetBaseNoDate
-from ..db_util import TempTable
+from ..base import DatasetBaseNoDate, PutTarget
 
 meta_columns = [
     "iso_code",
@@ -39,31 +36,37 @@ class OWID(DatasetBaseNoDate):
             .dropna(subset=["iso_code"])
         )
 
-    def _put_one(
-        self, connstr: str, sub: pd.DataFrame, table_name: str, cols: List[str], pk: str
-    ):
-        temp_name = f"__{table_name}" + str(random.randint(1000, 9999))
+    def _insert_sql(self, table_name: str, cols: List[str], pk: str) -> str:
         sql = """
         INSERT INTO data.{table_name} ({cols})
-        SELECT {cols} from {temp_name}
+        SELECT {cols} from {{temp_name}}
         on conflict {pk} do nothing;
-        """.format(
-            cols=",".join(cols), temp_name=temp_name, table_name=table_name, pk=pk
-        )
-
-        with sa.create_engine(connstr).connect() as conn:
-            kw = dict(temp=False, if_exists="replace", destroy=True)
-            with TempTable(sub, temp_name, conn, **kw):
-                conn.execute(sql)
+        """
+        return sql.format(cols=",".join(cols), table_name=table_name, pk=pk)
 
     def put(self, conn: str, df: pd.DataFrame):
         # first handle locations
         locations = df.groupby("iso_code").apply(
             lambda x: x.loc[:, meta_columns].iloc[0]
         )
-        self._put_one(conn, locations, "owid_locations", meta_columns, pk="(iso_code)")
 
         # then handle data
         data_columns = list(set(list(df)) - set(meta_columns)) + ["iso_code"]
         data = df.loc[:, data_columns]
-        self._put_one(conn, data, "owid_covid", data_columns, pk="(iso_code, dt)")
+
+        # data is staged while locations load, but only inserted after
+        # the locations it references have committed
+        targets = [
+            PutTarget(
+                "owid_locations",
+                locations,
+                self._insert_sql("owid_locations", meta_columns, pk="(iso_code)"),
+            ),
+            PutTarget(
+                "owid_covid",
+                data,
+                self._insert_sql("owid_covid", data_columns, pk="(iso_code, dt)"),
+                after=("owid_locations",),
+            ),
+        ]
+        self._put_many(conn, targets)
@@ -0,0 +1,160 @@
+"""
+Maintenance of the tables partitioned by vintage month
+
+`data.us_covid` and the provider tables that feed it are range
+partitioned by vintage, one partition per month plus a default
+partition (see ``db/schemas/034_partition_covid_tables.sql``). The
+functions here wrap the SQL functions defined there so they can be run
+from a scheduled job
+"""
+from typing import List, Optional
+
+import pandas as pd
+import sqlalchemy as sa
+
+from .db_util import get_engine
+
+PARTITIONED_TABLES = [
+    "us_covid",
+    "ctp_covid",
+    "nyt_covid",
+    "usafacts_covid",
+    "hhs_covid",
+]
+
+
+def _month(x=None) -> pd.Timestamp:
+    "The first day of the month of `x` (or of today)"
+    if x is None:
+        x = pd.Timestamp.utcnow().tz_localize(None)
+    return pd.Timestamp(x).to_period("M").to_timestamp()
+
+
+def list_partitions(connstr: str, table: str) -> pd.DataFrame:
+    """
+    The partitions of `data.{table}` with the first vintage month each
+    one holds (NaT for the default partition) and its estimated rows
+    """
+    sql = """
+    SELECT c.relname AS partition,
+           substring(pg_get_expr(c.relpartbound, c.oid) FROM 'FROM \\(''([^'']+)''\\)')::date AS month,
+           c.reltuples::bigint AS rows
+    FROM pg_inherits i
+    INNER JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = (:table)::regclass
+    ORDER BY month NULLS FIRST
+    """
+    with get_engine(connstr).connect() as conn:
+        df = pd.read_sql(sa.text(sql), conn, params=dict(table=f"data.{table}"))
+    return df.assign(month=pd.to_datetime(df["month"]))
+
+
+def create_partitions(
+    connstr: str, months_ahead: int = 2, tables: Optional[List[str]] = None
+) -> int:
+    """
+    Create the monthly partitions for the current month and the next
+    `months_ahead` months, plus any month with rows in a default
+    partition (those rows are moved into the new partition)
+
+    Returns the number of partitions created
+    """
+    last = _month() + pd.DateOffset(months=months_ahead)
+    engine = get_engine(connstr)
+    created = 0
+    for table in tables or PARTITIONED_TABLES:
+        sql = f"SELECT min(vintage) FROM data.{table}_default"
+        first = min(_month(), _month(engine.execute(sql).scalar() or _month()))
+        created += create_partitions_between(connstr, first, last, [table])
+    return created
+
+
+def create_partitions_between(
+    connstr: str, first, last, tables: Optional[List[str]] = None
+) -> int:
+    """
+    Create the monthly partitions for every month from `first` through
+    `last`, e.g. before loading vintages from the past
+
+    Returns the number of partitions created
+    """
+    engine = get_engine(connstr)
+    created = 0
+    for table in tables or PARTITIONED_TABLES:
+        with engine.begin() as conn:
+            created += conn.execute(
+                sa.text("SELECT data.create_vintage_partitions(:table, :first, :last)"),
+                table=table,
+                first=_month(first).date(),
+                last=_month(last).date(),
+            ).scalar()
+    return created
+
+
+def compact(
+    connstr: str,
+    keep_months: int = 2,
+    tables: Optional[List[str]] = None,
+    vacuum: bool = True,
+) -> pd.DataFrame:
+    """
+    Collapse every vintage month older than the last `keep_months` full
+    months to revision-only rows (see `data.compact_vintage_partition`)
+
+    Months that were already compacted are skipped. Each month is
+    compacted in its own transaction and, if `vacuum` is True, its
+    partition is vacuumed afterwards so the space is reused right away
+
+    Returns a DataFrame with the rows deleted for each table and month
+    """
+    cutoff = _month() - pd.DateOffset(months=keep_months)
+    engine = get_engine(connstr)
+    out = []
+    for table in tables or PARTITIONED_TABLES:
+        parts = list_partitions(connstr, table).dropna(subset=["month"])
+        done = engine.execute(
+            sa.text("SELECT month FROM data.vintage_compactions WHERE table_name = :t"),
+            t=table,
+        ).fetchall()
+        done = {pd.Timestamp(r.month) for r in done}
+
+        for _, part in parts.loc[parts["month"] < cutoff].iterrows():
+            if part["month"] in done:
+                continue
+            with engine.begin() as conn:
+                deleted = conn.execute(
+                    sa.text("SELECT data.compact_vintage_partition(:table, :month)"),
+                    table=table,
+                    month=part["month"].date(),
+                ).scalar()
+            if vacuum:
+                with engine.connect() as conn:
+                    conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+                    conn.execute(f"VACUUM ANALYZE data.{part['partition']}")
+            out.append(dict(table=table, month=part["month"], rows_deleted=deleted))
+
+    return pd.DataFrame(out, columns=["table", "month", "rows_deleted"])
+
+
+def detach_partition(connstr: str, table: str, month) -> str:
+    """
+    Detach the partition of `data.{table}` holding the vintages of
+    `month`. The detached table keeps its name and can be archived,
+    dropped or attached again with `attach_partition`
+    """
+    with get_engine(connstr).begin() as conn:
+        return conn.execute(
+            sa.text("SELECT data.detach_vintage_partition(:table, :month)"),
+            table=table,
+            month=_month(month).date(),
+        ).scalar()
+
+
+def attach_partition(connstr: str, table: str, month) -> str:
+    "Attach a table detached with `detach_partition` again"
+    with get_engine(connstr).begin() as conn:
+        return conn.execute(
+            sa.text("SELECT data.attach_vintage_partition(:table, :month)"),
+            table=table,
+            month=_month(month).date(),
+        ).scalar()
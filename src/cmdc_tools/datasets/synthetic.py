@@ -0,0 +1,473 @@
+"""
+Synthetic data at national scale for load and query testing
+
+`generate` fills a database built from `db/schemas` with made up but
+realistically shaped data: epidemic curves for every county in
+`meta.us_fips` (and their states), the variables of
+`meta.covid_variables` reported by each provider, many weekly vintages
+that re-send the full history with a few revisions, the county LEX/DEX
+mobility matrices and the ACS population estimates the scores are built
+from. Everything is written through the `put` methods of the real
+datasets (and `put_county_data` for the state and county providers),
+with their sources logged, so the triggers, latest-vintage tables,
+scores and sources are maintained exactly as in production
+
+By default the data ends yesterday and the last vintage is today, so the
+views that only look at recent days or vintages (the scores and
+`api.covid_sources`) have rows. Given the day it runs on (or a fixed
+`Scale.start`), the output is a deterministic function of the `Scale`,
+so benchmarks run against it are reproducible offline::
+
+    python -m cmdc_tools.datasets.synthetic --scale small $PG_CONN_STR
+"""
+import argparse
+import os
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from . import partitions
+from .cex import CountyDex, DailyCountyLex
+from .covidtrackingproject import CTP
+from .db_util import get_engine
+from .lookups import get_meta_cache
+from .nytimes import NYTimesCounty, NYTimesState
+from .official import HHS, CountyData, put_county_data
+from .usafacts import USAFactsCases, USAFactsDeaths
+from .uscensus import ACS, ACSVariables
+
+
+class Scale(NamedTuple):
+    # number of counties sampled from meta.us_fips (None for all of them)
+    counties: Optional[int] = None
+    # days of data, starting at `start` (None to end yesterday)
+    days: int = 240
+    start: Optional[str] = None
+    # vintages, `vintage_every` days apart and ending the day after the
+    # last day of data. Each one re-sends the full history up to it
+    vintages: int = 12
+    vintage_every: int = 7
+    # fraction of the values of each vintage that are later revised
+    revised: float = 0.02
+    # the LEX matrix covers this many counties over the last `lex_days`
+    lex_counties: int = 500
+    lex_days: int = 14
+    seed: int = 42
+
+
+SCALES = {
+    "tiny": Scale(counties=20, days=14, vintages=2, lex_counties=10, lex_days=2),
+    "small": Scale(counties=300, days=90, vintages=4, lex_counties=100, lex_days=7),
+    "national": Scale(),
+}
+
+DATASETS = ["acs", "official", "ctp", "hhs", "usafacts", "nyt", "dex", "lex"]
+
+CTP_VARIABLES = [
+    "cases_total",
+    "deaths_total",
+    "positive_tests_total",
+    "negative_tests_total",
+    "tests_total",
+    "hospital_beds_in_use_covid_total",
+    "icu_beds_in_use_covid_total",
+    "ventilators_in_use_covid_total",
+]
+HHS_VARIABLES = [
+    "hospital_beds_capacity_count",
+    "hospital_beds_in_use_any",
+    "hospital_beds_in_use_covid_total",
+    "icu_beds_capacity_count",
+    "icu_beds_in_use_any",
+    "icu_beds_in_use_covid_total",
+    "num_hospitals_reporting",
+    "num_of_hospitals",
+]
+OFFICIAL_VARIABLES = [
+    "cases_total",
+    "deaths_total",
+    "tests_total",
+    "hospital_beds_in_use_covid_total",
+]
+# the ACS estimates of `meta.acs_variables_selected` the scores read
+ACS_YEAR = 2018
+ACS_PRODUCT = "acs5"
+ACS_VARIABLES = {
+    "DP05_0001E": "Total population",
+    "DP05_0024PE": "Fraction of population over 65",
+}
+
+
+class _Official(CountyData):
+    "A state or county dashboard for `put_county_data`"
+    has_fips = True
+    source = "https://example.com/synthetic"
+
+    def __init__(self, provider: str):
+        self.provider = provider
+
+
+class _ACS(ACS):
+    "`ACS` for `put`, without looking the dataset up in the Census API"
+
+    def __init__(self):
+        self.year = ACS_YEAR
+        self.product = ACS_PRODUCT
+
+
+class _ACSVariables(_ACS, ACSVariables):
+    pass
+
+
+class _Geography(NamedTuple):
+    fips: np.ndarray
+    # the row of `counties` for each state in `states`
+    county_state: np.ndarray
+    states: np.ndarray
+
+
+def _geography(connstr: str, scale: Scale, rng) -> _Geography:
+    us_fips = get_meta_cache(connstr).us_fips()
+    counties = us_fips.loc[us_fips["fips"] > 1000].sort_values("fips")
+    if scale.counties is not None and scale.counties < counties.shape[0]:
+        keep = rng.choice(counties.shape[0], scale.counties, replace=False)
+        counties = counties.iloc[np.sort(keep)]
+
+    state_of = counties["state"].astype(int).values
+    states, county_state = np.unique(state_of, return_inverse=True)
+    return _Geography(counties["fips"].values.astype(int), county_state, states)
+
+
+def _curves(geo: _Geography, scale: Scale, rng) -> Dict[str, np.ndarray]:
+    """
+    One (location x day) array per variable, for the counties followed
+    by the states (each the sum of its sampled counties)
+    """
+    n = geo.fips.size
+    t = np.arange(scale.days)
+    size = rng.lognormal(9.5, 1.3, n)
+    attack = rng.uniform(0.005, 0.05, n)
+    peak = rng.uniform(0.3, 1.0, n) * scale.days
+    rate = rng.uniform(0.03, 0.12, n)
+    cases = size[:, None] * attack[:, None]
+    cases = cases / (1 + np.exp(-rate[:, None] * (t - peak[:, None])))
+    cases = np.floor(cases)
+
+    def _by_state(a):
+        out = np.zeros((geo.states.size, a.shape[1]))
+        np.add.at(out, geo.county_state, a)
+        return out
+
+    beds = np.ceil(size * 0.003)[:, None] * np.ones_like(cases)
+    recent = cases - np.pad(cases, ((0, 0), (14, 0)))[:, : scale.days]
+    hosp = np.floor(recent * 0.1)
+    tests = np.floor(cases * rng.uniform(8, 20, n)[:, None])
+    county = {
+        "cases_total": cases,
+        "deaths_total": np.floor(cases * rng.uniform(0.01, 0.03, n)[:, None]),
+        "tests_total": tests,
+        "positive_tests_total": cases,
+        "negative_tests_total": tests - cases,
+        "hospital_beds_in_use_covid_total": hosp,
+        "icu_beds_in_use_covid_total": np.floor(hosp * 0.3),
+        "ventilators_in_use_covid_total": np.floor(hosp * 0.1),
+        "hospital_beds_capacity_count": beds,
+        "hospital_beds_in_use_any": np.floor(beds * 0.6) + hosp,
+        "icu_beds_capacity_count": np.ceil(beds * 0.15),
+        "icu_beds_in_use_any": np.floor(beds * 0.1) + np.floor(hosp * 0.3),
+        "num_of_hospitals": np.ceil(beds / 100),
+        "num_hospitals_reporting": np.ceil(beds / 120),
+    }
+    return {k: np.vstack([v, _by_state(v)]).astype("int64") for k, v in county.items()}
+
+
+def _put_acs(out: list, connstr: str, fips: np.ndarray, states: np.ndarray, rng):
+    """
+    Write the `ACS_VARIABLES` of the counties `fips` and their `states`,
+    select them in `meta.acs_variables_selected` and rebuild the
+    demographics the scores are computed from
+    """
+    variables = pd.DataFrame(
+        {
+            "census_id": list(ACS_VARIABLES),
+            "label": list(ACS_VARIABLES.values()),
+            "year": ACS_YEAR,
+            "product": ACS_PRODUCT,
+        }
+    )
+    _put(out, connstr, _ACSVariables(), variables)
+
+    selected = variables.rename(columns={"label": "name"}).assign(geo="county")
+    sql = """
+    INSERT INTO meta.acs_variables_selected (year, product, geo, census_id, name)
+    VALUES (:year, :product, :geo, :census_id, :name)
+    ON CONFLICT DO NOTHING
+    """
+    with get_engine(connstr).begin() as conn:
+        conn.execute(sa.text(sql), selected.to_dict("records"))
+
+    population = np.floor(rng.lognormal(10.5, 1.3, fips.size))
+    over_65 = rng.uniform(10, 25, fips.size)
+    in_state = [fips // 1000 == x for x in states]
+    values = {
+        "DP05_0001E": [population] + [population[x].sum() for x in in_state],
+        "DP05_0024PE": [over_65]
+        + [np.average(over_65[x], weights=population[x]) for x in in_state],
+    }
+    locations = np.concatenate([fips, states])
+    df = pd.concat(
+        [
+            pd.DataFrame({"fips": locations, "census_id": k, "value": np.hstack(v)})
+            for k, v in values.items()
+        ],
+        ignore_index=True,
+    )
+    _put(out, connstr, _ACS(), df)
+
+
+def _covid_frame(
+    fips: np.ndarray,
+    dates: pd.DatetimeIndex,
+    values: Dict[str, np.ndarray],
+    vintage: pd.Timestamp,
+) -> pd.DataFrame:
+    "The long (vintage, dt, fips, variable_name, value) frame of `values`"
+    n_loc, n_days = values[next(iter(values))].shape
+    parts = [
+        pd.DataFrame(
+            {
+                "dt": np.tile(dates.values, n_loc),
+                "fips": np.repeat(fips, n_days),
+                "variable_name": name,
+                "value": a.ravel(),
+            }
+        )
+        for name, a in values.items()
+    ]
+    df = pd.concat(parts, ignore_index=True)
+    df.insert(0, "vintage", vintage)
+    return df
+
+
+def _vintage_values(
+    curves: Dict[str, np.ndarray], n_days: int, scale: Scale, k: int
+) -> Dict[str, np.ndarray]:
+    """
+    The first `n_days` days of `curves` as reported in vintage `k`. Each
+    vintage except the last undercounts a random `scale.revised` share
+    of its values, which the next vintages then revise
+    """
+    last = k == scale.vintages - 1
+    rng = np.random.RandomState(scale.seed + 1 + k)
+    out = {}
+    for name, a in curves.items():
+        a = a[:, :n_days]
+        if not last:
+            revised = rng.rand(*a.shape) < scale.revised
+            a = np.where(revised, np.floor(a * rng.uniform(0.9, 1, a.shape)), a)
+        out[name] = a.astype("int64")
+    return out
+
+
+def _timed(out: list, name: str, table: str, vintage, rows: int, put: Callable):
+    "Run `put` and record how long it took in `out`"
+    start = time.perf_counter()
+    put()
+    seconds = time.perf_counter() - start
+    out.append(
+        dict(dataset=name, table=table, vintage=vintage, rows=rows, seconds=seconds)
+    )
+
+
+def _put(out: list, connstr: str, dataset, df: pd.DataFrame, vintage=None):
+    name = type(dataset).__name__
+    # the covid datasets also log their sources, as they do in production
+    log_source = hasattr(dataset, "source")
+    put = lambda: dataset.put(connstr, df, log_source=log_source)  # noqa: E731
+    _timed(out, name, dataset.table_name, vintage, df.shape[0], put)
+
+
+def generate(
+    connstr: str,
+    scale: Scale = Scale(),
+    datasets: Optional[List[str]] = None,
+    verbose: bool = False,
+) -> pd.DataFrame:
+    """
+    Fill the database at `connstr` with synthetic data
+
+    Parameters
+    ----------
+    connstr: str
+        The database connection string. The database must have been
+        built from `db/schemas`, which also provides `meta.us_fips` and
+        `meta.covid_variables`
+    scale: Scale
+        The size of the data. See `SCALES` for some presets
+    datasets: List[str], optional
+        The subset of `DATASETS` to write, all of them by default:
+
+        * acs: the population and share over 65 of every county and
+          state, from which the scores are computed
+        * official: state and county dashboards, through `put_county_data`
+          into `data.us_covid` (most states, a tenth of the counties)
+        * ctp, hhs: state level, `CTP_VARIABLES` and `HHS_VARIABLES`.
+          HHS only reports the last day of each vintage
+        * usafacts, nyt: cases and deaths for every county and state
+        * dex: `data.mobility_dex` for every county and day
+        * lex: `data.mobility_lex` for `scale.lex_counties` counties
+    verbose: bool
+        Print the rows written after each vintage and the totals per
+        table at the end
+
+    Returns
+    -------
+    df : pd.DataFrame
+        The dataset, table, vintage, rows and seconds of every write
+    """
+    datasets = DATASETS if datasets is None else datasets
+    unknown = set(datasets) - set(DATASETS)
+    if unknown:
+        raise ValueError(f"Unknown datasets {sorted(unknown)}. Use {DATASETS}")
+
+    rng = np.random.RandomState(scale.seed)
+    geo = _geography(connstr, scale, rng)
+    curves = _curves(geo, scale, rng)
+    fips = np.concatenate([geo.fips, geo.states])
+    is_state = fips < 100
+    if scale.start is None:
+        start = pd.Timestamp.today().normalize() - pd.Timedelta(days=scale.days)
+    else:
+        start = pd.Timestamp(scale.start)
+    dates = pd.date_range(start, periods=scale.days, freq="D")
+    last = dates[-1] + pd.Timedelta(days=1)
+    vintages = [
+        last - pd.Timedelta(days=scale.vintage_every * (scale.vintages - 1 - k))
+        for k in range(scale.vintages)
+    ]
+    partitions.create_partitions_between(connstr, vintages[0], vintages[-1])
+
+    # which states and counties report to their own dashboards
+    official_states = geo.states[rng.rand(geo.states.size) < 0.7]
+    official = np.isin(fips, official_states) | np.isin(fips // 1000, official_states)
+    by_county = ~is_state & (rng.rand(fips.size) < 0.1)
+
+    out: List[dict] = []
+    if "acs" in datasets:
+        # before the covid data so each USAFacts load scores every county
+        acs_rng = np.random.RandomState(scale.seed + scale.vintages + 1)
+        _put_acs(out, connstr, geo.fips, geo.states, acs_rng)
+
+    for k, vintage in enumerate(vintages):
+        n_days = int((dates < vintage).sum())
+        if n_days == 0:
+            continue
+        values = _vintage_values(curves, n_days, scale, k)
+
+        def _frame(rows, variables, days=slice(None)):
+            vals = {v: values[v][rows][:, days] for v in variables}
+            return _covid_frame(fips[rows], dates[:n_days][days], vals, vintage)
+
+        if "official" in datasets:
+            frames = [
+                (_Official("state"), _frame(official, OFFICIAL_VARIABLES)),
+                (_Official("county"), _frame(by_county, OFFICIAL_VARIABLES[:2])),
+            ]
+            rows = sum(df.shape[0] for _, df in frames)
+            put = lambda: put_county_data(connstr, frames, True)  # noqa: E731
+            _timed(out, "put_county_data", "us_covid", vintage, rows, put)
+        if "ctp" in datasets:
+            _put(out, connstr, CTP(), _frame(is_state, CTP_VARIABLES), vintage)
+        if "hhs" in datasets:
+            today = slice(n_days - 1, n_days)
+            _put(out, connstr, HHS(), _frame(is_state, HHS_VARIABLES, today), vintage)
+        if "usafacts" in datasets:
+            every = np.ones(fips.size, dtype=bool)
+            _put(out, connstr, USAFactsCases(), _frame(every, ["cases_total"]), vintage)
+            _put(
+                out, connstr, USAFactsDeaths(), _frame(every, ["deaths_total"]), vintage
+            )
+        if "nyt" in datasets:
+            both = ["cases_total", "deaths_total"]
+            _put(out, connstr, NYTimesState(), _frame(is_state, both), vintage)
+            _put(out, connstr, NYTimesCounty(), _frame(~is_state, both), vintage)
+
+        if verbose:
+            done = pd.DataFrame([r for r in out if r["vintage"] == vintage])
+            print(f"vintage {vintage.date()}: {done['rows'].sum():,} rows", flush=True)
+
+    if "dex" in datasets:
+        n = geo.fips.size * scale.days
+        df = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "dt": np.tile(dates.values, geo.fips.size),
+                        "fips": np.repeat(geo.fips, scale.days),
+                        "variable_name": name,
+                        "value": x.astype("float32"),
+                    }
+                )
+                for name, x in [
+                    ("dex", rng.lognormal(3, 1, n)),
+                    ("num_devices", rng.randint(100, 100_000, n)),
+                    ("dex_a", rng.lognormal(3, 1, n)),
+                    ("num_devices_a", rng.randint(100, 100_000, n)),
+                ]
+            ],
+            ignore_index=True,
+        )
+        _put(out, connstr, CountyDex(), df)
+
+    if "lex" in datasets:
+        n_lex = min(scale.lex_counties, geo.fips.size)
+        lex_fips = np.sort(rng.choice(geo.fips, n_lex, replace=False))
+        prev, today = np.meshgrid(lex_fips, lex_fips, indexing="ij")
+        stay = (prev == today).ravel()
+        for dt in dates[-scale.lex_days :]:
+            lex = np.where(
+                stay, rng.uniform(0.6, 1, stay.size), rng.rand(stay.size) / n_lex
+            )
+            df = pd.DataFrame(
+                {
+                    "date": dt,
+                    "fips_prev": prev.ravel(),
+                    "fips_today": today.ravel(),
+                    "lex": lex.astype("float32"),
+                }
+            )
+            _put(out, connstr, DailyCountyLex(), df, dt)
+
+    if verbose and len(out) > 0:
+        totals = pd.DataFrame(out).groupby("table")[["rows", "seconds"]].sum()
+        print(totals.to_string())
+
+    return pd.DataFrame(out, columns=["dataset", "table", "vintage", "rows", "seconds"])
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument(
+        "connstr",
+        nargs="?",
+        default=os.environ.get("PG_CONN_STR"),
+        help="database connection string (or PG_CONN_STR)",
+    )
+    p.add_argument("--scale", choices=list(SCALES), default="small")
+    p.add_argument("--seed", type=int, help="override the seed of the scale")
+    p.add_argument("--datasets", nargs="+", choices=DATASETS, default=DATASETS)
+    args = p.parse_args(argv)
+    if args.connstr is None:
+        p.error("pass a connection string or set PG_CONN_STR")
+
+    scale = SCALES[args.scale]
+    if args.seed is not None:
+        scale = scale._replace(seed=args.seed)
+    generate(args.connstr, scale, args.datasets, verbose=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import textwrap
 import pandas as pd
 
 from .. import DatasetBaseNoDate, InsertWithTempTable
+from ..base import _build_covid_insert_query
 
 BASEURL = "https://usafactsstatic.blob.core.windows.net/public/data/"
 
@@ -21,11 +22,20 @@ class USAFactsCases(InsertWithTempTable, DatasetBaseNoDate):
     data_type = "covid"
     source = "https://usafacts.org/issues/coronavirus/"
     has_fips = True
+    copy_binary = True
+    use_meta_cache = True
+    refresh_latest = True
+    # Whether `data.scores` (computed from the cases) is refreshed after
+    # each load
+    refresh_scores = True
 
     def __init__(self):
         super(USAFactsCases, self).__init__()
 
     def _insert_query(self, df: pd.DataFrame, table_name: str, temp_name: str, pk: str):
+        if "variable_id" in df:
+            return textwrap.dedent(_build_covid_insert_query(table_name, temp_name, pk))
+
         out = f"""
         INSERT INTO data.{table_name} (vintage, dt, fips, variable_id, value)
         SELECT tt.vintage, tt.dt, tt.fips, mv.id as variable_id, tt.value
@@ -36,6 +46,11 @@ class USAFactsCases(InsertWithTempTable, DatasetBaseNoDate):
 
         return textwrap.dedent(out)
 
+    def _after_insert(self, conn, df: pd.DataFrame, table_name: str):
+        super()._after_insert(conn, df, table_name)
+        if self.refresh_scores:
+            conn.execute("SELECT data.refresh_scores()")
+
     def get(self):
         # Load data from site and move dates from column names to
         # a new variable
@@ -91,3 +106,4 @@ class USAFactsDeaths(USAFactsCases, DatasetBaseNoDate):
 
     filename = "covid-19/covid_deaths_usafacts.csv"
     variablename = "deaths_total"
+    refresh_scores = False
@@ -53,6 +53,7 @@ class ACS(ACSAPI, InsertWithTempTable, DatasetBaseNoDate):
     table_name = "acs_data"
     pk = '("id", "fips")'
     autodag = False
+    refresh_materialized = ("demographics",)
 
     def __init__(
         self,
@@ -128,6 +129,8 @@ class ACS(ACSAPI, InsertWithTempTable, DatasetBaseNoDate):
 class ACSVariables(ACS, DatasetBaseNoDate):
     table_name = "acs_variables"
     pk = '("id")'
+    # data.demographics maps the ids of these variables to names
+    refresh_materialized = ("demographics",)
 
     def _insert_query(self, df: pd.DataFrame, table_name: str, temp_name: str, pk: str):
         _sql_var_insert = f"""
@@ -104,6 +104,7 @@ class USGeoBaseAPI(InsertWithTempTable, DatasetBaseNoDate):
     table_name = "us_fips"
     pk = '("id")'
     autodag = False
+    refresh_materialized = ("us_fips_long",)
 
     def __init__(self, geo: str = "state", year: int = 2019):
         self.geo = geo
@@ -27,6 +27,7 @@ class WEI(InsertWithTempTable, DatasetBaseNoDate):
 
     pk = '("dt")'
     table_name = "weeklyeconomicindex"
+    refresh_materialized = ("economics",)
 
     def get(self):
         """
@@ -0,0 +1,218 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cmdc_tools.datasets.official import ArcGIS
+from cmdc_tools.datasets.official.base import _arcgis_pages_to_df
+
+
+class _FakeLayer(ArcGIS):
+    "Serves `n` features from memory, `page_size` at a time"
+    ARCGIS_ID = "fake"
+
+    def __init__(self, n, page_size=100, grow_by=0, short_pages=(), **kw):
+        super().__init__(**kw)
+        self.n = n
+        self.page_size = page_size
+        self.grow_by = grow_by
+        # offsets of the pages that the server cuts to half a page
+        self.short_pages = set(short_pages)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get_res_json(self, service, sheet, srvid, params):
+        with self.lock:
+            self.requests.append(dict(params, service=service))
+        if params.get("returnCountOnly") == "true":
+            count = self.n
+            # features added after the count
+            self.n += self.grow_by
+            return {"count": count}
+
+        start = params.get("resultOffset", 0)
+        size = self.page_size // 2 if start in self.short_pages else self.page_size
+        stop = min(start + size, self.n)
+        features = [
+            {"attributes": {"id": i, "service": service}} for i in range(start, stop)
+        ]
+        fields = [
+            {"name": "id", "type": "esriFieldTypeOID"},
+            {"name": "service", "type": "esriFieldTypeString"},
+        ]
+        return {
+            "fields": fields,
+            "features": features,
+            "exceededTransferLimit": stop < self.n,
+        }
+
+
+def test_get_all_sheet_to_df_pages_concurrently():
+    layer = _FakeLayer(1050)
+    df = layer.get_all_sheet_to_df("service", 0, 1)
+    assert list(df["id"]) == list(range(1050))
+
+    # first page, count, then the other 10 pages
+    assert len(layer.requests) == 12
+    assert layer.requests[1]["returnCountOnly"] == "true"
+    offsets = sorted(p.get("resultOffset", 0) for p in layer.requests[2:])
+    assert offsets == list(range(100, 1050, 100))
+
+
+def test_get_all_sheet_to_df_sequential():
+    layer = _FakeLayer(250)
+    layer.page_concurrency = 1
+    df = layer.get_all_sheet_to_df("service", 0, 1)
+    assert list(df["id"]) == list(range(250))
+    assert not any("returnCountOnly" in p for p in layer.requests)
+
+
+def test_get_all_sheet_to_df_single_page():
+    layer = _FakeLayer(50)
+    df = layer.get_all_sheet_to_df("service", 0, 1)
+    assert list(df["id"]) == list(range(50))
+    assert len(layer.requests) == 1
+
+
+def test_get_all_sheet_to_df_layer_grows():
+    layer = _FakeLayer(450, grow_by=120)
+    df = layer.get_all_sheet_to_df("service", 0, 1)
+    assert list(df["id"]) == list(range(570))
+
+
+def test_get_all_sheet_to_df_short_page():
+    layer = _FakeLayer(1050, short_pages=[300])
+    df = layer.get_all_sheet_to_df("service", 0, 1)
+    assert list(df["id"]) == list(range(1050))
+
+    # the concurrent pages left a gap, so they were fetched again in order
+    offsets = [p.get("resultOffset", 0) for p in layer.requests[12:]]
+    assert offsets == [100, 200, 300, 350, 450, 550, 650, 750, 850, 950]
+
+
+def test_get_sheets_to_df():
+    layer = _FakeLayer(250)
+    sheets = [("a", 0, 1), ("b", 0, 1, dict(layer.params, where="x = 1"))]
+    a, b = layer.get_sheets_to_df(sheets)
+    assert list(a["id"]) == list(range(250))
+    assert (a["service"] == "a").all()
+    assert (b["service"] == "b").all()
+
+    wheres = {p["service"]: p["where"] for p in layer.requests}
+    assert wheres == {"a": "1=1", "b": "x = 1"}
+    # the params of the dataset are left alone
+    assert layer.params["where"] == "1=1"
+
+
+def test_query_params():
+    layer = _FakeLayer(10)
+    params = layer.query_params("Geography = 'LA'", fields=["A", "B"])
+    assert params["where"] == "Geography = 'LA'"
+    assert params["outFields"] == "A,B"
+    assert "outStatistics" not in params
+
+    params = layer.query_params(
+        stats={"cases": ("sum", "Cases"), "n": ("count", "FID")}, group_by=["County"]
+    )
+    assert params["where"] == "1=1"
+    assert params["outFields"] == "County"
+    assert params["groupByFieldsForStatistics"] == "County"
+    assert json.loads(params["outStatistics"]) == [
+        {
+            "statisticType": "sum",
+            "onStatisticField": "Cases",
+            "outStatisticFieldName": "cases",
+        },
+        {
+            "statisticType": "count",
+            "onStatisticField": "FID",
+            "outStatisticFieldName": "n",
+        },
+    ]
+    # groups can't be counted, so statistics are paged sequentially
+    assert layer.get_count("service", 0, 1, params) is None
+    assert layer.params == _FakeLayer(10).params
+
+
+def _page(rows, with_fields=True):
+    fields = [
+        {"name": "county", "type": "esriFieldTypeString"},
+        {"name": "cases", "type": "esriFieldTypeInteger"},
+        {"name": "deaths", "type": "esriFieldTypeSmallInteger"},
+        {"name": "rate", "type": "esriFieldTypeDouble"},
+        {"name": "date", "type": "esriFieldTypeDate"},
+    ]
+    names = [f["name"] for f in fields]
+    out = {"features": [{"attributes": dict(zip(names, r))} for r in rows]}
+    if with_fields:
+        out["fields"] = fields
+    return out
+
+
+def test_arcgis_pages_to_df():
+    day = 1593561600000  # 2020-07-01 UTC
+    pages = [
+        _page([("a", 1, 0, 0.5, day), ("b", 2, None, None, day + 86400000)]),
+        _page([("c", 3, 1, 1.5, None)]),
+        _page([]),
+    ]
+    df = _arcgis_pages_to_df(pages)
+    assert list(df) == ["county", "cases", "deaths", "rate", "date"]
+    assert list(df.index) == [0, 1, 2]
+    assert list(df["county"]) == ["a", "b", "c"]
+    assert df["cases"].dtype == np.int64
+    # integers with nulls become floats, as with `from_records`
+    assert df["deaths"].isna().tolist() == [False, True, False]
+    assert df["rate"].dtype == np.float64
+    assert df["date"].iloc[0] == day
+
+    dates = _arcgis_pages_to_df(pages, esri_dates=True)["date"]
+    assert list(dates[:2]) == [pd.Timestamp("2020-07-01"), pd.Timestamp("2020-07-02")]
+    assert pd.isna(dates.iloc[2])
+
+    # without fields the features are decoded as records
+    records = _arcgis_pages_to_df([_page([("a", 1, 0, 0.5, day)], False)])
+    assert records.to_dict("records") == df.iloc[:1].to_dict("records")
+
+
+def test_arcgis_pages_to_df_matches_records():
+    day = 1593561600000
+    rows = [
+        # ints with nulls in some pages, whole numbers in a double field
+        [("a", 1, 0, 2, day), ("b", 2, None, 3, None)],
+        [("c", 3, 1, None, day), (None, 4, 2, 4, day)],
+        # a page of nulls and an integer field holding text
+        [("d", None, None, None, None), ("e", 5, "n/a", 1.5, day)],
+    ]
+    for i in range(1, len(rows) + 1):
+        pages = [_page(x) for x in rows[:i]]
+        df = _arcgis_pages_to_df(pages)
+        want = pd.DataFrame.from_records(
+            [x["attributes"] for page in pages for x in page["features"]]
+        )
+        pd.testing.assert_frame_equal(df, want)
+
+
+def test_esri_ts_col_to_dt():
+    layer = _FakeLayer(0)
+    # 2020-07-01 03:00 and 2020-07-02 12:00 UTC
+    ms = pd.Series([1593572400000, 1593691200000, 1593572400000], index=[5, 6, 7])
+    expected = ms.map(lambda x: layer._esri_ts_to_dt(x))
+    assert layer._esri_ts_col_to_dt(ms).equals(expected)
+
+    layer.timezone = "US/Central"
+    central = layer._esri_ts_col_to_dt(ms)
+    assert list(central.index) == [5, 6, 7]
+    assert list(central) == [
+        pd.Timestamp("2020-06-30"),
+        pd.Timestamp("2020-07-02"),
+        pd.Timestamp("2020-06-30"),
+    ]
+    assert central.equals(ms.map(lambda x: layer._esri_ts_to_dt(x)))
+
+    # dates decoded with `esri_dates` and missing values
+    decoded = pd.Series(pd.to_datetime([1593572400000, None], unit="ms"))
+    out = layer._esri_ts_col_to_dt(decoded)
+    assert out.iloc[0] == pd.Timestamp("2020-06-30")
+    assert pd.isna(out.iloc[1])
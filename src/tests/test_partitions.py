@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+
+from cmdc_tools.datasets import get_engine, partitions
+
+CONN_STR = os.environ.get("PG_CONN_STR", None)
+
+
+def test_partition_maintenance():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    engine.execute("TRUNCATE data.nyt_covid")
+    engine.execute(
+        "DELETE FROM data.vintage_compactions WHERE table_name = 'nyt_covid'"
+    )
+    engine.execute(
+        """
+    INSERT INTO data.nyt_covid (vintage, dt, fips, variable_id, value)
+    VALUES ('2020-07-07', '2020-07-01', 25, 1, 5),
+           ('2020-08-07', '2020-07-01', 25, 1, 5),
+           ('2020-09-07', '2020-07-01', 25, 1, 6);
+    """
+    )
+
+    partitions.create_partitions(CONN_STR, tables=["nyt_covid"])
+    parts = partitions.list_partitions(CONN_STR, "nyt_covid")
+    assert pd.Timestamp("2020-08-01") in set(parts["month"])
+    sql = "SELECT COUNT(*) FROM data.nyt_covid_default"
+    assert engine.execute(sql).scalar() == 0
+
+    # the 2020-08 vintage repeats 2020-07
+    out = partitions.compact(CONN_STR, tables=["nyt_covid"])
+    assert out["rows_deleted"].sum() == 1
+    out = partitions.compact(CONN_STR, tables=["nyt_covid"])
+    assert out.shape[0] == 0
+
+    name = partitions.detach_partition(CONN_STR, "nyt_covid", "2020-09-15")
+    assert name == "nyt_covid_2020_09"
+    assert engine.execute("SELECT COUNT(*) FROM data.nyt_covid").scalar() == 1
+    partitions.attach_partition(CONN_STR, "nyt_covid", "2020-09-01")
+    assert engine.execute("SELECT COUNT(*) FROM data.nyt_covid").scalar() == 2
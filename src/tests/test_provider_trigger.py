@@ -73,3 +73,98 @@ def test_provider_trigger():
         assert df.shape[0] == 3
         assert {"state", "ctp"} == set(list(df["provider"]))
         assert {100, 142} == set(list(df["value"]))
+
+
+def test_provider_trigger_statement():
+    if CONN_STR is None:
+        assert True
+        return
+    conn = sa.create_engine(CONN_STR)
+
+    for p in ["us", "ctp", "nyt", "usafacts"]:
+        conn.execute(f"TRUNCATE TABLE data.{p}_covid")
+
+    conn.execute(
+        """
+    INSERT INTO data.us_covid
+    (vintage, dt, fips, variable_id, value, provider)
+    VALUES ('2020-07-07', '2020-07-06', 25, 3, 100, 'state'),
+           ('2020-07-07', '2020-07-06', 25, 6, 5, 'nyt');
+    """
+    )
+
+    # one statement: a conflict won by state, one taken over by ctp and a new row
+    conn.execute(
+        """
+    INSERT INTO data.ctp_covid
+    (vintage, dt, fips, variable_id, value)
+    VALUES ('2020-07-07', '2020-07-06', 25, 3, 1),
+           ('2020-07-07', '2020-07-06', 25, 6, 2),
+           ('2020-07-07', '2020-07-06', 12, 6, 3);
+    """
+    )
+    df = pd.read_sql(
+        "SELECT fips, variable_id, value, provider FROM data.us_covid", conn
+    ).set_index(["fips", "variable_id"])
+    assert df.shape[0] == 3
+    assert tuple(df.loc[(25, 3)]) == (100, "state")
+    assert tuple(df.loc[(25, 6)]) == (2, "ctp")
+    assert tuple(df.loc[(12, 6)]) == (3, "ctp")
+
+
+def test_us_covid_latest():
+    if CONN_STR is None:
+        assert True
+        return
+    conn = sa.create_engine(CONN_STR)
+
+    def _latest():
+        sql = "SELECT fips, vintage, value FROM data.us_covid_latest ORDER BY fips"
+        return [(r.fips, str(r.vintage), r.value) for r in conn.execute(sql)]
+
+    def _insert(vintage, fips, value):
+        conn.execute(
+            f"""
+        INSERT INTO data.us_covid
+        (vintage, dt, fips, variable_id, value, provider)
+        VALUES ('{vintage}', '2020-07-06', {fips}, 3, {value}, 'state')
+        ON CONFLICT (fips, dt, vintage, variable_id) DO UPDATE SET value = excluded.value
+        """
+        )
+
+    conn.execute("TRUNCATE TABLE data.us_covid")
+    assert _latest() == []
+
+    _insert("2020-07-07", 25, 1)
+    _insert("2020-07-08", 25, 2)
+    _insert("2020-07-06", 25, 3)
+    _insert("2020-07-07", 12, 4)
+    assert _latest() == [(12, "2020-07-07", 4), (25, "2020-07-08", 2)]
+
+    # update in place
+    _insert("2020-07-08", 25, 5)
+    assert _latest() == [(12, "2020-07-07", 4), (25, "2020-07-08", 5)]
+
+    # deleting the latest vintage falls back to the previous one
+    conn.execute("DELETE FROM data.us_covid WHERE vintage = '2020-07-08'")
+    assert _latest() == [(12, "2020-07-07", 4), (25, "2020-07-07", 1)]
+    conn.execute("DELETE FROM data.us_covid WHERE fips = 12")
+    assert _latest() == [(25, "2020-07-07", 1)]
+
+    # moving the latest row to an older vintage
+    conn.execute("UPDATE data.us_covid SET vintage = '2020-07-05' WHERE value = 1")
+    assert _latest() == [(25, "2020-07-06", 3)]
+
+    # updating the value of the latest row
+    conn.execute("UPDATE data.us_covid SET value = 7 WHERE value = 3")
+    assert _latest() == [(25, "2020-07-06", 7)]
+
+    # moving the latest row to another location
+    conn.execute("UPDATE data.us_covid SET fips = 12 WHERE value = 7")
+    assert _latest() == [(12, "2020-07-06", 7), (25, "2020-07-05", 1)]
+    conn.execute("UPDATE data.us_covid SET fips = 25 WHERE value = 7")
+    assert _latest() == [(25, "2020-07-06", 7)]
+
+    api = pd.read_sql("SELECT * FROM api.covid_us", conn)
+    assert list(api["fips"]) == ["25"]
+    assert list(api["value"]) == [7]
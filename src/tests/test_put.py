@@ -0,0 +1,467 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+from cmdc_tools.datasets import get_engine, get_meta_cache, resolve_ids
+from cmdc_tools.datasets.base import DatasetBaseNoDate, InsertWithTempTable, PutTarget
+from cmdc_tools.datasets.official import Alaska, CountyData, put_county_data
+from cmdc_tools.datasets.owid import OWID, meta_columns
+
+CONN_STR = os.environ.get("PG_CONN_STR", None)
+
+
+class _MACounties(CountyData):
+    has_fips = False
+    state_fips = 25
+    source = "https://example.com/ma"
+
+
+def _county_df(vintage="2020-07-07"):
+    return pd.DataFrame(
+        {
+            "vintage": pd.Timestamp(vintage),
+            "dt": pd.to_datetime(["2020-07-01", "2020-07-01", "2020-07-02"]),
+            "county": ["Barnstable", "Worcester", "Barnstable"],
+            "variable_name": ["cases_total", "deaths_total", "cases_total"],
+            "value": [10, 2, 12],
+        }
+    )
+
+
+def test_put_with_source():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    engine.execute("DELETE FROM data.us_covid WHERE fips IN (25001, 25027)")
+    engine.execute("DELETE FROM data.covid_sources WHERE location IN (25001, 25027)")
+
+    _MACounties().put(CONN_STR, _county_df(), log_source=True)
+
+    data = pd.read_sql(
+        "SELECT * FROM data.us_covid WHERE fips IN (25001, 25027)", engine
+    )
+    assert data.shape[0] == 3
+    assert set(data["provider"]) == {"state"}
+
+    sources = pd.read_sql(
+        "SELECT * FROM data.covid_sources WHERE location IN (25001, 25027)", engine
+    )
+    assert sources.shape[0] == 2
+    assert set(sources["source"]) == {_MACounties.source}
+    assert set(sources["table_name"]) == {"us_covid"}
+
+
+def test_delta_put():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    engine.execute("DELETE FROM data.us_covid WHERE fips IN (25001, 25027)")
+
+    d = _MACounties()
+    d.delta_put = True
+
+    def _count():
+        sql = "SELECT COUNT(*) FROM data.us_covid WHERE fips IN (25001, 25027)"
+        return engine.execute(sql).scalar()
+
+    d.put(CONN_STR, _county_df("2020-07-07"))
+    assert _count() == 3
+
+    # nothing changed -- nothing written
+    d.put(CONN_STR, _county_df("2020-07-08"))
+    assert _count() == 3
+
+    # one revision and one new date
+    df = _county_df("2020-07-09")
+    df.loc[0, "value"] = 11
+    new_date = dict(
+        vintage=pd.Timestamp("2020-07-09"),
+        dt=pd.Timestamp("2020-07-03"),
+        county="Worcester",
+        variable_name="deaths_total",
+        value=3,
+    )
+    df = pd.concat([df, pd.DataFrame([new_date])], ignore_index=True)
+    d.put(CONN_STR, df)
+    assert _count() == 5
+
+
+def test_put_overridden_insert_query():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    engine.execute("DELETE FROM data.us_covid WHERE fips IN (2020, 2090)")
+
+    df = pd.DataFrame(
+        {
+            "vintage": pd.Timestamp("2020-07-07"),
+            "dt": pd.Timestamp("2020-07-01"),
+            # the last fips is not a borough and is dropped
+            "fips": [2020, 2090, 2999],
+            "variable_name": "cases_total",
+            "value": [10, 2, 1],
+        }
+    )
+    Alaska().put(CONN_STR, df)
+
+    data = pd.read_sql(
+        "SELECT * FROM data.us_covid WHERE fips IN (2020, 2090, 2999)", engine
+    )
+    assert sorted(data["fips"]) == [2020, 2090]
+
+
+class _OtherVariables(InsertWithTempTable, DatasetBaseNoDate):
+    table_name = "__test_delta"
+    pk = "(vintage, dt, fips, variable_id)"
+    delta_put = True
+    variable_table = "__test_variables"
+    variable_name_col = "variable_name"
+
+    def get(self):
+        pass
+
+
+def test_delta_put_variable_table():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    engine.execute(
+        """
+        DROP TABLE IF EXISTS data.__test_delta;
+        DROP TABLE IF EXISTS meta.__test_variables;
+        CREATE TABLE meta.__test_variables (id smallint, variable_name text);
+        INSERT INTO meta.__test_variables VALUES (30001, 'x'), (30002, 'y');
+        CREATE TABLE data.__test_delta (
+          vintage date, dt date, fips int, variable_id smallint, value real
+        );
+        INSERT INTO data.__test_delta VALUES
+          ('2020-07-07', '2020-07-01', 25001, 30001, 10),
+          ('2020-07-07', '2020-07-01', 25001, 30002, 5);
+        """
+    )
+    d = _OtherVariables()
+    df = pd.DataFrame(
+        {
+            "vintage": pd.Timestamp("2020-07-08"),
+            "dt": pd.Timestamp("2020-07-01"),
+            "fips": 25001,
+            "variable_name": ["x", "y"],
+            "value": [10, 6],
+        }
+    )
+    try:
+        # names are looked up in the variable table of the dataset
+        with engine.connect() as conn:
+            latest = d._latest_values(conn, df, d.table_name)
+        assert sorted(zip(latest["variable_name"], latest["value"])) == [
+            ("x", 10),
+            ("y", 5),
+        ]
+
+        # and ids are compared directly
+        ids = df.drop(columns="variable_name").assign(variable_id=[30001, 30002])
+        out = d._drop_unchanged(CONN_STR, ids, d.table_name)
+        assert list(out["variable_id"]) == [30002]
+
+        # a latest vintage table is read instead of the vintages
+        engine.execute(
+            """
+            CREATE TABLE data.__test_delta_latest (LIKE data.__test_delta);
+            INSERT INTO data.__test_delta_latest VALUES
+              ('2020-07-07', '2020-07-01', 25001, 30001, 11);
+            """
+        )
+        with engine.connect() as conn:
+            latest = d._latest_values(conn, df, d.table_name)
+        assert list(zip(latest["variable_name"], latest["value"])) == [("x", 11)]
+    finally:
+        engine.execute(
+            "DROP TABLE data.__test_delta; DROP TABLE meta.__test_variables;"
+            "DROP TABLE IF EXISTS data.__test_delta_latest;"
+        )
+
+
+def test_resolve_ids():
+    if CONN_STR is None:
+        assert True
+        return
+    cache = get_meta_cache(CONN_STR)
+    assert get_meta_cache(CONN_STR) is cache
+
+    df = _county_df()
+    df.loc[1, "county"] = "Not A County"
+    out = resolve_ids(cache, df, state_fips=25)
+    assert "variable_name" not in out and "county" not in out
+    assert list(out["fips"]) == [25001, 25001]
+    assert out["variable_id"].dtype == "int16"
+
+    df.loc[0, "variable_name"] = "not_a_variable"
+    with pytest.raises(ValueError):
+        resolve_ids(cache, df, state_fips=25)
+    out = resolve_ids(cache, df, state_fips=25, drop_unresolved=True)
+    assert out.shape[0] == 1
+
+
+class _SuffolkCounty(_MACounties):
+    provider = "county"
+    source = "https://example.com/suffolk"
+
+
+def test_put_county_data():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    engine.execute("DELETE FROM data.us_covid WHERE fips IN (25001, 25027)")
+    engine.execute("DELETE FROM data.covid_sources WHERE location IN (25001, 25027)")
+
+    state = _county_df()
+    county = _county_df().iloc[:1].assign(value=99)
+    frames = [(_SuffolkCounty(), county), (_MACounties(), state)]
+    assert put_county_data(CONN_STR, frames, log_source=True) == 3
+
+    data = pd.read_sql(
+        "SELECT * FROM data.us_covid WHERE fips IN (25001, 25027) ORDER BY dt, fips",
+        engine,
+    )
+    assert list(data["value"]) == [99, 2, 12]
+    assert list(data["provider"]) == ["county", "state", "state"]
+
+    sources = pd.read_sql(
+        "SELECT * FROM data.covid_sources WHERE location IN (25001, 25027)", engine
+    )
+    assert sources.shape[0] == 2
+    # the county frame came first but has the higher priority
+    by_location = dict(zip(sources["location"], sources["source"]))
+    assert by_location == {25001: _SuffolkCounty.source, 25027: _MACounties.source}
+
+    bad = _county_df().assign(extra=1)
+    with pytest.raises(ValueError):
+        put_county_data(CONN_STR, [(_MACounties(), bad)])
+
+
+def _owid_df():
+    df = pd.DataFrame(
+        {
+            "iso_code": ["ZZA", "ZZA", "ZZB"],
+            "location": ["A", "A", "B"],
+            "dt": pd.to_datetime(["2020-07-01", "2020-07-02", "2020-07-01"]),
+            "total_cases": [1, 2, 3],
+            "continent": "Z",
+        }
+    )
+    for col in meta_columns:
+        if col not in df:
+            df[col] = np.nan
+    return df
+
+
+def test_owid_put():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    engine.execute("DELETE FROM data.owid_covid WHERE iso_code LIKE 'ZZ_'")
+    engine.execute("DELETE FROM data.owid_locations WHERE iso_code LIKE 'ZZ_'")
+
+    OWID().put(CONN_STR, _owid_df())
+
+    sql = "SELECT COUNT(*) FROM data.{} WHERE iso_code LIKE 'ZZ_'"
+    assert engine.execute(sql.format("owid_locations")).scalar() == 2
+    assert engine.execute(sql.format("owid_covid")).scalar() == 3
+
+
+def test_put_many_waits_on_failed_target():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    engine.execute("DELETE FROM data.owid_covid WHERE iso_code LIKE 'ZZ_'")
+    engine.execute("DELETE FROM data.owid_locations WHERE iso_code LIKE 'ZZ_'")
+
+    locations = _owid_df()[["iso_code"]].drop_duplicates()
+    targets = [
+        PutTarget("bad", locations, "SELECT * FROM not_a_table"),
+        PutTarget(
+            "owid_locations",
+            locations,
+            "INSERT INTO data.owid_locations SELECT * FROM {temp_name}",
+            after=("bad",),
+        ),
+    ]
+    with pytest.raises(Exception):
+        OWID()._put_many(CONN_STR, targets)
+
+    sql = "SELECT COUNT(*) FROM data.owid_locations WHERE iso_code LIKE 'ZZ_'"
+    assert engine.execute(sql).scalar() == 0
+
+
+def test_put_refreshes_latest():
+    if CONN_STR is None:
+        assert True
+        return
+    from cmdc_tools.datasets import NYTimesState
+
+    engine = get_engine(CONN_STR)
+    rebuild = "SELECT data.refresh_latest_vintage('nyt_covid')"
+    engine.execute("DELETE FROM data.nyt_covid WHERE fips IN (25, 33)")
+    with engine.begin() as conn:
+        conn.execute(rebuild)
+
+    def _df(vintage, values):
+        return pd.DataFrame(
+            {
+                "vintage": pd.Timestamp(vintage),
+                "dt": pd.Timestamp("2020-07-01"),
+                "fips": [25, 33],
+                "variable_name": "cases_total",
+                "value": values,
+            }
+        )
+
+    def _api():
+        sql = "SELECT fips, value FROM api.nytimes_covid WHERE fips IN (25, 33)"
+        return sorted(map(tuple, engine.execute(sql).fetchall()))
+
+    NYTimesState().put(CONN_STR, _df("2020-07-07", [1, 2]))
+    assert _api() == [(25, 1), (33, 2)]
+
+    NYTimesState().put(CONN_STR, _df("2020-07-08", [3, 4]))
+    assert _api() == [(25, 3), (33, 4)]
+
+    # an older vintage loaded late does not replace the newer one
+    NYTimesState().put(CONN_STR, _df("2020-07-06", [5, 6]))
+    assert _api() == [(25, 3), (33, 4)]
+
+    # deletes are only picked up by a full rebuild
+    engine.execute("DELETE FROM data.nyt_covid WHERE vintage = '2020-07-08'")
+    with engine.begin() as conn:
+        conn.execute(rebuild)
+    assert _api() == [(25, 1), (33, 2)]
+
+
+def test_usafacts_put_refreshes_scores():
+    if CONN_STR is None:
+        assert True
+        return
+    from cmdc_tools.datasets import USAFactsCases
+
+    engine = get_engine(CONN_STR)
+    engine.execute(
+        """
+    INSERT INTO meta.acs_variables (year, product, census_id, label)
+    VALUES (2018, 'acs5', '__test_pop', ''), (2018, 'acs5', '__test_65p', '');
+    INSERT INTO meta.acs_variables_selected (year, product, geo, census_id, name)
+    VALUES (2018, 'acs5', 'county', '__test_pop', 'Total population'),
+           (2018, 'acs5', 'county', '__test_65p', 'Fraction of population over 65');
+    INSERT INTO data.acs_data (id, fips, value)
+    SELECT id, 25001, CASE census_id WHEN '__test_pop' THEN 100 ELSE 0.2 END
+    FROM meta.acs_variables WHERE census_id IN ('__test_pop', '__test_65p');
+    """
+    )
+    refresh = "SELECT data.refresh_materialized('demographics')"
+    with engine.begin() as conn:
+        conn.execute(refresh)
+    try:
+        today = pd.Timestamp.utcnow().tz_localize(None).normalize()
+        df = pd.DataFrame(
+            {
+                "vintage": today,
+                "dt": [today - pd.Timedelta(days=5), today - pd.Timedelta(days=1)],
+                "fips": 25001,
+                "variable_name": "cases_total",
+                "value": [0, 300],
+            }
+        )
+        USAFactsCases().put(CONN_STR, df)
+
+        scores = pd.read_sql("SELECT * FROM public.county_scores", engine)
+        assert list(scores["location"]) == [25001]
+        # population + 10 * fraction over 65 + 300 cases / 30 days
+        assert scores["score"].iloc[0] == pytest.approx(112)
+    finally:
+        engine.execute(
+            """
+        DELETE FROM data.usafacts_covid WHERE fips = 25001;
+        DELETE FROM data.acs_data
+        WHERE id IN (SELECT id FROM meta.acs_variables WHERE census_id IN ('__test_pop', '__test_65p'));
+        DELETE FROM meta.acs_variables_selected WHERE census_id IN ('__test_pop', '__test_65p');
+        DELETE FROM meta.acs_variables WHERE census_id IN ('__test_pop', '__test_65p');
+        """
+        )
+        with engine.begin() as conn:
+            conn.execute(refresh)
+
+
+def test_covid_source_intervals():
+    if CONN_STR is None:
+        assert True
+        return
+    from cmdc_tools.datasets.base import _build_covid_source_query
+
+    engine = get_engine(CONN_STR)
+    engine.execute("DELETE FROM data.covid_sources WHERE location = 25001")
+    sql = _build_covid_source_query(
+        "SELECT 25001 AS location, 1 AS variable_id, "
+        "CAST(:source AS TEXT) AS source, 'us_covid' AS table_name"
+    )
+
+    def _log(day, source):
+        with engine.begin() as conn:
+            conn.execute(sa.text(sql), date_accessed=pd.Timestamp(day), source=source)
+
+    def _intervals():
+        q = """
+        SELECT source, valid_from::date, valid_to::date, date_accessed::date
+        FROM data.covid_sources WHERE location = 25001 ORDER BY valid_from
+        """
+        return [tuple(str(x) for x in r) for r in engine.execute(q)]
+
+    _log("2020-07-01", "a")
+    _log("2020-07-02", "a")
+    _log("2020-07-03", "a")
+    assert _intervals() == [("a", "2020-07-01", "None", "2020-07-03")]
+
+    _log("2020-07-04", "b")
+    _log("2020-07-05", "b")
+    assert _intervals() == [
+        ("a", "2020-07-01", "2020-07-04", "2020-07-03"),
+        ("b", "2020-07-04", "None", "2020-07-05"),
+    ]
+
+    # a new source the same day a source was opened replaces it
+    _log("2020-07-06", "c")
+    _log("2020-07-06", "d")
+    assert _intervals()[1:] == [
+        ("b", "2020-07-04", "2020-07-06", "2020-07-05"),
+        ("d", "2020-07-06", "None", "2020-07-06"),
+    ]
+
+    latest = "SELECT source FROM meta.latest_covid_source WHERE location = 25001"
+    assert engine.execute(latest).scalar() == "d"
+
+
+def test_put_refreshes_materialized():
+    if CONN_STR is None:
+        assert True
+        return
+    from cmdc_tools.datasets import WEI
+
+    engine = get_engine(CONN_STR)
+    df = pd.DataFrame({"dt": pd.to_datetime(["1990-01-06", "1990-01-13"]), "wei": 1.5})
+    try:
+        WEI().put(CONN_STR, df)
+        q = "SELECT value FROM api.economics WHERE variable = 'wei'"
+        q += " AND dt < '1991-01-01'"
+        assert [r[0] for r in engine.execute(q)] == [1.5, 1.5]
+    finally:
+        engine.execute("DELETE FROM data.weeklyeconomicindex WHERE dt < '1991-01-01'")
+        with engine.begin() as conn:
+            conn.execute("SELECT data.refresh_materialized('economics')")
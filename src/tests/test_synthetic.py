@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+
+from cmdc_tools.datasets import get_engine, synthetic
+
+CONN_STR = os.environ.get("PG_CONN_STR", None)
+
+
+def test_generate():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    scale = synthetic.SCALES["tiny"]._replace(start="2019-06-01")
+    datasets = ["ctp", "usafacts", "lex"]
+
+    out = synthetic.generate(CONN_STR, scale, datasets)
+    assert set(out["table"]) == {"ctp_covid", "usafacts_covid", "mobility_lex"}
+    assert out.query("table == 'usafacts_covid'").shape[0] == 2 * scale.vintages
+    assert out.query("table == 'mobility_lex'").shape[0] == scale.lex_days
+
+    # every vintage re-sends the history up to it
+    written = out.query("table == 'ctp_covid'").set_index("vintage")["rows"]
+    stored = pd.read_sql(
+        """
+        SELECT vintage, COUNT(*) AS rows FROM data.ctp_covid
+        WHERE vintage BETWEEN '2019-06-01' AND '2019-07-01' GROUP BY vintage
+        """,
+        engine,
+        index_col="vintage",
+    )["rows"]
+    assert list(stored.values) == list(written.values)
+    assert written.iloc[-1] > written.iloc[0]
+
+    # the same scale gives the same data
+    again = synthetic.generate(CONN_STR, scale, ["ctp"])
+    assert list(again["rows"]) == list(written.values)
+    n = engine.execute(
+        "SELECT COUNT(*) FROM data.ctp_covid WHERE vintage < '2019-07-01'"
+    ).scalar()
+    assert n == written.sum()
+
+
+def test_generate_recent_views():
+    if CONN_STR is None:
+        assert True
+        return
+    engine = get_engine(CONN_STR)
+    scale = synthetic.SCALES["tiny"]
+    try:
+        synthetic.generate(CONN_STR, scale, ["acs", "official", "usafacts"])
+
+        # both only look at the last days and vintages
+        for view in ["api.covid_sources", "public.scores"]:
+            assert engine.execute(f"SELECT COUNT(*) FROM {view}").scalar() > 0
+    finally:
+        ids = "SELECT id FROM meta.acs_variables WHERE year = 2018 AND census_id IN"
+        ids += " ('DP05_0001E', 'DP05_0024PE')"
+        engine.execute(
+            f"""
+        DELETE FROM data.acs_data WHERE id IN ({ids});
+        DELETE FROM meta.acs_variables_selected WHERE year = 2018;
+        DELETE FROM meta.acs_variables WHERE id IN ({ids});
+        """
+        )
+        with engine.begin() as conn:
+            conn.execute("SELECT data.refresh_materialized('demographics')")
+            conn.execute("SELECT data.refresh_scores()")